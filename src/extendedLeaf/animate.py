@@ -1,36 +1,205 @@
 import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
 import networkx as nx
-import matplotlib
 import numpy as np
 
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Slider, Button
+from src.extendedLeaf.lazy_import import LazyModule
 from src.extendedLeaf.power import PowerDomain
 
+# matplotlib is imported on first use, the backend is only chosen by the live `Animation`
+matplotlib = LazyModule("matplotlib")
+plt = LazyModule("matplotlib.pyplot")
+widgets = LazyModule("matplotlib.widgets")
+
+NODE_SIZE = 700
+
+
+class AnimationTopology:
+    """The power source to entity topology of the data captured by a power domain, precomputed for animating it.
+
+    All power sources and entities which are part of the power domain at any time are laid out once, so nodes keep
+    their position between frames. Which nodes and edges are present at every time, and which of them are added and
+    removed from one time to the next, is computed once up front.
+
+    Args:
+        captured_data: The captured data of a power domain, {time: {power source: {entity: {...}, ...}}}.
+        seed: Seed of the spring layout.
+    """
+
+    def __init__(self, captured_data: Dict[str, dict], seed: int = 1):
+        self.times: List[str] = list(captured_data.keys())
+        node_indices: Dict[str, int] = {}
+        edge_indices: Dict[Tuple[str, str], int] = {}
+        # The entities of a power source rarely change, so the indices are resolved once per power source and entities
+        blocks: Dict[Tuple[str, Tuple[str, ...]], Tuple[List[int], List[int]]] = {}
+        frame_nodes, frame_edges = [], []
+        for data in captured_data.values():
+            nodes, edges = [], []
+            for power_source, power_source_data in data.items():
+                key = (power_source, tuple(entity for entity in power_source_data
+                                           if entity != "Total Carbon Released" and entity != "Power Available"))
+                block = blocks.get(key)
+                if block is None:
+                    block = blocks[key] = (
+                        [node_indices.setdefault(node, len(node_indices)) for node in (power_source,) + key[1]],
+                        [edge_indices.setdefault((power_source, entity), len(edge_indices)) for entity in key[1]])
+                nodes.extend(block[0])
+                edges.extend(block[1])
+            frame_nodes.append(nodes)
+            frame_edges.append(edges)
+
+        self.nodes: List[str] = list(node_indices)
+        self.edges: List[Tuple[str, str]] = list(edge_indices)
+        self.node_presence = self._presence(frame_nodes, len(self.nodes))
+        self.edge_presence = self._presence(frame_edges, len(self.edges))
+        self._node_diffs = self._diffs(self.node_presence)
+        self._edge_diffs = self._diffs(self.edge_presence)
+
+        self.graph = nx.DiGraph()
+        self.graph.add_nodes_from(self.nodes)
+        self.graph.add_edges_from(self.edges)
+        self.layout: Dict[str, np.ndarray] = nx.spring_layout(self.graph, seed=seed) if self.nodes else {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def changes(self, previous: Optional[int], index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the nodes and edges which are shown and hidden when moving from frame `previous` to frame `index`.
+
+        Args:
+            previous: The index of the frame currently shown, None if no frame is shown yet.
+            index: The index of the next frame.
+
+        Returns:
+            The indices of the shown nodes, hidden nodes, shown edges and hidden edges.
+        """
+        if previous is not None and previous + 1 == index:
+            return self._node_diffs[index] + self._edge_diffs[index]
+        node_changes = self._changes(self.node_presence, previous, index)
+        edge_changes = self._changes(self.edge_presence, previous, index)
+        return node_changes + edge_changes
+
+    @staticmethod
+    def _presence(frames: List[List[int]], size: int) -> np.ndarray:
+        presence = np.zeros((len(frames), size), dtype=bool)
+        lengths = [len(frame) for frame in frames]
+        if sum(lengths):
+            presence[np.repeat(np.arange(len(frames)), lengths), np.concatenate(frames)] = True
+        return presence
+
+    @staticmethod
+    def _diffs(presence: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        changes = np.diff(presence.astype(np.int8), axis=0, prepend=0)
+        return [(np.flatnonzero(change > 0), np.flatnonzero(change < 0)) for change in changes]
+
+    @staticmethod
+    def _changes(presence: np.ndarray, previous: Optional[int], index: int) -> Tuple[np.ndarray, np.ndarray]:
+        if previous is None:
+            return np.flatnonzero(presence[index]), np.zeros(0, dtype=np.intp)
+        return (np.flatnonzero(presence[index] & ~presence[previous]),
+                np.flatnonzero(presence[previous] & ~presence[index]))
+
+
+class TopologyArtists:
+    """The matplotlib artists of an :class:`AnimationTopology`, drawn once and updated from frame to frame.
+
+    Every node, edge and label is created once at its precomputed position. Showing a frame only toggles the artists
+    of the nodes and edges which changed since the previous frame.
+
+    Args:
+        ax: The axes to draw on.
+        topology: The topology to draw.
+        animated: If true, the artists are excluded from regular draws of the figure to be drawn via blitting.
+    """
+
+    def __init__(self, ax, topology: AnimationTopology, animated: bool = False):
+        self.ax = ax
+        self.topology = topology
+        self.index: Optional[int] = None
+        self._sizes = np.zeros(len(topology.nodes))
+        if topology.nodes:
+            self.node_collection = nx.draw_networkx_nodes(topology.graph, topology.layout, ax=ax,
+                                                          nodelist=topology.nodes, node_size=self._sizes,
+                                                          node_color='skyblue')
+        else:
+            self.node_collection = ax.scatter([], [])
+        self.edge_artists = nx.draw_networkx_edges(topology.graph, topology.layout, ax=ax, edgelist=topology.edges,
+                                                   arrows=True, arrowsize=15, node_size=NODE_SIZE) \
+            if topology.edges else []
+        labels = nx.draw_networkx_labels(topology.graph, topology.layout, ax=ax, font_size=8, font_weight='bold')
+        self.label_artists = [labels[node] for node in topology.nodes]
+        self.title = ax.set_title("")
+        ax.set_axis_off()
+
+        for artist in self.edge_artists + self.label_artists:
+            artist.set_visible(False)
+        for artist in self.artists():
+            artist.set_animated(animated)
+
+    def artists(self) -> list:
+        """Return all artists, shown or not."""
+        return [self.node_collection, *self.edge_artists, *self.label_artists, self.title]
+
+    def visible_artists(self) -> list:
+        return [artist for artist in self.artists() if artist.get_visible()]
+
+    def show(self, index: int) -> list:
+        """Show the frame `index` of the topology and return the artists which changed."""
+        shown_nodes, hidden_nodes, shown_edges, hidden_edges = self.topology.changes(self.index, index)
+        changed = [self.title]
+        if len(shown_nodes) or len(hidden_nodes):
+            self._sizes[shown_nodes] = NODE_SIZE
+            self._sizes[hidden_nodes] = 0
+            self.node_collection.set_sizes(self._sizes)
+            changed.append(self.node_collection)
+        for indices, artists, visible in [(shown_nodes, self.label_artists, True),
+                                          (hidden_nodes, self.label_artists, False),
+                                          (shown_edges, self.edge_artists, True),
+                                          (hidden_edges, self.edge_artists, False)]:
+            for i in indices:
+                artists[i].set_visible(visible)
+                changed.append(artists[i])
+        self.title.set_text(f'Time Step: {PowerDomain.convert_to_time_string(int(self.topology.times[index]))}')
+        self.index = index
+        return changed
+
 
 class Animation:
+    """Interactive view of the topology of a power domain over time with a slider and a play button.
+
+    The topology is precomputed (see :class:`AnimationTopology`) and every frame is drawn via blitting, only the
+    artists of the topology and the slider are redrawn.
+    """
+
     def __init__(self, power_domains, env, speed_sec: float = 2.5):
+        # Playback is scheduled on the Tk window, offline rendering uses `OfflineAnimation` instead
+        if matplotlib.get_backend().lower() != "tkagg":
+            plt.switch_backend("TkAgg")
 
         self.power_domains: [PowerDomain] = power_domains
         self.env = env
         self.speed = int(speed_sec * 1000)
         self.time_series_data = self.power_domains[0].captured_data
 
-
-        self.g = nx.DiGraph()
+        self.topology = AnimationTopology(self.time_series_data)
+        self.g = self.topology.graph
+        self.pos = self.topology.layout
         self.fig, self.ax = plt.subplots()
-        self.pos = nx.spring_layout(self.g)
-        nx.draw(self.g, self.pos, with_labels=True, font_weight='bold', node_size=700,
-                                       node_color='skyblue', font_size=8, arrowsize=15)
+        self.artists = TopologyArtists(self.ax, self.topology, animated=True)
         self.start_time_increment = self.power_domains[0].start_time_index
         self.current_time_increment = self.start_time_increment
         self.is_playing = False
+        self._background = None
 
-        # Slider for controlling time steps
+        # Slider for controlling time steps, it is redrawn with the topology
         slider_ax = self.fig.add_axes([0.15, 0.065, 0.65, 0.03])
-        self.slider = Slider(slider_ax, 'Time Step', 0, len(self.time_series_data) - 1, valinit=0, valstep=1)
+        self.slider = widgets.Slider(slider_ax, 'Time Step', 0, len(self.time_series_data) - 1, valinit=0, valstep=1)
+        self.slider.drawon = False
+        slider_ax.set_animated(True)
         self.slider.on_changed(self.update_time_step)
         self.slider.valtext.set_text("")
 
@@ -46,9 +215,13 @@ class Animation:
         plt.gca().spines['left'].set_visible(False)
 
         self.play_pause_ax = self.fig.add_axes([0.85, 0.065, 0.1, 0.03])
-        self.play_pause_button = Button(self.play_pause_ax, 'Play')
+        self.play_pause_button = widgets.Button(self.play_pause_ax, 'Play')
         self.play_pause_button.on_clicked(self.toggle_play_pause)
 
+        if len(self.topology):
+            self.artists.show(0)
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+
     def get_axis_labels(self) -> [str]:
         label_list = []
         if len(self.time_series_data) % 2 == 0:
@@ -65,10 +238,10 @@ class Animation:
         return label_list, tick_pos
 
     def update_time_step(self, val):
-        self.current_time_increment = self.start_time_increment + val
+        self.current_time_increment = self.start_time_increment + int(val)
         self.slider.valtext.set_text("")  # Set initial tick label
         self.update(self.current_time_increment)
-        self.fig.canvas.draw_idle()
+        self._blit()
 
     def toggle_play_pause(self, event):
         self.is_playing = not self.is_playing
@@ -77,37 +250,160 @@ class Animation:
             self.play()
         else:
             self.play_pause_button.label.set_text('Play')
+        self.fig.canvas.draw_idle()
 
     def play(self):
         if self.is_playing and self.current_time_increment < (len(self.time_series_data) + self.start_time_increment - 1):
-            self.update(self.current_time_increment)
-            self.current_time_increment = self.current_time_increment + 1
             self.fig.canvas.manager.window.after(self.speed, self.play)
-            self.slider.set_val(self.current_time_increment - self.start_time_increment)
+            self.slider.set_val(self.current_time_increment + 1 - self.start_time_increment)
 
         else:
             self.play_pause_button.label.set_text('Play')
+            self.fig.canvas.draw_idle()
 
     def update(self, frame):
-        plt.sca(self.ax)
-        self.ax.clear()
-        self.g.clear()
-        data = self.time_series_data[str(self.current_time_increment)]
-        for power_source_key, power_source_values in data.items():
-            self.g.add_node(power_source_key)
-            for node in data[power_source_key]:
-                if node == "Total Carbon Released" or node == "Power Available":
-                    continue
-                self.g.add_node(node)
-                self.g.add_edge(power_source_key, node)
-        self.pos = nx.spring_layout(self.g)
-        nx.draw(self.g, self.pos, with_labels=True, font_weight='bold', node_size=700,
-                                       node_color='skyblue', font_size=8, arrowsize=15)
-        self.ax.set_title(f'Time Step: {PowerDomain.convert_to_time_string(self.current_time_increment)}')
+        """ Show the topology at the time increment `frame`, only the artists which changed are updated. """
+        return self.artists.show(frame - self.start_time_increment)
+
+    def _on_draw(self, event):
+        # The figure was fully drawn without the animated artists, which are drawn on top of the cached background
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.artists.visible_artists():
+            self.ax.draw_artist(artist)
+        self.fig.draw_artist(self.slider.ax)
+
+    def _blit(self):
+        if self._background is None:
+            self.fig.canvas.draw_idle()
+            return
+        self.fig.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.fig.canvas.blit(self.fig.bbox)
 
     def run_animation(self):
         plt.show()
 
+class OfflineAnimation:
+    """Renders the topology of a power domain over a range of times without a display, either as a sequence of images
+    or as a GIF.
+
+    Frames are rendered with the Agg backend on figures which are not managed by pyplot. The frames are split into
+    contiguous chunks which are rendered in a pool of processes, every process draws the artists of the topology once
+    and then only toggles the nodes and edges which changed between its frames, as the live :class:`Animation` does.
+
+    Args:
+        topology: The precomputed topology, e.g. `Animation.topology`, or the captured data of a power domain.
+        figsize: (Optional) The size of the frames in inches.
+        dpi: (Optional) The resolution of the frames.
+    """
+
+    def __init__(self, topology: Union[AnimationTopology, Dict[str, dict]], figsize: Tuple[float, float] = (6.4, 4.8),
+                 dpi: int = 100):
+        if not isinstance(topology, AnimationTopology):
+            topology = AnimationTopology(topology)
+        self.topology = topology
+        self.figsize = figsize
+        self.dpi = dpi
+
+    def frame_indices(self, start: int = None, end: int = None, step: int = 1) -> List[int]:
+        """Return the indices of the frames between the times `start` (inclusive) and `end` (exclusive)."""
+        if step < 1:
+            raise ValueError(f"Error: Invalid step {step}, it must be at least 1.")
+        times = np.array([int(time) for time in self.topology.times], dtype=np.int64)
+        selected = np.ones(len(times), dtype=bool)
+        if start is not None:
+            selected &= times >= start
+        if end is not None:
+            selected &= times < end
+        return np.flatnonzero(selected)[::step].tolist()
+
+    def render_frame(self, index: int) -> np.ndarray:
+        """Render a single frame and return its RGBA pixels."""
+        figure, artists = _topology_figure(self.topology, self.figsize, self.dpi)
+        artists.show(index)
+        figure.canvas.draw()
+        return np.asarray(figure.canvas.buffer_rgba()).copy()
+
+    def write_frames(self, directory: str, start: int = None, end: int = None, step: int = 1,
+                     image_format: str = "png", max_workers: int = None) -> List[str]:
+        """Write the frames between the times `start` and `end` as numbered images.
+
+        Args:
+            directory: The directory of the images, it is created if it does not exist.
+            start: (Optional) The first time, inclusive.
+            end: (Optional) The last time, exclusive.
+            step: (Optional) Render every `step`-th frame.
+            image_format: (Optional) Any format supported by matplotlib, e.g. "png" or "jpg".
+            max_workers: (Optional) The number of processes, defaults to the number of CPUs. With a single worker the
+                frames are rendered in this process.
+
+        Returns:
+            The paths of the images in order of time.
+        """
+        indices = self.frame_indices(start, end, step)
+        os.makedirs(directory, exist_ok=True)
+        filepaths = [os.path.join(directory, f"frame_{number:05d}.{image_format}") for number in range(len(indices))]
+        workers = min(max_workers or os.cpu_count() or 1, len(indices))
+        if workers <= 1:
+            _render_frames(self.topology, self.figsize, self.dpi, indices, filepaths)
+            return filepaths
+
+        chunks = np.array_split(np.arange(len(indices)), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render_frames, self.topology, self.figsize, self.dpi,
+                                       [indices[i] for i in chunk], [filepaths[i] for i in chunk])
+                       for chunk in chunks]
+            for future in futures:
+                future.result()
+        return filepaths
+
+    def write_gif(self, filepath: str, start: int = None, end: int = None, step: int = 1, fps: float = 10,
+                  max_workers: int = None) -> str:
+        """Write the frames between the times `start` and `end` as GIF, see :meth:`write_frames`.
+
+        Args:
+            filepath: The path of the GIF.
+            fps: (Optional) The number of frames per second.
+
+        Returns:
+            The path of the GIF.
+        """
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError(f"Error: Writing GIF files requires Pillow to be installed.")
+        with tempfile.TemporaryDirectory() as directory:
+            filepaths = self.write_frames(directory, start, end, step, "png", max_workers)
+            if not filepaths:
+                raise ValueError(f"Error: No frames between the times {start} and {end}.")
+            frames = (Image.open(frame_path).convert("RGB") for frame_path in filepaths)
+            first_frame = next(frames)
+            first_frame.save(filepath, format="GIF", save_all=True, append_images=frames,
+                             duration=int(1000 / fps), loop=0)
+        return filepath
+
+
+def _topology_figure(topology: AnimationTopology, figsize: Tuple[float, float], dpi: int):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure, TopologyArtists(figure.add_subplot(), topology)
+
+
+def _render_frames(topology: AnimationTopology, figsize: Tuple[float, float], dpi: int, indices: List[int],
+                   filepaths: List[str]):
+    """Render the frames `indices` to `filepaths`. Runs in the worker processes of `OfflineAnimation`."""
+    figure, artists = _topology_figure(topology, figsize, dpi)
+    for index, filepath in zip(indices, filepaths):
+        artists.show(index)
+        figure.savefig(filepath)
+
+
 class AllowCertainDebugFilter(logging.Filter):
     def filter(self, record):
         not_allowed = ["TkAgg", "findfont", "STREAM b'IHDR'", "STREAM b'sBIT'", "b'sBIT'",
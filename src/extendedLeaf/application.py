@@ -1,5 +1,5 @@
 from abc import ABC
-from typing import List, Tuple, Type, Optional, TypeVar, Union
+from typing import List, Tuple, Type, Optional, TypeVar, Union, Dict, Callable
 
 import networkx as nx
 
@@ -34,6 +34,7 @@ class Task(PowerAware):
             raise ValueError(f"Cannot place {self} on {node}: It was already placed on {self.node}.")
         self.node = node
         self.node._add_task(self)
+        _allocation_changed(self)
 
     def deallocate(self):
         """Detache the task from the node it is currently placed on and deallocate resources."""
@@ -41,24 +42,42 @@ class Task(PowerAware):
             raise ValueError(f"{self} is not placed on any node.")
         self.node._remove_task(self)
         self.node = None
+        _allocation_changed(self)
 
     def measure_power(self) -> PowerMeasurement:
         if self.paused:
             return PowerMeasurement(0, 0)
         try:
-            return self.node.measure_power().multiply(self.cu / self.node.used_cu)
+            measurement = self.node.measure_power()
+            share = self.cu / self.node.used_cu
         except (ZeroDivisionError, AttributeError) as e:
             return PowerMeasurement(0, 0)
+        return measurement.scale_into(share, measurement)
+
+    def power_shares(self) -> List[Tuple[PowerAware, float]]:
+        if self.paused:
+            return []
+        try:
+            return [(self.node, self.cu / self.node.used_cu)]
+        except (ZeroDivisionError, AttributeError) as e:
+            return []
+
+    def power_share_loads(self) -> List[Tuple[PowerAware, float, bool]]:
+        if self.paused or self.node is None:
+            return []
+        return [(self.node, self.cu, True)]
 
     def pause(self):
         if self.paused:
             raise ValueError(f"Error, task already paused")
         self.paused = True
+        _allocation_changed(self)
 
     def unpause(self):
         if not self.paused:
             raise ValueError(f"Error, task not paused")
         self.paused = False
+        _allocation_changed(self)
 
 
 
@@ -127,6 +146,7 @@ class DataFlow(PowerAware):
         self.links = links
         for link in self.links:
             link._add_data_flow(self)
+        _allocation_changed(self)
 
     def deallocate(self):
         """Remove the data flow from the infrastructure and deallocate bandwidth."""
@@ -135,6 +155,7 @@ class DataFlow(PowerAware):
         for link in self.links:
             link._remove_data_flow(self)
         self.links = None
+        _allocation_changed(self)
 
     def measure_power(self) -> PowerMeasurement:
         try:
@@ -142,19 +163,38 @@ class DataFlow(PowerAware):
                 return PowerMeasurement(0, 0)
             if self.links is None:
                 return PowerMeasurement(0, 0)
-            return PowerMeasurement.sum(link.measure_power().multiply(self.bit_rate / link.used_bandwidth) for link in self.links)
+            measurement = PowerMeasurement(0, 0)
+            for link in self.links:
+                link_measurement = link.measure_power()
+                measurement.iadd(link_measurement.scale_into(self.bit_rate / link.used_bandwidth, link_measurement))
+            return measurement
         except AttributeError:
             return PowerMeasurement(0, 0)
 
+    def power_shares(self) -> List[Tuple[PowerAware, float]]:
+        if self.paused or self.links is None:
+            return []
+        try:
+            return [(link, self.bit_rate / link.used_bandwidth) for link in self.links]
+        except AttributeError:
+            return []
+
+    def power_share_loads(self) -> List[Tuple[PowerAware, float, bool]]:
+        if self.paused or self.links is None:
+            return []
+        return [(link, self.bit_rate, True) for link in self.links]
+
     def pause(self):
         if self.paused:
             raise ValueError(f"Error, data flow already paused")
         self.paused = True
+        _allocation_changed(self)
 
     def unpause(self):
         if not self.paused:
             raise ValueError(f"Error, data flow not paused")
         self.paused = False
+        _allocation_changed(self)
 
 
 class Application(PowerAware):
@@ -164,11 +204,43 @@ class Application(PowerAware):
     _TaskTypeFilter = Union[Type[_TTask], Tuple[Type[_TTask], ...]]
     _DataFlowTypeFilter = Union[Type[_TDataFlow], Tuple[Type[_TDataFlow], ...]]
 
-    def __init__(self, name: str = "Application"):
-        self.graph = nx.DiGraph()
+    def __init__(self, name: str = "Application", template: Optional["ApplicationTemplate"] = None,
+                 bound_nodes: Optional[Dict[int, Node]] = None):
+        """Create an application, optionally stamped out from an :class:`ApplicationTemplate`.
+
+        Args:
+            name: Name of the application.
+            template: (Optional) A validated :class:`ApplicationTemplate` whose task graph the application is stamped
+                out from. The graph of a templated application is only built once it is first accessed.
+            bound_nodes: (Optional) Mapping of template task ids to the nodes that source and sink tasks are bound to,
+                overriding the bound nodes stated in the template.
+        """
         self.name = name
+        self._template = template
+        self._allocation_listeners: List[Callable[[Union[Task, DataFlow]], None]] = []
+        if template is None:
+            self._graph = nx.DiGraph()
+            self._bound_nodes = None
+            self._next_task_id = 0
+            self._topological_order: List[int] = []
+        else:
+            self._graph = None
+            self._bound_nodes = template._resolve_bound_nodes(bound_nodes)
+
     def __repr__(self):
-        return f"{self.__class__.__name__}(tasks={len(self.tasks())})"
+        if self._graph is None:
+            return f"{self.__class__.__name__}(tasks={self._template.number_of_tasks()})"
+        return f"{self.__class__.__name__}(tasks={self._graph.number_of_nodes()})"
+
+    @property
+    def graph(self) -> nx.DiGraph:
+        """The task graph of the application, templated applications build it on first access."""
+        if self._graph is None:
+            self._graph = self._template._build_graph(self, self._bound_nodes)
+            # Template task ids are handed out in insertion order, which is already a topological order
+            self._next_task_id = self._graph.number_of_nodes()
+            self._topological_order = list(range(self._next_task_id))
+        return self._graph
 
     def add_task(self, task: Task, incoming_data_flows: List[Tuple[Task, float]] = None):
         """Add a task to the application graph.
@@ -178,26 +250,66 @@ class Application(PowerAware):
             incoming_data_flows: List of tuples (`src_task`, `bit_rate`) where every `src_task` is the source of a
                 :class:`DataFlow` with a certain `bit_rate` to the added `task`
         """
-        task.application = self
-        task.id = len(self.tasks())
-        if isinstance(task, SourceTask):
-            assert not incoming_data_flows, f"Source task '{task}' cannot have incoming_data_flows"
-            self.graph.add_node(task.id, data=task)
-        elif isinstance(task, ProcessingTask):
-            assert len(incoming_data_flows) > 0, f"Processing task '{task}' has no incoming_data_flows"
-            self.graph.add_node(task.id, data=task)
-            for src_task, bit_rate in incoming_data_flows:
-                assert not isinstance(src_task, SinkTask), f"Sink task '{task}' cannot have outgoing data flows"
-                self.graph.add_edge(src_task.id, task.id, data=DataFlow(bit_rate,self))
-        elif isinstance(task, SinkTask):
-            assert len(incoming_data_flows) > 0, f"Sink task '{task}' has no incoming_data_flows"
-            self.graph.add_node(task.id, data=task)
-            for src_task, bit_rate in incoming_data_flows:
+        self.add_tasks([(task, incoming_data_flows)])
+
+    def add_tasks(self, tasks: List[Tuple[Task, Optional[List[Tuple[Task, float]]]]]):
+        """Add several tasks to the application graph at once.
+
+        Tasks are validated in order and inserted into the graph in bulk, a task's incoming data flows may originate
+        from tasks added earlier in the same call. Nothing is added if any of the tasks is invalid.
+
+        Ids are handed out from a running counter and every task is appended to the end of the topological order. As
+        data flows can only originate from tasks already in the application, the new edges can never close a cycle,
+        so only the sources of the new edges have to be checked rather than the whole graph.
+
+        Args:
+            tasks: List of tuples (`task`, `incoming_data_flows`) as expected by :meth:`add_task`.
+        """
+        graph = self.graph
+        new_task_ids = {}
+        new_nodes = []
+        new_edges = []
+        next_task_id = self._next_task_id
+        for task, incoming_data_flows in tasks:
+            assert task.application is None and id(task) not in new_task_ids, \
+                f"Task '{task}' is already part of an application"
+            if isinstance(task, SourceTask):
+                assert not incoming_data_flows, f"Source task '{task}' cannot have incoming_data_flows"
+            elif isinstance(task, (ProcessingTask, SinkTask)):
+                assert incoming_data_flows, f"{task.__class__.__name__} '{task}' has no incoming_data_flows"
+            else:
+                raise ValueError(f"Unknown task type '{type(task)}'")
+            task_id = next_task_id
+            next_task_id += 1
+            new_task_ids[id(task)] = task_id
+            new_nodes.append((task_id, {"data": task}))
+            for src_task, bit_rate in incoming_data_flows or []:
                 assert not isinstance(src_task, SinkTask), f"Sink task '{task}' cannot have outgoing data flows"
-                self.graph.add_edge(src_task.id, task.id, data=DataFlow(bit_rate,self))
-            assert nx.is_directed_acyclic_graph(self.graph), f"Application '{self}' is no DAG"
-        else:
-            raise ValueError(f"Unknown task type '{type(task)}'")
+                if src_task.application is self:
+                    src_task_id = src_task.id
+                else:
+                    src_task_id = new_task_ids.get(id(src_task))
+                assert src_task_id is not None and src_task_id < task_id, \
+                    f"Application '{self}' is no DAG: source task '{src_task}' of '{task}' was not added before it"
+                new_edges.append((src_task_id, task_id, bit_rate))
+
+        for task_id, attributes in new_nodes:
+            task = attributes["data"]
+            task.application = self
+            task.id = task_id
+        graph.add_nodes_from(new_nodes)
+        graph.add_edges_from((src_task_id, task_id, {"data": DataFlow(bit_rate, self)})
+                             for src_task_id, task_id, bit_rate in new_edges)
+        self._topological_order.extend(task_id for task_id, _ in new_nodes)
+        self._next_task_id = next_task_id
+        if new_nodes:
+            # The graph no longer matches the template, e.g. its precomputed paths
+            self._template = None
+
+    def topological_order(self) -> List[Task]:
+        """Return all tasks of the application in topological order, i.e. every task after its sources."""
+        graph = self.graph
+        return [graph.nodes[task_id]["data"] for task_id in self._topological_order]
 
     def tasks(self, type_filter: Optional[_TaskTypeFilter] = None) -> List[_TTask]:
         """Return all tasks in the application, optionally filtered by class."""
@@ -213,6 +325,14 @@ class Application(PowerAware):
             df_iter = (df for df in df_iter if isinstance(df, type_filter))
         return list(df_iter)
 
+    def add_allocation_listener(self, listener: Callable[[Union[Task, DataFlow]], None]):
+        """Register a function which is called with a task or data flow of the application whenever it is allocated,
+        deallocated, paused or unpaused."""
+        self._allocation_listeners.append(listener)
+
+    def remove_allocation_listener(self, listener: Callable[[Union[Task, DataFlow]], None]):
+        self._allocation_listeners.remove(listener)
+
     def deallocate(self):
         """Detach/Unmap/Release an application from the infrastructure it is currently placed on."""
         for task in self.tasks():
@@ -221,13 +341,35 @@ class Application(PowerAware):
             data_flow.deallocate()
 
     def measure_power(self) -> PowerMeasurement:
-        measurements = [t.measure_power() for t in self.tasks()] + [df.measure_power() for df in self.data_flows()]
-        return PowerMeasurement.sum(measurements)
+        measurement = PowerMeasurement(0, 0)
+        for _, task in self.graph.nodes.data("data"):
+            measurement.iadd(task.measure_power())
+        for _, _, data_flow in self.graph.edges.data("data"):
+            measurement.iadd(data_flow.measure_power())
+        return measurement
+
+    def power_shares(self) -> List[Tuple[PowerAware, float]]:
+        shares = []
+        for _, task in self.graph.nodes.data("data"):
+            shares.extend(task.power_shares())
+        for _, _, data_flow in self.graph.edges.data("data"):
+            shares.extend(data_flow.power_shares())
+        return shares
+
+    def power_share_loads(self) -> List[Tuple[PowerAware, float, bool]]:
+        loads = []
+        for task in self.tasks():
+            loads.extend(task.power_share_loads())
+        for data_flow in self.data_flows():
+            loads.extend(data_flow.power_share_loads())
+        return loads
 
     def get_application_paths(self, source_task, dest_tasks=None):
         all_paths = []
         if source_task is None:
             raise ValueError(f"Error: No start task was provided.")
+        if dest_tasks is None and self._template is not None:
+            return self._template.get_application_paths(source_task.id)
         if dest_tasks is None:
             dest_tasks = self.tasks(type_filter=SinkTask)
 
@@ -236,3 +378,140 @@ class Application(PowerAware):
             all_paths = all_paths + paths
         return all_paths
 
+
+
+class ApplicationTemplate:
+    """Immutable task graph which is validated once and shared between many :class:`Application` instances.
+
+    Rather than building and validating a full graph for every application of the same shape, the template stores the
+    topology as flat lists of task types, compute units and data flows. Instances only hold a reference to the
+    template and the nodes their source and sink tasks are bound to, their task graph is built in bulk the first time
+    it is needed (e.g. when the application is placed).
+
+    Example:
+        template = ApplicationTemplate("Sensor_Application")
+        source = template.add_task(SourceTask, cu=9)
+        processing = template.add_task(ProcessingTask, cu=50, incoming_data_flows=[(source, 10e6)])
+        sink = template.add_task(SinkTask, cu=150, incoming_data_flows=[(processing, 200e3)], bound_node=cloud)
+        applications = [template.instantiate(f"App_{i}", bound_nodes={source: sensor}) for i, sensor in ...]
+
+    Args:
+        name: Default name of the applications stamped out from the template.
+    """
+
+    def __init__(self, name: str = "Application"):
+        self.name = name
+        self._task_types: List[Type[Task]] = []
+        self._task_cus: List[float] = []
+        self._bound_nodes: List[Optional[Node]] = []
+        self._data_flows: List[Tuple[int, int, float]] = []
+        self._bound_task_ids: Optional[Tuple[int, ...]] = None
+        self._paths: Optional[Dict[int, List[List[int]]]] = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}('{self.name}', tasks={self.number_of_tasks()})"
+
+    def number_of_tasks(self) -> int:
+        return len(self._task_types)
+
+    def add_task(self, task_type: Type[Task], cu: float = 0, incoming_data_flows: List[Tuple[int, float]] = None,
+                 bound_node: Optional[Node] = None) -> int:
+        """Add a task to the template and return its id.
+
+        Args:
+            task_type: One of :class:`SourceTask`, :class:`ProcessingTask` or :class:`SinkTask`.
+            cu: Amount of compute units (CU) required to execute the task.
+            incoming_data_flows: List of tuples (`src_task_id`, `bit_rate`) where every `src_task_id` is the id
+                returned when adding the source of the :class:`DataFlow`.
+            bound_node: The node source and sink tasks are bound to, can be left out and supplied per instance.
+        """
+        if self._paths is not None:
+            raise ValueError(f"Error: Template '{self.name}' has already been instantiated and cannot be changed.")
+        task_id = len(self._task_types)
+        if issubclass(task_type, SourceTask):
+            assert not incoming_data_flows, f"Source task '{task_id}' cannot have incoming_data_flows"
+        elif issubclass(task_type, (ProcessingTask, SinkTask)):
+            assert incoming_data_flows, f"Task '{task_id}' has no incoming_data_flows"
+            for src_task_id, _ in incoming_data_flows:
+                # Data flows may only originate from tasks added earlier, which rules out cycles by construction
+                assert 0 <= src_task_id < task_id, f"Unknown source task '{src_task_id}' for task '{task_id}'"
+                assert not issubclass(self._task_types[src_task_id], SinkTask), \
+                    f"Sink task '{src_task_id}' cannot have outgoing data flows"
+        else:
+            raise ValueError(f"Unknown task type '{task_type}'")
+        if bound_node is not None and not issubclass(task_type, (SourceTask, SinkTask)):
+            raise ValueError(f"Error: Only source and sink tasks can be bound to a node.")
+
+        self._task_types.append(task_type)
+        self._task_cus.append(cu)
+        self._bound_nodes.append(bound_node)
+        for src_task_id, bit_rate in incoming_data_flows or []:
+            self._data_flows.append((src_task_id, task_id, bit_rate))
+        return task_id
+
+    def instantiate(self, name: Optional[str] = None, bound_nodes: Optional[Dict[int, Node]] = None) -> Application:
+        """Stamp out a new application sharing the template's topology.
+
+        Args:
+            name: Name of the application, defaults to the name of the template.
+            bound_nodes: Mapping of task ids to the nodes the source and sink tasks of this instance are bound to.
+        """
+        return Application(self.name if name is None else name, template=self, bound_nodes=bound_nodes)
+
+    def get_application_paths(self, source_task_id: int) -> List[List[int]]:
+        """Return all paths from a task to the sink tasks, these are computed once for the whole template."""
+        self._freeze()
+        return [list(path) for path in self._paths[source_task_id]]
+
+    def _freeze(self):
+        """Validate the template and precompute everything that is shared between instances."""
+        if self._paths is not None:
+            return
+        if not self._task_types:
+            raise ValueError(f"Error: Template '{self.name}' does not contain any tasks.")
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(len(self._task_types)))
+        graph.add_edges_from((src, dst) for src, dst, _ in self._data_flows)
+        assert nx.is_directed_acyclic_graph(graph), f"Application template '{self}' is no DAG"
+
+        self._bound_task_ids = tuple(task_id for task_id, task_type in enumerate(self._task_types)
+                                     if issubclass(task_type, (SourceTask, SinkTask)))
+        sink_ids = [task_id for task_id, task_type in enumerate(self._task_types) if issubclass(task_type, SinkTask)]
+        self._paths = {task_id: [path for sink_id in sink_ids
+                                 for path in nx.all_simple_paths(graph, source=task_id, target=sink_id)]
+                       for task_id in range(len(self._task_types))}
+
+    def _resolve_bound_nodes(self, bound_nodes: Optional[Dict[int, Node]]) -> Tuple[Node, ...]:
+        """Return the nodes of every bound task of an instance in a compact tuple."""
+        self._freeze()
+        if bound_nodes is None:
+            bound_nodes = {}
+        resolved = tuple(bound_nodes.get(task_id, self._bound_nodes[task_id]) for task_id in self._bound_task_ids)
+        if None in resolved:
+            raise ValueError(f"Error: No bound node was supplied for every source and sink task of '{self.name}'.")
+        return resolved
+
+    def _build_graph(self, application: Application, bound_nodes: Tuple[Node, ...]) -> nx.DiGraph:
+        """Build the task graph of an instance in bulk, the topology has already been validated."""
+        bound_node_iter = iter(bound_nodes)
+        tasks = []
+        for task_id, (task_type, cu) in enumerate(zip(self._task_types, self._task_cus)):
+            if issubclass(task_type, (SourceTask, SinkTask)):
+                task = task_type(cu=cu, bound_node=next(bound_node_iter))
+            else:
+                task = task_type(cu=cu)
+            task.id = task_id
+            task.application = application
+            tasks.append((task_id, {"data": task}))
+        graph = nx.DiGraph()
+        graph.add_nodes_from(tasks)
+        graph.add_edges_from((src, dst, {"data": DataFlow(bit_rate, application)})
+                             for src, dst, bit_rate in self._data_flows)
+        return graph
+
+
+def _allocation_changed(item: Union[Task, DataFlow]):
+    """Notify the listeners of the item's application that its allocation changed."""
+    if item.application is not None:
+        for listener in item.application._allocation_listeners:
+            listener(item)
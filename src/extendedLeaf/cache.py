@@ -0,0 +1,255 @@
+import enum
+import functools
+import hashlib
+import io
+import os
+import pickle
+import sys
+import types
+from typing import Optional, Set
+
+import numpy as np
+import simpy
+from simpy import Environment
+
+from src.extendedLeaf.checkpoint import _ScenarioPickler, _ScenarioUnpickler, _unregistered_processes
+from src.extendedLeaf.sinks import ResultSink
+from src.extendedLeaf.sweep import Scenario
+
+# Modules of this package whose source and constants are part of a fingerprint
+_PACKAGE = __name__.split(".")[0]
+
+
+def fingerprint(scenario: Scenario) -> str:
+    """Return a deterministic fingerprint of a scenario which has not been run yet.
+
+    The fingerprint covers the whole object graph of the scenario, i.e. the infrastructure and power models, the power
+    domains with their start times, the power sources with the contents of their data sets, the events of event
+    domains, the processes added via :meth:`Scenario.add_process` and the time until which the scenario is run. It
+    also covers the source and the constants (names in upper case, e.g. the settings of an example) of every module of
+    this package defining a class or function of the scenario, so changes of the model invalidate the fingerprint
+    too. Any change of these inputs gives a different fingerprint, while building the same scenario again, also in
+    another process, gives the same fingerprint.
+
+    Result sinks are outputs rather than inputs and are therefore not covered. Processes started via `env.process`
+    are generators whose code and state can not be covered either, so scenarios with such pending processes are
+    rejected.
+    """
+    for process in _unregistered_processes(scenario):
+        raise ValueError(f"Error: Cannot fingerprint the scenario while process {process.name} is pending, only "
+                         f"processes added via Scenario.add_process are covered.")
+    return _Fingerprinter().digest(scenario)
+
+
+class _Fingerprinter:
+    """Walks an object graph in a deterministic order and hashes it, objects are reduced like they are pickled."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self._memo = {}  # id of visited objects -> index, so shared objects and cycles are hashed once
+        self._keep_alive = []  # visited objects, so the ids of temporary ones are not reused while walking
+        self._modules: Set[str] = set()
+
+    def digest(self, obj) -> str:
+        self._update(obj)
+        hashed_modules = set()
+        # The constants of a module may reference further modules
+        while self._modules - hashed_modules:
+            for name in sorted(self._modules - hashed_modules):
+                hashed_modules.add(name)
+                self._update_module(name)
+        return self._hash.hexdigest()
+
+    def _write(self, *tokens):
+        for token in tokens:
+            self._hash.update(f"{token}\x00".encode())
+
+    def _update(self, obj):
+        if obj is None or isinstance(obj, (bool, int, float, complex, str)):
+            self._write(type(obj).__name__, repr(obj))
+            return
+        if isinstance(obj, bytes):
+            self._write("bytes", hashlib.sha256(obj).hexdigest())
+            return
+        if isinstance(obj, np.generic):
+            self._write("numpy", obj.dtype.str, obj.tobytes().hex())
+            return
+        if isinstance(obj, type):
+            self._update_global(obj)
+            return
+        if isinstance(obj, types.ModuleType):
+            self._write("module", obj.__name__)
+            return
+        if isinstance(obj, enum.Enum):
+            self._update_global(type(obj))
+            self._write("member", obj.name)
+            return
+
+        if id(obj) in self._memo:
+            self._write("ref", self._memo[id(obj)])
+            return
+        self._memo[id(obj)] = len(self._memo)
+        self._keep_alive.append(obj)
+
+        if isinstance(obj, (list, tuple)):
+            self._write(type(obj).__name__, len(obj))
+            for item in obj:
+                self._update(item)
+        elif isinstance(obj, dict):
+            self._write(type(obj).__name__, len(obj))
+            for key, value in obj.items():
+                self._update(key)
+                self._update(value)
+        elif isinstance(obj, (set, frozenset)):
+            # The order of sets depends on the hash seed of the process, so their items are ordered by fingerprint
+            self._write(type(obj).__name__, *sorted(_Fingerprinter().digest(item) for item in obj))
+        elif isinstance(obj, np.ndarray):
+            self._write("ndarray", obj.dtype.str, obj.shape)
+            if obj.dtype.hasobject:
+                for item in obj.flat:
+                    self._update(item)
+            else:
+                self._write(hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest())
+        elif isinstance(obj, Environment):
+            # The pending events of the environment are covered by the processes of the scenario, see fingerprint
+            self._write("environment", obj.now)
+        elif isinstance(obj, (types.FunctionType, types.BuiltinFunctionType)):
+            self._update_function(obj)
+        elif isinstance(obj, types.MethodType):
+            self._write("method")
+            self._update(obj.__func__)
+            self._update(obj.__self__)
+        elif isinstance(obj, functools.partial):
+            self._write("partial")
+            self._update(obj.func)
+            self._update(obj.args)
+            self._update(obj.keywords)
+        elif isinstance(obj, types.CodeType):
+            self._write("code", obj.co_name, obj.co_argcount, obj.co_kwonlyargcount, obj.co_names, obj.co_varnames,
+                        hashlib.sha256(obj.co_code).hexdigest())
+            self._update(obj.co_consts)
+        elif isinstance(obj, ResultSink):
+            self._update_global(type(obj))
+        else:
+            self._update_object(obj)
+
+    def _update_global(self, obj):
+        """Classes and functions are hashed by name, the source of their module is hashed once at the end."""
+        module = getattr(obj, "__module__", None) or "builtins"
+        self._write("global", module, getattr(obj, "__qualname__", repr(obj)))
+        self._modules.add(module)
+
+    def _update_function(self, function):
+        self._update_global(function)
+        if not isinstance(function, types.FunctionType) or not _is_package_module(function.__module__):
+            return
+        # Lambdas and nested functions share the name of their module with others, so their code is hashed too
+        self._update(function.__code__)
+        self._update(function.__defaults__)
+        self._update(function.__kwdefaults__)
+        self._update(tuple(cell.cell_contents for cell in function.__closure__ or ()))
+
+    def _update_object(self, obj):
+        try:
+            reduced = obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+        except TypeError as e:
+            raise ValueError(f"Error: The scenario can not be fingerprinted, {e}") from e
+        if isinstance(reduced, str):
+            self._update_global(obj)
+            return
+        reduced = list(reduced) + [None] * (6 - len(reduced))
+        constructor, args, state, list_items, dict_items, _ = reduced
+        if isinstance(state, dict):
+            # Cached properties only hold values derived from the other attributes, e.g. the views of networkx graphs
+            state = {name: value for name, value in state.items()
+                     if not isinstance(getattr(type(obj), name, None), functools.cached_property)}
+        reduced = (args, state, None if list_items is None else list(list_items),
+                   None if dict_items is None else list(dict_items))
+        self._write("object")
+        self._update_global(type(obj))
+        self._update(constructor)
+        for part in reduced:
+            self._update(part)
+
+    def _update_module(self, name: str):
+        module = sys.modules.get(name)
+        if module is None or not _is_package_module(name):
+            return
+        self._write("module source", name)
+        filepath = getattr(module, "__file__", None)
+        if filepath is not None and os.path.exists(filepath):
+            with open(filepath, "rb") as file:
+                self._write(hashlib.sha256(file.read()).hexdigest())
+        for constant in sorted(vars(module)):
+            if constant.isupper() and not constant.startswith("_"):
+                self._write(constant)
+                self._update(vars(module)[constant])
+
+
+def _is_package_module(name: str) -> bool:
+    return name == "__main__" or name.split(".")[0] == _PACKAGE
+
+
+class ResultCache:
+    """A disk cache of finished scenarios keyed by their :func:`fingerprint`, so repeated runs of a scenario with
+    identical inputs, e.g. while iterating on plots, are loaded instead of simulated again.
+
+        scenario = ResultCache("results_cache").run(create_scenario())
+        figure_plotter = FigurePlotter(scenario.power_domains[0])
+
+    The cached scenario holds the whole object graph after the run, i.e. the recorded data of the power domains, the
+    infrastructure and the event domains, so it can be plotted like the scenario which was run. Its environment is
+    replaced by a new environment at the end of the run, so it can not be run any further. Any change of the inputs of
+    a scenario changes its fingerprint, entries of outdated scenarios are left in the directory until it is cleared.
+
+    Args:
+        cache_dir: The directory in which the finished scenarios are stored.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def path(self, scenario: Scenario) -> str:
+        """Return the path of the cached scenario, which exists if the scenario has been run before."""
+        return os.path.join(self.cache_dir, f"{fingerprint(scenario)}.pickle")
+
+    def load(self, scenario: Scenario) -> Optional[Scenario]:
+        """Return the cached result of a scenario which has not been run yet, or None if it has not been run before."""
+        return self._load(self.path(scenario))
+
+    def run(self, scenario: Scenario) -> Scenario:
+        """Return the cached result of a scenario which has not been run yet, the scenario is run and its result is
+        cached if it has not been run before.
+
+        Scenarios whose power domains have result sinks are not cached, as the sinks would not receive the data of a
+        cached run.
+        """
+        for power_domain in scenario.power_domains:
+            if power_domain.sinks:
+                raise ValueError(f"Error: Cannot cache the scenario, power domain {power_domain.name} has result "
+                                 f"sinks.")
+        cache_path = self.path(scenario)
+        cached_scenario = self._load(cache_path)
+        if cached_scenario is not None:
+            return cached_scenario
+
+        scenario.run()
+        buffer = io.BytesIO()
+        try:
+            _ScenarioPickler(buffer, scenario.env).dump(scenario)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            raise ValueError(f"Error: The result of the scenario can not be pickled, {e}") from e
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written to a temporary file first, so an interrupted run does not leave a partial result behind
+        with open(f"{cache_path}.tmp", "wb") as file:
+            pickle.dump((scenario.env.now, buffer.getvalue()), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{cache_path}.tmp", cache_path)
+        return scenario
+
+    @staticmethod
+    def _load(cache_path: str) -> Optional[Scenario]:
+        if not os.path.exists(cache_path):
+            return None
+        with open(cache_path, "rb") as file:
+            time, state = pickle.load(file)
+        return _ScenarioUnpickler(io.BytesIO(state), simpy.Environment(initial_time=time)).load()
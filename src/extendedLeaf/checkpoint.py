@@ -0,0 +1,115 @@
+import io
+import pickle
+
+import simpy
+from simpy import Environment, Process
+
+from src.extendedLeaf.sweep import Scenario
+
+_ENVIRONMENT_ID = "environment"
+
+
+class _ScenarioPickler(pickle.Pickler):
+    """Pickles a scenario with a placeholder for its environment, whose event queue holds generators."""
+
+    def __init__(self, file, env: Environment):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.env = env
+
+    def persistent_id(self, obj):
+        if obj is self.env:
+            return _ENVIRONMENT_ID
+        return None
+
+
+class _ScenarioUnpickler(pickle.Unpickler):
+    """Unpickles a scenario, replacing the placeholder of its environment with a new environment."""
+
+    def __init__(self, file, env: Environment):
+        super().__init__(file)
+        self.env = env
+
+    def persistent_load(self, pid):
+        if pid != _ENVIRONMENT_ID:
+            raise pickle.UnpicklingError(f"Error: Unknown persistent id {pid}.")
+        return self.env
+
+
+class Checkpoint:
+    """The state of a :class:`Scenario` at a tick, from which the simulation can be resumed any number of times, e.g.
+    to branch into several what-if continuations without simulating the common prefix again.
+
+        scenario.advance(2 * 1440)
+        checkpoint = Checkpoint.capture(scenario)
+        for battery_size in [20, 40]:
+            branch = checkpoint.restore()
+            ...  # change the branch
+            print(branch.run()["total_carbon"])
+
+    A checkpoint holds the whole object graph of the scenario, i.e. the power domains and their recorded data, the
+    power sources and battery charges, the infrastructure and the placements of the applications, and the pending
+    events of event domains referenced by the scenario. The simpy environment is not captured, as its processes are
+    generators which can not be copied. Instead, a restored scenario gets a new environment starting at the time of
+    the checkpoint, in which the processes added via :meth:`Scenario.add_process` are started again. A checkpoint is
+    therefore exact if it is captured at a tick of all these processes, and it can not be captured while other
+    processes are pending, e.g. a drone flight started by a process.
+
+    Args:
+        time: The simulation time of the checkpoint.
+        state: The pickled scenario.
+    """
+
+    def __init__(self, time: float, state: bytes):
+        self.time = time
+        self.state = state
+
+    @classmethod
+    def capture(cls, scenario: Scenario) -> "Checkpoint":
+        """Capture the current state of a scenario."""
+        for process in _unregistered_processes(scenario):
+            raise ValueError(f"Error: Cannot checkpoint the scenario while process {process.name} is pending, "
+                             f"only processes added via Scenario.add_process are restarted.")
+
+        buffer = io.BytesIO()
+        try:
+            _ScenarioPickler(buffer, scenario.env).dump(scenario)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            raise ValueError(f"Error: The state of the scenario can not be pickled, {e}") from e
+        return cls(scenario.env.now, buffer.getvalue())
+
+    def restore(self) -> Scenario:
+        """Return a new copy of the scenario at the time of the checkpoint, with its processes started again."""
+        env = simpy.Environment(initial_time=self.time)
+        scenario = _ScenarioUnpickler(io.BytesIO(self.state), env).load()
+        for function, args in scenario.processes:
+            scenario._running_processes.append(env.process(function(*args)))
+        return scenario
+
+    def save(self, filepath: str):
+        """Write the checkpoint to a file."""
+        with open(filepath, "wb") as file:
+            pickle.dump((self.time, self.state), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filepath: str) -> "Checkpoint":
+        """Read a checkpoint written by :meth:`save`."""
+        with open(filepath, "rb") as file:
+            time, state = pickle.load(file)
+        return cls(time, state)
+
+
+def _unregistered_processes(scenario: Scenario) -> list:
+    """Return the pending processes of the scenario which were not added via :meth:`Scenario.add_process`."""
+    registered = set(id(process) for process in scenario._running_processes)
+    return [process for process in _pending_processes(scenario.env) if id(process) not in registered]
+
+
+def _pending_processes(env: Environment) -> list:
+    """Return the processes which are waiting for an event scheduled in the environment."""
+    processes = []
+    for _, _, _, event in env._queue:
+        for callback in event.callbacks or []:
+            process = getattr(callback, "__self__", None)
+            if isinstance(process, Process) and process.is_alive and process not in processes:
+                processes.append(process)
+    return processes
@@ -0,0 +1,109 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+# Methods to reduce the number of points of time series before they are plotted
+DOWNSAMPLING_METHODS = ("none", "lttb", "minmax")
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce time series sharing the x values `x` to at most `max_points` points each.
+
+    All series are downsampled together, the work is vectorized across the rows of `y`. Series with at most
+    `max_points` points are returned unchanged. NaN values, i.e. gaps in a series, are kept where a whole bucket is
+    NaN so the gaps stay visible.
+
+    Args:
+        x: The (T,) x values, sorted ascending.
+        y: The (T,) values of a single series or the (series, T) values of several series.
+        max_points: The maximum number of points per series, at least 4.
+        method: "lttb" (largest triangle three buckets) keeps the visual shape of a series, "minmax" keeps the
+            minimum and maximum of every bucket and therefore every peak and drop, "none" returns the series.
+
+    Returns:
+        The x values and y values of the downsampled series, both shaped like `y`.
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Error: Unknown downsampling method {method}, expected one of {DOWNSAMPLING_METHODS}.")
+    if max_points < 4:
+        raise ValueError(f"Error: Invalid number of points {max_points}, it must be at least 4.")
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    if x.shape[0] != y.shape[1]:
+        raise ValueError(f"Error: {x.shape[0]} x values were given for series of length {y.shape[1]}.")
+
+    if method == "none" or y.shape[1] <= max_points:
+        indices = np.broadcast_to(np.arange(y.shape[1]), y.shape)
+    elif method == "lttb":
+        indices = lttb_indices(x, y, max_points)
+    else:
+        indices = min_max_indices(y, max_points)
+    x_out = x[indices]
+    y_out = np.take_along_axis(y, indices, axis=1)
+    if single:
+        return x_out[0], y_out[0]
+    return x_out, y_out
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Select `n_out` points of every row of `y` with the largest triangle three buckets algorithm.
+
+    The first and last point are always kept, the points in between are split into `n_out - 2` buckets and of every
+    bucket the point forming the largest triangle with the point selected in the previous bucket and the average of
+    the next bucket is kept. Buckets are processed in order, all rows at once.
+
+    Returns:
+        The (rows, n_out) indices of the selected points.
+    """
+    x = np.asarray(x, dtype=float)
+    rows, length = y.shape
+    edges = np.linspace(1, length - 1, n_out - 1).astype(np.intp)
+
+    # Averages of every bucket, the last point serves as the bucket following the last bucket
+    counts = np.add.reduceat(~np.isnan(y[:, 1:length - 1]), edges[:-1] - 1, axis=1)
+    sums = np.add.reduceat(np.nan_to_num(y[:, 1:length - 1]), edges[:-1] - 1, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average_y = np.concatenate([sums / counts, y[:, -1:]], axis=1)
+    average_x = np.append(np.add.reduceat(x[1:length - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+
+    indices = np.empty((rows, n_out), dtype=np.intp)
+    indices[:, 0] = 0
+    indices[:, -1] = length - 1
+    all_rows = np.arange(rows)
+    previous = np.zeros(rows, dtype=np.intp)
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        previous_x = x[previous][:, None]
+        previous_y = y[all_rows, previous][:, None]
+        next_x, next_y = average_x[bucket + 1], average_y[:, bucket + 1][:, None]
+        areas = np.abs((previous_x - next_x) * (y[:, start:end] - previous_y)
+                       - (previous_x - x[start:end]) * (next_y - previous_y))
+        # NaN areas are never selected unless the whole bucket is NaN
+        previous = start + np.argmax(np.nan_to_num(areas, nan=-1.0), axis=1)
+        indices[:, bucket + 1] = previous
+    return indices
+
+
+def min_max_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Select the minimum and maximum of every row of `y` in `n_out // 2` equally sized buckets, in order of time.
+
+    Returns:
+        The (rows, n_out // 2 * 2) indices of the selected points.
+    """
+    rows, length = y.shape
+    buckets = n_out // 2
+    bucket_size = math.ceil(length / buckets)
+    buckets = math.ceil(length / bucket_size)
+    padded = np.full((rows, buckets * bucket_size), np.nan)
+    padded[:, :length] = y
+    padded = padded.reshape(rows, buckets, bucket_size)
+
+    # A bucket of NaN selects its first point twice, which keeps the gap
+    offsets = np.arange(buckets) * bucket_size
+    minima = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=2)
+    maxima = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=2)
+    indices = np.stack([np.minimum(minima, maxima), np.maximum(minima, maxima)], axis=2).reshape(rows, -1)
+    return indices
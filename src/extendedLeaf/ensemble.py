@@ -0,0 +1,344 @@
+import math
+import multiprocessing
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+
+from src.extendedLeaf.power import PowerDomain, PowerSource
+from src.extendedLeaf.sweep import Scenario
+
+
+class GaussianNoise:
+    """Perturbs a data set with multiplicative noise, every reading is scaled by 1 + e with e ~ N(0, relative_std).
+    Readings are clipped at zero, as neither generation nor carbon intensity can be negative.
+
+    Args:
+        relative_std: The standard deviation of the noise relative to the readings, e.g. 0.1 for 10%.
+    """
+
+    def __init__(self, relative_std: float):
+        if relative_std < 0:
+            raise ValueError(f"Error: The standard deviation must not be negative, got {relative_std}.")
+        self.relative_std = relative_std
+
+    def __call__(self, values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        return np.clip(values * (1 + rng.normal(0, self.relative_std, len(values))), 0, None)
+
+
+class BlockBootstrap:
+    """Resamples a data set from blocks of consecutive readings.
+
+    The data sets hold a single day, so instead of resampling whole days every block is drawn from around its own
+    time of day (at most `window` readings earlier or later), which keeps the daily profile, e.g. no solar power at
+    night, while varying the readings within it. Blocks wrap around midnight.
+
+    Args:
+        block_length: The number of consecutive readings in a block.
+        window: The maximum shift of a block in readings.
+    """
+
+    def __init__(self, block_length: int = 4, window: int = 4):
+        if block_length < 1:
+            raise ValueError(f"Error: The block length must be at least 1, got {block_length}.")
+        if window < 0:
+            raise ValueError(f"Error: The window must not be negative, got {window}.")
+        self.block_length = block_length
+        self.window = window
+
+    def __call__(self, values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        number_of_blocks = math.ceil(len(values) / self.block_length)
+        starts = np.arange(number_of_blocks) * self.block_length
+        starts = starts + rng.integers(-self.window, self.window + 1, number_of_blocks)
+        indices = (starts[:, None] + np.arange(self.block_length)).ravel()[:len(values)]
+        return values[indices % len(values)]
+
+
+# A perturbation is called with the readings of a data set and a random generator and returns the perturbed readings
+Perturbation = Callable[[np.ndarray, np.random.Generator], np.ndarray]
+
+
+class StreamingQuantiles:
+    """Estimates quantiles of a stream of arrays element-wise with the P² algorithm (Jain and Chlamtac, 1985).
+
+    Each estimate is kept by five markers whose heights are adjusted with every observation, so the memory used does
+    not grow with the number of observations. The first five observations are kept to initialise the markers, until
+    then the quantiles are exact.
+
+    Args:
+        quantiles: The probabilities of the quantiles, in (0, 1).
+        shape: The shape of the observed arrays.
+    """
+
+    def __init__(self, quantiles: Sequence[float], shape: Tuple[int, ...] = ()):
+        self.quantiles = np.asarray(quantiles, dtype=float)
+        if self.quantiles.ndim != 1 or np.any((self.quantiles <= 0) | (self.quantiles >= 1)):
+            raise ValueError(f"Error: Quantiles must be probabilities in (0, 1), got {quantiles}.")
+        self.shape = tuple(shape)
+        self.count = 0
+        self._sum = np.zeros(self.shape)
+        self._initial: List[np.ndarray] = []
+
+        # Markers of every quantile and element, (quantiles, 5, *shape)
+        self._heights: Optional[np.ndarray] = None
+        self._positions: Optional[np.ndarray] = None
+        # The desired positions only depend on the number of observations, (quantiles, 5, 1, ...)
+        p = self.quantiles[:, None]
+        expand = (slice(None), slice(None)) + (None,) * len(self.shape)
+        self._desired = np.hstack([np.ones_like(p), 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, np.full_like(p, 5)])[expand]
+        self._increments = np.hstack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)])[expand]
+
+    def add(self, values):
+        """Add an observation of shape `shape`."""
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.shape:
+            raise ValueError(f"Error: Expected an observation of shape {self.shape}, got {values.shape}.")
+        self.count += 1
+        self._sum += values
+        if self._heights is not None:
+            self._update(values)
+            return
+
+        self._initial.append(values)
+        if len(self._initial) == 5:
+            markers = (len(self.quantiles), 5) + self.shape
+            self._heights = np.broadcast_to(np.sort(np.stack(self._initial), axis=0), markers).copy()
+            self._positions = np.broadcast_to(np.arange(1.0, 6.0)[(slice(None),) + (None,) * len(self.shape)],
+                                              markers).copy()
+            self._initial = []
+
+    def _update(self, x: np.ndarray):
+        q, n = self._heights, self._positions
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        # The markers above the observation move up by one
+        n[:, 1:4] += x < q[:, 1:4]
+        n[:, 4] += 1
+        self._desired = self._desired + self._increments
+
+        for i in range(1, 4):
+            d = self._desired[:, i] - n[:, i]
+            up = (d >= 1) & (n[:, i + 1] - n[:, i] > 1)
+            down = (d <= -1) & (n[:, i - 1] - n[:, i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            parabolic = q[:, i] + s / (n[:, i + 1] - n[:, i - 1]) * (
+                (n[:, i] - n[:, i - 1] + s) * (q[:, i + 1] - q[:, i]) / (n[:, i + 1] - n[:, i]) +
+                (n[:, i + 1] - n[:, i] - s) * (q[:, i] - q[:, i - 1]) / (n[:, i] - n[:, i - 1]))
+            linear = q[:, i] + s * (np.where(up, q[:, i + 1], q[:, i - 1]) - q[:, i]) / \
+                (np.where(up, n[:, i + 1], n[:, i - 1]) - n[:, i])
+            height = np.where((q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1]), parabolic, linear)
+            q[:, i] = np.where(move, height, q[:, i])
+            n[:, i] += np.where(move, s, 0)
+
+    def values(self) -> np.ndarray:
+        """Return the estimated quantiles, (quantiles, *shape)."""
+        if self.count == 0:
+            raise ValueError(f"Error: No observations were added.")
+        if self._heights is None:
+            return np.quantile(np.stack(self._initial), self.quantiles, axis=0)
+        return self._heights[:, 2].copy()
+
+    def mean(self) -> np.ndarray:
+        """Return the mean of the observations, (*shape)."""
+        if self.count == 0:
+            raise ValueError(f"Error: No observations were added.")
+        return self._sum / self.count
+
+
+class _ReplicaRecorder:
+    """Records the carbon released and the energy provided by every power source at every update of the power
+    domains of a replica."""
+
+    def __init__(self, power_domains: Iterable[PowerDomain]):
+        self.carbon: Dict[int, float] = {}
+        self.energy: Dict[str, Dict[int, float]] = {}
+        for power_domain in power_domains:
+            power_domain.add_listener(self.record)
+
+    def record(self, time: str, data: dict):
+        time = int(time)
+        self.carbon[time] = self.carbon.get(time, 0.0)
+        for power_source_name, readings in data.items():
+            self.carbon[time] += readings["Total Carbon Released"]
+            power_used = sum(reading["Power Used"] for reading in readings.values() if isinstance(reading, dict))
+            energy = self.energy.setdefault(power_source_name, {})
+            energy[time] = energy.get(time, 0.0) + power_used
+
+    def series(self) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """Return the times, the names of the power sources and the series
+        [carbon, cumulative carbon, energy of every power source], (2 + power sources, times)."""
+        times = np.array(sorted(self.carbon), dtype=np.int64)
+        carbon = np.array([self.carbon[time] for time in times])
+        power_sources = sorted(self.energy)
+        energy = [[self.energy[name].get(time, 0.0) for time in times] for name in power_sources]
+        return times, power_sources, np.vstack([carbon, np.cumsum(carbon)] + energy) if len(times) else \
+            np.zeros((2 + len(power_sources), 0))
+
+
+def perturb(scenario: Scenario, perturbations: Dict[Union[str, Type[PowerSource]], Union[Perturbation, list]],
+            rng: np.random.Generator):
+    """Perturb the data sets of the power sources of a scenario which is not yet run.
+
+    Args:
+        scenario: The scenario whose power sources are perturbed.
+        perturbations: {power source name or class: perturbation or list of perturbations}, every power source is
+            perturbed by all entries matching its name or class, in order.
+        rng: The random generator of the perturbations.
+    """
+    for power_domain in scenario.power_domains:
+        for power_source in power_domain.power_sources:
+            values = None
+            for key, key_perturbations in perturbations.items():
+                if key != power_source.name and not (isinstance(key, type) and isinstance(power_source, key)):
+                    continue
+                if values is None:
+                    if getattr(power_source, "power_data_array", None) is None:
+                        raise ValueError(f"Error: Power Source {power_source.name} has no data set to perturb.")
+                    values = power_source.power_data_array
+                for perturbation in key_perturbations if isinstance(key_perturbations, list) else [key_perturbations]:
+                    values = perturbation(values, rng)
+            if values is not None:
+                power_source.set_power_data(values)
+
+
+# The scenario built once by the parent process, which the forked replicas inherit
+_shared_scenario: Optional[Scenario] = None
+
+
+def _run_replica(perturbations: dict, seed: int, replica: int,
+                 factory: Callable[[], Scenario] = None) -> Tuple[np.ndarray, List[str], np.ndarray, float]:
+    """Perturb and run a replica, either of the inherited scenario or of a scenario built by `factory`."""
+    scenario = factory() if factory is not None else _shared_scenario
+    perturb(scenario, perturbations, np.random.default_rng([seed, replica]))
+    recorder = _ReplicaRecorder(scenario.power_domains)
+    total_carbon = scenario.run()["total_carbon"]
+    times, power_sources, series = recorder.series()
+    return times, power_sources, series, total_carbon
+
+
+def _run_forked_replica(arguments: tuple):
+    return _run_replica(*arguments)
+
+
+class EnsembleResult:
+    """The distributions of the carbon released and energy provided at every update over the replicas of an
+    :class:`Ensemble`.
+
+    Args:
+        times: The times of the updates.
+        quantiles: The probabilities of the estimated quantiles.
+        power_sources: The names of the power sources.
+        estimates: The estimated quantiles of [carbon, cumulative carbon, energy of every power source],
+            (quantiles, 2 + power sources, times).
+        means: The means of the series, (2 + power sources, times).
+        total_carbon: The total carbon released by every replica.
+    """
+
+    def __init__(self, times: np.ndarray, quantiles: np.ndarray, power_sources: List[str], estimates: np.ndarray,
+                 means: np.ndarray, total_carbon: np.ndarray):
+        self.times = times
+        self.quantiles = quantiles
+        self.power_sources = power_sources
+        self.estimates = estimates
+        self.means = means
+        self.total_carbon = total_carbon
+
+    @property
+    def replicas(self) -> int:
+        return len(self.total_carbon)
+
+    def carbon(self) -> np.ndarray:
+        """Return the quantiles of the carbon released at every update, (quantiles, times)."""
+        return self.estimates[:, 0]
+
+    def cumulative_carbon(self) -> np.ndarray:
+        """Return the quantiles of the carbon released up to every update, (quantiles, times)."""
+        return self.estimates[:, 1]
+
+    def energy(self, power_source: str) -> np.ndarray:
+        """Return the quantiles of the energy provided by a power source at every update, (quantiles, times)."""
+        if power_source not in self.power_sources:
+            raise ValueError(f"Error: {power_source} is not a power source of the ensemble.")
+        return self.estimates[:, 2 + self.power_sources.index(power_source)]
+
+    def total_carbon_interval(self, level: float = 0.9) -> Tuple[float, float]:
+        """Return the central interval of the total carbon released which holds `level` of the replicas."""
+        if not 0 < level < 1:
+            raise ValueError(f"Error: The level must be in (0, 1), got {level}.")
+        lower, upper = np.quantile(self.total_carbon, [(1 - level) / 2, (1 + level) / 2])
+        return float(lower), float(upper)
+
+
+class Ensemble:
+    """Runs replicas of a scenario whose power source data sets are perturbed, to estimate the distribution of the
+    carbon released instead of a single deterministic value, e.g.
+
+        ensemble = Ensemble(create_scenario, {SolarPower: [BlockBootstrap(), GaussianNoise(0.2)],
+                                              GridPower: GaussianNoise(0.05)}, replicas=200)
+        result = ensemble.run()
+        low, median, high = result.cumulative_carbon()[:, -1]
+
+    Where the platform supports fork, the scenario is built once and every replica runs in a process forked from
+    this one, so it inherits the infrastructure and applications instead of building them again. The results of the
+    replicas are aggregated in order as they complete with :class:`StreamingQuantiles`, so only the estimates are
+    kept in memory.
+
+    Args:
+        factory: A function without arguments returning a :class:`Scenario` which is not yet run.
+        perturbations: {power source name or class: perturbation or list of perturbations}, see :func:`perturb`.
+        replicas: The number of replicas.
+        seed: The seed of the perturbations, replica `i` uses the random generator seeded with [seed, i].
+        max_workers: (Optional) The number of processes, defaults to the number of CPUs. With a single worker, or
+            where fork is not supported, the replicas are built and run in this process.
+        quantiles: The probabilities of the estimated quantiles.
+    """
+
+    def __init__(self, factory: Callable[[], Scenario],
+                 perturbations: Dict[Union[str, Type[PowerSource]], Union[Perturbation, list]],
+                 replicas: int = 100, seed: int = 0, max_workers: int = None,
+                 quantiles: Sequence[float] = (0.05, 0.5, 0.95)):
+        if replicas < 1:
+            raise ValueError(f"Error: An ensemble requires at least one replica, got {replicas}.")
+        if max_workers is not None and max_workers < 1:
+            raise ValueError(f"Error: The number of workers must be at least 1, got {max_workers}.")
+        self.factory = factory
+        self.perturbations = perturbations
+        self.replicas = replicas
+        self.seed = seed
+        self.max_workers = max_workers
+        self.quantiles = quantiles
+
+    def run(self) -> EnsembleResult:
+        estimator = None
+        times, power_sources = None, None
+        total_carbon = []
+        for replica_times, replica_power_sources, series, replica_total_carbon in self._replica_results():
+            if estimator is None:
+                times, power_sources = replica_times, replica_power_sources
+                estimator = StreamingQuantiles(self.quantiles, series.shape)
+            elif not np.array_equal(times, replica_times) or power_sources != replica_power_sources:
+                raise ValueError(f"Error: The replicas of the ensemble were not updated at the same times.")
+            estimator.add(series)
+            total_carbon.append(replica_total_carbon)
+        return EnsembleResult(times, estimator.quantiles, power_sources, estimator.values(), estimator.mean(),
+                              np.array(total_carbon))
+
+    def _replica_results(self):
+        workers = min(self.max_workers or os.cpu_count() or 1, self.replicas)
+        if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            for replica in range(self.replicas):
+                yield _run_replica(self.perturbations, self.seed, replica, self.factory)
+            return
+
+        global _shared_scenario
+        _shared_scenario = self.factory()
+        try:
+            # Every replica runs in a new worker forked from this process, as running the scenario consumes it
+            with multiprocessing.get_context("fork").Pool(workers, maxtasksperchild=1) as pool:
+                arguments = [(self.perturbations, self.seed, replica) for replica in range(self.replicas)]
+                yield from pool.imap(_run_forked_replica, arguments, chunksize=1)
+        finally:
+            _shared_scenario = None
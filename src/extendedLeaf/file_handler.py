@@ -1,20 +1,37 @@
+from __future__ import annotations
+
+import importlib.util
 import json
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
-import pandas as pd
-import plotly.graph_objs as go
-from plotly.subplots import make_subplots
 
+from src.extendedLeaf.downsampling import DOWNSAMPLING_METHODS, downsample
 from src.extendedLeaf.events import EventDomain
+from src.extendedLeaf.lazy_import import LazyModule
 from src.extendedLeaf.power import PowerDomain, PowerMeter
-import tkinter as tk
-import plotly.express as px
-ExperimentResults = Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]
+from src.extendedLeaf.results import ResultsStore, results_table
+from src.extendedLeaf.sinks import COMPRESSION_EXTENSIONS, open_result_file, write_json_stream, write_ndjson
+
+# Plotting libraries are imported on first use
+pd = LazyModule("pandas")
+go = LazyModule("plotly.graph_objs")
+pio = LazyModule("plotly.io")
+px = LazyModule("plotly.express")
+plotly_subplots = LazyModule("plotly.subplots")
+
+ExperimentResults = Dict[str, Tuple["pd.DataFrame", "pd.DataFrame"]]
+
+# Width of exported figures in pixels, half of a full HD screen
+DEFAULT_FIGURE_WIDTH = 960
+
+# Formats figures can be exported to without kaleido
+_PLOTLY_FILE_FORMATS = ("html", "json")
 
 
 def base_figure(fig: go.Figure = None) -> go.Figure:
@@ -55,9 +72,29 @@ def subplot_figure():
     fig.update_yaxes(showline=True, linewidth=1, linecolor='black', mirror=True)
     return fig
 
+def _write_figure(figure: Union[go.Figure, str], filepath: str, file_format: str):
+    """ Write a figure, or its JSON representation, to a file. Runs in the worker processes of
+        `FileHandler.write_figures_to_files`. """
+    if isinstance(figure, str):
+        figure = pio.from_json(figure, skip_invalid=True)
+    if file_format == "html":
+        figure.write_html(filepath)
+    elif file_format == "json":
+        figure.write_json(filepath)
+    else:
+        figure.write_image(filepath, file_format)
+    return filepath
+
+
 class FileHandler:
+    """ Writes the results and figures of a simulation to the results directory.
 
-    def __init__(self):
+        Args:
+            figure_width: (Optional) The width of exported figures in pixels.
+    """
+
+    def __init__(self, figure_width: int = DEFAULT_FIGURE_WIDTH):
+        self.figure_width = figure_width
         self.creation_time = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.results_dir = None
         main_module_name = sys.argv[0]
@@ -86,9 +123,27 @@ class FileHandler:
         filepath = os.path.join(dir_path, "results")
         return filepath
 
-    def write_out_results(self, power_domain: PowerDomain, dir_path: str = None, filename: str = "output"):
+    def write_out_results(self, power_domain: PowerDomain, dir_path: str = None, filename: str = "output",
+                          layout: str = "json", compression: str = None):
         """ Allows user to write raw data to file, allows for a desired filepath and filename
-            if either are absent the missing aspects are defaulted, """
+            if either are absent the missing aspects are defaulted,
+
+            Args:
+                power_domain: The power domain whose captured data is written.
+                dir_path: (Optional) The directory to write to, defaults to the results directory.
+                filename: (Optional) The name of the file without extension.
+                layout: "json" writes a pretty printed JSON file and also returns its content. "stream" writes a
+                    compact JSON object and "ndjson" one compact `{time: data}` object per line, both are written
+                    update by update without building the whole document in memory and return None as content.
+                compression: (Optional) Compress the file with "gzip" or "lzma", only for the streamed layouts.
+
+            Returns:
+                The path of the written file and the written JSON for the "json" layout.
+        """
+        if layout not in ("json", "stream", "ndjson"):
+            raise ValueError(f"Error: Unsupported layout {layout}, expected one of json, stream or ndjson.")
+        if compression is not None and layout == "json":
+            raise ValueError(f"Error: Compression is only supported for the stream and ndjson layouts.")
         if self.results_dir is None:
             self.results_dir = self.create_results_dir()
         if not self.is_valid_filename(filename):
@@ -98,43 +153,141 @@ class FileHandler:
         if dir_path is None or not os.path.exists(dir_path):
             dir_path = self.results_dir
 
-        filepath = os.path.join(dir_path, f"{filename}.json",)
+        extension = ".ndjson" if layout == "ndjson" else ".json"
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Error: Unsupported compression {compression}.")
+        filepath = os.path.join(dir_path, f"{filename}{extension}{COMPRESSION_EXTENSIONS[compression]}",)
+
+        if layout != "json":
+            with open_result_file(filepath, compression) as result_file:
+                if layout == "ndjson":
+                    write_ndjson(result_file, power_domain.captured_data.items())
+                else:
+                    write_json_stream(result_file, power_domain.captured_data.items())
+            return filepath, None
 
         # Convert dictionary to JSON format
         json_data = json.dumps(power_domain.captured_data, indent=2)
-        import csv
 
         # Write JSON data to a file
         with open(filepath, 'w') as json_file:
             json_file.write(json_data)
         return filepath, json_data
 
+    def write_out_table(self, power_domain: PowerDomain, dir_path: str = None, filename: str = "output",
+                        file_format: str = "csv") -> Tuple[str, pd.DataFrame]:
+        """ Write the captured data of the power domain as long-form table (see :func:`results_table`).
+
+            Args:
+                power_domain: The power domain whose captured data is written.
+                dir_path: (Optional) The directory to write to, defaults to the results directory.
+                filename: (Optional) The name of the file without extension.
+                file_format: "csv", or "parquet" and "feather" if pyarrow is installed.
+
+            Returns:
+                The path of the written file and the table.
+        """
+        if file_format not in ("csv", "parquet", "feather"):
+            raise ValueError(f"Error: Unsupported file format {file_format}, expected one of csv, parquet or feather.")
+        if file_format != "csv" and importlib.util.find_spec("pyarrow") is None:
+            raise ImportError(f"Error: Writing {file_format} files requires pyarrow to be installed.")
+        if self.results_dir is None:
+            self.results_dir = self.create_results_dir()
+        if not self.is_valid_filename(filename):
+            filename = "output_" + str(self.repeated_files)
+            self.repeated_files = self.repeated_files + 1
+        if dir_path is None or not os.path.exists(dir_path):
+            dir_path = self.results_dir
+        filepath = os.path.join(dir_path, f"{filename}.{file_format}")
+
+        table = results_table(power_domain.captured_data)
+        if file_format == "csv":
+            table.to_csv(filepath, index=False)
+        elif file_format == "parquet":
+            table.to_parquet(filepath, index=False)
+        else:
+            table.to_feather(filepath)
+        return filepath, table
+
     def is_valid_filename(self, filename):
         pattern = re.compile(r'^[a-zA-Z0-9_-]+(?!\.)$')
         return bool(pattern.match(filename))
 
-    def write_figure_to_file(self, figure, number_of_figs, filename="figure"):
-        # Set the size of the PDF dynamically based on the number of plots
-        pdf_height = 430 + (100 * number_of_figs)  # Adjust the multiplier as needed
-        root = tk.Tk()
-        screen_width = root.winfo_screenwidth()
-        root.destroy()
-        pdf_width = screen_width
+    def write_figure_to_file(self, figure, number_of_figs, filename="figure", width: int = None,
+                             file_format: str = "pdf"):
+        """ Write a figure to the results directory, sized by the number of plots it aggregates.
+
+            Args:
+                figure: The figure to write.
+                number_of_figs: The number of plots of the figure, determines the height.
+                filename: (Optional) The name of the file without extension, invalid names are replaced.
+                width: (Optional) The width in pixels, defaults to `figure_width`.
+                file_format: (Optional) "pdf" or any other format supported by kaleido, "html" and "json" are written
+                    by plotly itself.
+        """
+        filepath = self._prepare_figure(figure, number_of_figs, filename, width, file_format)
+        if filepath is not None:
+            _write_figure(figure, filepath, file_format)
+        return filepath
+
+    def write_figures_to_files(self, figures: Iterable[Tuple[go.Figure, int, str]], file_format: str = "pdf",
+                               width: int = None, max_workers: int = None) -> List[str]:
+        """ Write several figures to the results directory in a pool of processes, such that exporting a batch
+            takes about as long as its slowest figure.
+
+            Args:
+                figures: (figure, number_of_figs, filename) of every figure, see `write_figure_to_file`.
+                file_format: (Optional) The format of all files, see `write_figure_to_file`.
+                width: (Optional) The width in pixels, defaults to `figure_width`.
+                max_workers: (Optional) The number of processes, defaults to the number of CPUs. With a single worker
+                    the figures are written in this process.
+
+            Returns:
+                The paths of the written files.
+        """
+        # Names and sizes are resolved in order, the figures are sent to the workers as JSON
+        exports = []
+        for figure, number_of_figs, filename in figures:
+            filepath = self._prepare_figure(figure, number_of_figs, filename, width, file_format)
+            if filepath is not None:
+                exports.append((figure, filepath))
+        if not exports:
+            return []
+        if max_workers == 1 or len(exports) == 1:
+            return [_write_figure(figure, filepath, file_format) for figure, filepath in exports]
+        with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(exports))) as executor:
+            futures = [executor.submit(_write_figure, figure.to_json(), filepath, file_format)
+                       for figure, filepath in exports]
+            return [future.result() for future in futures]
+
+    def _prepare_figure(self, figure, number_of_figs, filename, width, file_format) -> Optional[str]:
+        """ Size the figure for export and return its file path, None if the results directory does not exist. """
+        # Set the size of the figure dynamically based on the number of plots
+        height = 430 + (100 * number_of_figs)  # Adjust the multiplier as needed
+        if width is None:
+            width = self.figure_width
         if not self.is_valid_filename(filename):
             filename = "figure_" + str(self.repeated_figures)
             self.repeated_figures = self.repeated_figures + 1
-        # Create and save the figure as a PDF
-        figure.update_layout(height=pdf_height, width=pdf_width*0.5)
-        figure.update_layout(showlegend=True)
+        figure.update_layout(height=height, width=width, showlegend=True)
         if self.results_dir is None:
             self.results_dir = self.create_results_dir()
-        if os.path.exists(self.results_dir):
-            figure.write_image(os.path.join(self.results_dir, f"{filename}.pdf"), "pdf")
+        if not os.path.exists(self.results_dir):
+            return None
+        return os.path.join(self.results_dir, f"{filename}.{file_format}")
 
 
 class FigurePlotter:
-    def __init__(self, power_domain: PowerDomain = None, event_domain: EventDomain = None, show_event_lines=False,
-                 number_of_divisions: int = 6, title=""):
+    """ Plots the results of a power domain, or of a results store of a saved run.
+
+        Args:
+            downsample: (Optional) Default downsampling of the time series plots, "none", "lttb" (largest triangle
+                three buckets) or "minmax" (minimum and maximum per bucket), can be overridden per plot.
+            max_points: (Optional) The number of points a downsampled series is reduced to.
+    """
+
+    def __init__(self, power_domain: Union[PowerDomain, ResultsStore] = None, event_domain: EventDomain = None, show_event_lines=False,
+                 number_of_divisions: int = 6, title="", downsample: str = "none", max_points: int = 2000):
         if power_domain is None:
             raise ValueError(f"Error: No power domain was provided.")
         else:
@@ -157,6 +310,61 @@ class FigurePlotter:
                     raise AttributeError(f"Error: No event history was provided in event domain.")
         self.number_of_divisions = number_of_divisions
         self.title = title
+        if downsample not in DOWNSAMPLING_METHODS:
+            raise ValueError(f"Error: Unknown downsampling method {downsample}, expected one of {DOWNSAMPLING_METHODS}.")
+        self.downsample = downsample
+        self.max_points = max_points
+        self._cached_results = None  # (captured data, number of times, results store) of the last retrieval
+
+    def results(self, time_series=None) -> ResultsStore:
+        """Return a results store of the time series, the captured data of the power domain by default.
+
+        The store of a live power domain is cached until the power domain captured further data.
+        """
+        if time_series is None:
+            time_series = self.power_domain
+        if isinstance(time_series, ResultsStore):
+            return time_series
+        if isinstance(time_series, PowerDomain):
+            time_series = time_series.captured_data
+        if self._cached_results is None or self._cached_results[0] is not time_series \
+                or self._cached_results[1] != len(time_series):
+            self._cached_results = (time_series, len(time_series), ResultsStore.from_captured_data(time_series))
+        return self._cached_results[2]
+
+    def times(self, time_series=None) -> np.ndarray:
+        """Return the times of the time series, the captured data of the power domain by default."""
+        if time_series is None:
+            time_series = self.power_domain
+        if isinstance(time_series, ResultsStore):
+            return time_series.times()
+        if isinstance(time_series, PowerDomain):
+            time_series = time_series.captured_data
+        return np.fromiter((int(time) for time in time_series), dtype=np.int64, count=len(time_series))
+
+    def downsampled_series(self, x, series: list, method: str = None) -> list:
+        """ Downsample time series sharing the x values `x` in a single vectorized pass, see
+            :func:`downsample`. Series are truncated to the length of `x`.
+
+            Args:
+                x: The x values of all series.
+                series: The y values of every series.
+                method: (Optional) The downsampling method, defaults to `downsample` of the plotter.
+
+            Returns:
+                The (x, y) values of every series.
+        """
+        if method is None:
+            method = self.downsample
+        if method == "none" or not series:
+            return [(x, y) for y in series]
+        x = np.asarray(x)
+        y = np.full((len(series), len(x)), np.nan)
+        for row, values in enumerate(series):
+            values = np.asarray(values, dtype=float)[:len(x)]
+            y[row, :len(values)] = values
+        x, y = downsample(x, y, self.max_points, method)
+        return list(zip(x, y))
 
     def get_unique_events(self, events) -> dict:
         sorted_events = {}
@@ -177,66 +385,83 @@ class FigurePlotter:
             else:
                 event_times[event_time] = [event]
         return event_times
+
     @classmethod
     def aggregate_subplots(cls, plots, title="") -> go.Figure:
+        """ Combine figures into a single figure with one subplot per figure, stacked in a single column.
+
+            The figures are combined in a single pass, traces of the same legend group share a colour and a single
+            legend entry, and all traces, shapes and axis settings are added in bulk.
+        """
         # Create a subplot with one column and as many rows as the number of plots
-        main_fig = make_subplots(rows=len(plots),
+        main_fig = plotly_subplots.make_subplots(rows=len(plots),
                                  cols=1,
                                  subplot_titles=[fig.layout.title.text for fig in plots],
                                  shared_xaxes=True)
-        groupnames = []
-        if len(plots) > 1:
-            use_units = True
-        else:
-            use_units = False
-        # Iterate through the plots and add traces to the main subplot
-        for plot_index, (plot, layout) in enumerate(zip(plots, [fig.layout for fig in plots])):
-            figure_data = plot.to_dict()['data']
-            # Add traces to the main subplot
-
-            for trace in figure_data:
-                if trace['legendgroup'] in groupnames:
-                    trace["showlegend"] = False
-                else:
-                    trace["showlegend"] = True
-                    groupnames.append(trace['legendgroup'])
-                main_fig.add_trace(trace, row=plot_index + 1, col=1)
-            if use_units and layout.yaxis.title.text is not None:
-                text = layout.yaxis.title.text.split(" ")[-1]
-                layout.yaxis.title.text = text
-            main_fig.update_xaxes(title_text=layout.xaxis.title.text, row=plot_index+1, col=1)
-            main_fig.update_yaxes(title_text=layout.yaxis.title.text, row=plot_index+1, col=1)
-            xaxis_ticks = layout.xaxis.tickvals
-            xaxis_ticktext = layout.xaxis.ticktext
-
-            main_fig.update_xaxes(tickvals=xaxis_ticks, ticktext=xaxis_ticktext, row=plot_index+1, col=1)
-            main_fig.update_layout(legend=dict(
-                orientation="h",
-            ))
+        use_units = len(plots) > 1
+        colours = px.colors.qualitative.Set1 + px.colors.qualitative.Set2 + px.colors.qualitative.Set3
+        colours.remove("rgb(255,255,51)")
+
+        group_colours = {}
+        traces, rows, shapes = [], [], []
+        axis_layout = {}
+        for plot_index, plot in enumerate(plots):
+            row = plot_index + 1
+            for trace in plot.data:
+                trace = trace.to_plotly_json()
+                group = trace.get("legendgroup")
+                trace["showlegend"] = group not in group_colours
+                if trace["showlegend"]:
+                    group_colours[group] = colours[len(group_colours) % len(colours)]
+                trace["line"] = dict(trace.get("line", {}), color=group_colours[group])
+                traces.append(trace)
+                rows.append(row)
+
+            layout = plot.layout
+            y_title = layout.yaxis.title.text
+            if use_units and y_title is not None:
+                y_title = y_title.split(" ")[-1]
+            subplot = main_fig.get_subplot(row, 1)
+            x_name, y_name = subplot.xaxis.plotly_name, subplot.yaxis.plotly_name
+            axis_layout[x_name] = dict(title=dict(text=layout.xaxis.title.text), tickvals=layout.xaxis.tickvals,
+                                       ticktext=layout.xaxis.ticktext)
+            axis_layout[y_name] = dict(title=dict(text=y_title))
+            references = {"x": "x" + x_name[len("xaxis"):], "y": "y" + y_name[len("yaxis"):]}
             for shape in layout.shapes:
-                main_fig.add_shape(shape, row=plot_index+1, col=1)
-            colours = px.colors.qualitative.Set1 + px.colors.qualitative.Set2 + px.colors.qualitative.Set3
-            colours.remove("rgb(255,255,51)")
-            groups = set(trace.legendgroup for trace in main_fig.data)
-            for i, group in enumerate(groups):
-                main_fig.update_traces(line=dict(color=colours[i]), selector=dict(legendgroup=group))
-            main_fig.update_layout(title_text=title)
+                shape = shape.to_plotly_json()
+                for reference in ("xref", "yref"):
+                    axis, _, domain = shape.get(reference, reference[0]).partition(" ")
+                    if axis != "paper":
+                        shape[reference] = references[reference[0]] + (" domain" if domain else "")
+                shapes.append(shape)
+
+        main_fig.add_traces(traces, rows=rows, cols=[1] * len(rows))
+        main_fig.update_layout(axis_layout)
+        main_fig.update_layout(shapes=list(main_fig.layout.shapes) + shapes,
+                               legend=dict(orientation="h"), title_text=title)
         return main_fig
 
+    def get_event_positions(self) -> dict:
+        """ Return the (index, number of events) of every event among the events at the same time, by event id. """
+        positions = {}
+        for events in self.unique_event_times.values():
+            for index, event in enumerate(events):
+                positions.setdefault(id(event), (index, len(events)))
+        return positions
+
     def add_events_updated(self, fig, offset) -> go.Figure:
+        positions = self.get_event_positions()
         for name, unique_events in self.unique_events.items():
             x_values = []
             middle_value = 0
             y_values = []
             scaling_factor = 0.3
             for event in unique_events:
-                event_time = event.time_int
-                x_values.append(event_time - offset)
-                if len(self.unique_event_times[event_time]) == 1:
+                x_values.append(event.time_int - offset)
+                index, total_events = positions[id(event)]
+                if total_events == 1:
                     y_values.append(middle_value)
                 else:
-                    total_events = len(self.unique_event_times[event_time])
-                    index = self.unique_event_times[event_time].index(event)
                     normalized_index = (index + 0.5) / total_events * scaling_factor
                     y_values.append(middle_value - (normalized_index - 0.5* scaling_factor))
 
@@ -271,28 +496,29 @@ class FigurePlotter:
 
         return fig
 
+    def event_lines_path(self, offset) -> str:
+        """ Return an SVG path of a vertical line over the full height of the plot at every event time. """
+        return "".join(f"M{events[0].time_int - offset},0V1" for events in self.unique_event_times.values())
+
     def add_event_lines(self, fig, offset):
-        if self.show_event_lines:
-            if self.show_event_lines:
-                for time, events in self.unique_event_times.items():
-                    time_x_value = events[0].time_int
-                    fig.add_vrect(
-                        x0=time_x_value - offset,
-                        x1=time_x_value - offset,
-                        xref='x',
-                        fillcolor="red", opacity=0.3,
-                        layer="above", line_width=1,
-                        row="all"
-                    )
+        # All event lines form a single shape, so the number of events does not drive the size of the figure
+        if self.show_event_lines and self.unique_event_times:
+            fig.add_shape(
+                type="path",
+                path=self.event_lines_path(offset),
+                xref='x', yref='y domain',
+                line=dict(color="red", width=1), opacity=0.3,
+                layer="above",
+            )
         return fig
 
     def subplot_events(self, events, title=None) -> go.Figure:
         if title is None:
             title = f"Time Series of Events."
         fig = subplot_figure()
-        keys = self.power_domain.captured_data.keys()
-        start_time = int(list(keys)[0])
-        end_time = int(list(keys)[-1])
+        times = self.times()
+        start_time = int(times[0])
+        end_time = int(times[-1])
         if end_time < start_time:
             end_time += 1440
         offset = start_time
@@ -320,7 +546,7 @@ class FigurePlotter:
     def subplot_time_series_entities(self, captured_attribute="Carbon Released",
                                      entities=None, axis_label="Carbon Released (gC02eq/kWh)",
                                      title_attribute="Carbon Released",
-                                     title=None) -> go.Figure:
+                                     title=None, downsample: str = None) -> go.Figure:
         if title is None:
             title = f"Time Series of {title_attribute} for Powered Infrastructure."
         if entities is None:
@@ -328,18 +554,17 @@ class FigurePlotter:
 
         fig = subplot_figure()
 
-        keys = self.power_domain.captured_data.keys()
-        start_time = int(list(keys)[0])
-        end_time = int(list(keys)[-1])
+        times = self.times()
+        start_time = int(times[0])
+        end_time = int(times[-1])
         if end_time < start_time:
             end_time += 1440
         offset = start_time
-        data = self.retrieve_select_data_entities(self.power_domain.captured_data, entities)
+        data = self.retrieve_select_data_entities(self.power_domain, entities)
         time = list(range(end_time-start_time))
 
-        for node_index, node in enumerate(data.keys()):
-            x = time
-            y = data[node][captured_attribute]
+        series = self.downsampled_series(time, [data[node][captured_attribute] for node in data], downsample)
+        for node_index, (node, (x, y)) in enumerate(zip(data.keys(), series)):
             name = node
             if "_" in name:
                 name = node.split("_")[0]+"s"
@@ -368,7 +593,8 @@ class FigurePlotter:
 
     def subplot_time_series_power_sources(self, captured_attribute="Carbon Released", power_sources=None,
                                           axis_label="Carbon Released (gC02/kWh)",
-                                          title_attribute="Carbon Released", title= None) -> go.Figure:
+                                          title_attribute="Carbon Released", title= None,
+                                          downsample: str = None) -> go.Figure:
         if title is None:
             title = f"Time Series of {title_attribute} for Power Sources."
         if power_sources is None:
@@ -376,19 +602,18 @@ class FigurePlotter:
 
         fig = subplot_figure()
 
-        keys = self.power_domain.captured_data.keys()
-        start_time = int(list(keys)[0])
-        end_time = int(list(keys)[-1])
+        times = self.times()
+        start_time = int(times[0])
+        end_time = int(times[-1])
         if end_time < start_time:
             end_time += 1440
 
         offset = start_time
-        data = self.retrieve_select_data_power_sources(self.power_domain.captured_data, power_sources)
+        data = self.retrieve_select_data_power_sources(self.power_domain, power_sources)
         time = list(range(end_time-start_time))
 
-        for node_index, node in enumerate(data.keys()):
-            x = time
-            y = data[node][captured_attribute]
+        series = self.downsampled_series(time, [data[node][captured_attribute] for node in data], downsample)
+        for node_index, (node, (x, y)) in enumerate(zip(data.keys(), series)):
             name = node
             if "_" in name:
                 name = node.split("_")[0]
@@ -413,23 +638,23 @@ class FigurePlotter:
         )
         return fig
 
-    def subplot_time_series_power_meter(self, power_meters: [PowerMeter]) -> go.Figure:
+    def subplot_time_series_power_meter(self, power_meters: [PowerMeter], downsample: str = None) -> go.Figure:
         if power_meters is None:
             raise ValueError(f"Error, no power meter was provided")
 
         fig = subplot_figure()
 
-        keys = self.power_domain.captured_data.keys()
-        start_time = int(list(keys)[0])
-        end_time = int(list(keys)[-1])
+        times = self.times()
+        start_time = int(times[0])
+        end_time = int(times[-1])
         if end_time < start_time:
             end_time += 1440
 
         offset = start_time
 
-        for power_meter in power_meters:
-            y = [float(measurement) for measurement in power_meter.measurements[1:-1]]
-            x = list(range(end_time-start_time))
+        time = list(range(end_time-start_time))
+        series = self.downsampled_series(time, [power_meter.totals()[1:-1] for power_meter in power_meters], downsample)
+        for power_meter, (x, y) in zip(power_meters, series):
             fig.add_trace(go.Scatter(x=x, y=y, name=f"{power_meter.name}", line=dict(width=1), legendgroup=f"{power_meter.name}",mode='lines'))
 
         fig = self.add_event_lines(fig, offset)
@@ -452,48 +677,40 @@ class FigurePlotter:
         return fig
 
     def retrieve_select_data_entities(self, time_series, desired_nodes: ["Node"]):
+        """ Retrieve the time series of the desired nodes as arrays with one value per time, NaN where the node was
+            not powered. The time series may be captured data, a power domain or a results store. """
+        names = list(dict.fromkeys(node.name for node in desired_nodes if node is not None))
+        times = self.times(time_series)
+        attributes = ["Power Used", "Carbon Intensity", "Carbon Released"]
+        gathered = self.results(time_series).gather_entities(attributes, names, times)
         nodes = {}
-        for node in desired_nodes:
-            if node is not None:
-                nodes[node.name] = {"Power Used": [None] * len(list(time_series.keys())),
-                                    "Carbon Intensity": [None] * len(list(time_series.keys())),
-                                    "Carbon Released": [None] * len(list(time_series.keys())),
-                                    "Total Carbon Released": [None] * len(list(time_series.keys()))}
-        for time_index, (time, power_sources) in enumerate(time_series.items()):
-            for power_source_index, power_source in enumerate(power_sources):
-                for node_index, node in enumerate(power_sources[power_source]):
-                    if node in list(nodes.keys()):
-                        for attribute_index, (attribute, values) in enumerate(
-                                power_sources[power_source][node].items()):
-
-                            nodes[node][attribute][time_index] = values
+        for row, name in enumerate(names):
+            nodes[name] = {attribute: gathered[attribute][row] for attribute in attributes}
+            nodes[name]["Total Carbon Released"] = np.full(len(times), np.nan)
         return nodes
 
     def retrieve_select_data_power_sources(self, time_series, desired_power_sources: ["PowerSource"]):
+        """ Retrieve the time series of the desired power sources as arrays with one value per time, NaN where the
+            power source was not part of the power domain. Power and carbon are summed over the entities of a power
+            source, the total carbon released accumulates the carbon released after the first time a power source
+            appears. The time series may be captured data, a power domain or a results store. """
+        power_sources = {power_source.name: power_source for power_source in desired_power_sources
+                         if power_source is not None}
+        times = self.times(time_series)
+        attributes = ["Power Used", "Power Available", "Carbon Released"]
+        gathered = self.results(time_series).gather_power_sources(attributes, power_sources, times)
+        time_indices = np.arange(len(times))
         power_source_results = {}
-        for power_source in desired_power_sources:
-            if power_source is not None:
-                power_source_results[power_source.name] = {"Power Used": [None] * len(list(time_series.keys())),
-                                    "Carbon Intensity": [power_source.get_carbon_intensity_at_time(time) for time in range(len(list(time_series.keys())))],
-                                    "Power Available": [None] * len(list(time_series.keys())),
-                                    "Carbon Released": [None] * len(list(time_series.keys())),
-                                    "Total Carbon Released": [None] * len(list(time_series.keys()))}
-        running_carbon_released_totals = {}
-        for time_index, (time, power_sources) in enumerate(time_series.items()):
-            for power_source_index, power_source in enumerate(power_sources):
-                if power_source in list(power_source_results.keys()):
-                    power_used: float = 0
-                    carbon_released: float = 0
-                    for node_index, node in enumerate(power_sources[power_source]):
-                        if node != "Total Carbon Released" and node != "Power Available":
-                            power_used = power_used + power_sources[power_source][node]["Power Used"]
-                            carbon_released = carbon_released + power_sources[power_source][node]["Carbon Released"]
-                    power_source_results[power_source]["Power Used"][time_index] = power_used
-                    power_source_results[power_source]["Carbon Released"][time_index] = carbon_released
-                    if power_source in running_carbon_released_totals.keys():
-                        running_carbon_released_totals[power_source] = running_carbon_released_totals[power_source] + carbon_released
-                    else:
-                        running_carbon_released_totals[power_source] = 0
-                    power_source_results[power_source]["Total Carbon Released"][time_index] = running_carbon_released_totals[power_source]
-                    power_source_results[power_source]["Power Available"][time_index] = float(power_sources[power_source]["Power Available"])
+        for row, (name, power_source) in enumerate(power_sources.items()):
+            carbon_released = gathered["Carbon Released"][row]
+            present = ~np.isnan(carbon_released)
+            total_carbon_released = np.cumsum(np.where(present, carbon_released, 0))
+            if np.any(present):
+                total_carbon_released -= carbon_released[np.argmax(present)]
+            total_carbon_released[~present] = np.nan
+            power_source_results[name] = {"Power Used": gathered["Power Used"][row],
+                                          "Carbon Intensity": power_source.get_carbon_intensity_series(time_indices),
+                                          "Power Available": gathered["Power Available"][row],
+                                          "Carbon Released": carbon_released,
+                                          "Total Carbon Released": total_carbon_released}
         return power_source_results
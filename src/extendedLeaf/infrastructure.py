@@ -1,9 +1,9 @@
 import math
-from typing import List, Optional, Type, TypeVar, Iterator, Union, Tuple
+from typing import List, Optional, Type, TypeVar, Iterator, Union, Tuple, Dict
 
 import networkx as nx
 
-from src.extendedLeaf.power import PowerAware, PowerMeasurement
+from src.extendedLeaf.power import PowerAware, PowerMeasurement, PowerModelNode, PowerModelLink
 from src.extendedLeaf.mobility import Location
 
 class Node(PowerAware):
@@ -27,6 +27,7 @@ class Node(PowerAware):
             location: The (x,y) coordinates of the node
         """
         self.name = name
+        self._infrastructures: List["Infrastructure"] = []
         if cu is None:
             self.cu = math.inf
         else:
@@ -44,12 +45,22 @@ class Node(PowerAware):
         self.location = location
 
         self.paused = True
+        self.pause_count = 0  # number of times the node was paused for lack of power
         self.recover_task_power = 0
 
     def __repr__(self):
         cu_repr = self.cu if self.cu is not None else "∞"
         return f"{self.__class__.__name__}('{self.name}', cu={self.used_cu}/{cu_repr})"
 
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, paused: bool):
+        self._paused = paused
+        _power_changed(self)
+
     def utilization(self) -> float:
         """Return the current utilization of the resource in the range [0, 1]."""
         try:
@@ -58,6 +69,9 @@ class Node(PowerAware):
             assert self.used_cu == 0
             return 0
 
+    def used_load(self) -> float:
+        return self.used_cu
+
     def _add_task(self, task: "Task"):
         """Add a task to the node.
 
@@ -87,18 +101,21 @@ class Node(PowerAware):
         if new_used_cu > self.cu:
             raise ValueError(f"Cannot reserve {cu} CU on compute node {self}.")
         self.used_cu = new_used_cu
+        _power_changed(self)
 
     def _release_cu(self, cu: float):
         new_used_cu = self.used_cu - cu
         if new_used_cu < 0:
             raise ValueError(f"Cannot release {cu} CU on compute node {self}.")
         self.used_cu = new_used_cu
+        _power_changed(self)
 
     def pause(self):
         if self.paused:
             raise ValueError(f"Error, node already paused")
         self.recover_task_power = self.power_model.update_sensitive_measure(1)
         self.paused = True
+        self.pause_count += 1
         for current_task in self.tasks:
             application = current_task.application
             paths = application.get_application_paths(current_task)
@@ -156,6 +173,7 @@ class Link(PowerAware):
         """
         if name is None:
             raise ValueError(f"Error: No name for the link was supplied.")
+        self._infrastructures: List["Infrastructure"] = []
         self.name = name
         self.src = src
         self.dst = dst
@@ -167,12 +185,25 @@ class Link(PowerAware):
         self.data_flows: List["DataFlow"] = []
 
         self.paused = True
+        self.pause_count = 0  # number of times the link was paused for lack of power
         self.recover_task_power = 0
 
     def __repr__(self):
         latency_repr = f", latency={self.latency}" if self.latency else ""
         return f"{self.__class__.__name__}('{self.src.name}' -> '{self.dst.name}', bandwidth={self.used_bandwidth}/{self.bandwidth}{latency_repr})"
 
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, paused: bool):
+        self._paused = paused
+        _power_changed(self)
+
+    def used_load(self) -> float:
+        return self.used_bandwidth
+
     def _add_data_flow(self, data_flow: "DataFlow"):
         """Add a data flow to the link.
 
@@ -202,18 +233,21 @@ class Link(PowerAware):
         if new_used_bandwidth > self.bandwidth:
             raise ValueError(f"Cannot reserve {bandwidth} bandwidth on network link {self}.")
         self.used_bandwidth = new_used_bandwidth
+        _power_changed(self)
 
     def _release_bandwidth(self, bandwidth):
         new_used_bandwidth = self.used_bandwidth - bandwidth
         if new_used_bandwidth < 0:
             raise ValueError(f"Cannot release {bandwidth} bandwidth on network link {self}.")
         self.used_bandwidth = new_used_bandwidth
+        _power_changed(self)
 
     def pause(self):
         if self.paused:
             raise ValueError(f"Error, link already paused")
         self.recover_task_power =  self.power_model.update_sensitive_measure(1)
         self.paused = True
+        self.pause_count += 1
         for current_data_flow in self.data_flows:
             if current_data_flow.paused is False:
                 current_data_flow.pause()
@@ -271,13 +305,27 @@ class Infrastructure(PowerAware):
     _NodeTypeFilter = Union[Type[_TNode], Tuple[Type[_TNode], ...]]
     _LinkTypeFilter = Union[Type[_TLink], Tuple[Type[_TLink], ...]]
 
-    def __init__(self):
+    def __init__(self, validate_power: bool = False):
         """Infrastructure graph of the simulated scenario.
 
         The infrastructure is a weighted, directed multigraph where every node contains a :class:`Node` and every edge
         between contains a :class:`Link`.
+
+        The power of the whole infrastructure is kept as running static and dynamic totals, which nodes and links
+        update whenever their compute units, bandwidth or paused state change, so :meth:`measure_power` is O(1).
+        Entities whose power models depend on other state (e.g. the distance of wireless links) are measured on every
+        call instead.
+
+        Args:
+            validate_power: Debug mode, cross-checks the running totals against a full recomputation on every call of
+                :meth:`measure_power`.
         """
         self.graph = nx.MultiDiGraph()
+        self.validate_power = validate_power
+        self._entity_power: Dict[Union[Node, Link], Tuple[float, float]] = {}
+        self._volatile_entities: Dict[Union[Node, Link], None] = {}
+        self._dynamic_power = 0.0
+        self._static_power = 0.0
 
     def node(self, node_name: str) -> Node:
         """Return a specific node by name."""
@@ -290,15 +338,21 @@ class Infrastructure(PowerAware):
         self.add_node(link.src)
         self.add_node(link.dst)
         self.graph.add_edge(link.src.name, link.dst.name, data=link, latency=link.latency)
+        self._track_entity(link)
 
     def add_node(self, node: Node):
         """Adds a node to the infrastructure."""
         if node.name not in self.graph:
             self.graph.add_node(node.name, data=node)
+            self._track_entity(node)
 
     def remove_node(self, node: Node):
         """Removes a node from the infrastructure."""
+        incident_links = [link for _, _, link in self.graph.in_edges(node.name, data="data")] + \
+                         [link for _, _, link in self.graph.out_edges(node.name, data="data")]
         self.graph.remove_node(node.name)
+        for entity in incident_links + [node]:
+            self._untrack_entity(entity)
 
     def nodes(self, type_filter: Optional[_NodeTypeFilter] = None) -> List[_TNode]:
         """Return all nodes in the infrastructure, optionally filtered by class."""
@@ -315,6 +369,70 @@ class Infrastructure(PowerAware):
         return list(links)
 
     def measure_power(self) -> PowerMeasurement:
+        dynamic_power = self._dynamic_power
+        static_power = self._static_power
+        for entity in self._volatile_entities:
+            measurement = entity.measure_power()
+            dynamic_power += measurement.dynamic
+            static_power += measurement.static
+        if self.validate_power:
+            expected = self._recompute_power()
+            if not (math.isclose(dynamic_power, expected.dynamic, rel_tol=1e-9, abs_tol=1e-9)
+                    and math.isclose(static_power, expected.static, rel_tol=1e-9, abs_tol=1e-9)):
+                raise RuntimeError(f"Error: Running infrastructure power PowerMeasurement(dynamic={dynamic_power}W, "
+                                   f"static={static_power}W) diverged from the full recomputation {expected}.")
+        return PowerMeasurement(dynamic_power, static_power)
+
+    def refresh_power(self):
+        """Rebuild the running power totals from scratch, e.g. after a power model has been changed in place."""
+        self._dynamic_power = 0.0
+        self._static_power = 0.0
+        for entity in self._entity_power:
+            measurement = entity.measure_power()
+            self._entity_power[entity] = (measurement.dynamic, measurement.static)
+            self._dynamic_power += measurement.dynamic
+            self._static_power += measurement.static
+
+    def _recompute_power(self) -> PowerMeasurement:
         measurements = [node.measure_power() for node in self.nodes()] + [link.measure_power() for link in self.links()]
         return PowerMeasurement.sum(measurements)
 
+    def _track_entity(self, entity: Union[Node, Link]):
+        if self in entity._infrastructures:
+            return
+        entity._infrastructures.append(self)
+        power_model = getattr(entity, "power_model", None)
+        if power_model is not None and type(power_model) not in (PowerModelNode, PowerModelLink):
+            # The power of other models may change without the entity noticing, so they are measured every call
+            self._volatile_entities[entity] = None
+            return
+        measurement = entity.measure_power()
+        self._entity_power[entity] = (measurement.dynamic, measurement.static)
+        self._dynamic_power += measurement.dynamic
+        self._static_power += measurement.static
+
+    def _untrack_entity(self, entity: Union[Node, Link]):
+        if self not in entity._infrastructures:
+            return
+        entity._infrastructures.remove(self)
+        self._volatile_entities.pop(entity, None)
+        if entity in self._entity_power:
+            dynamic_power, static_power = self._entity_power.pop(entity)
+            self._dynamic_power -= dynamic_power
+            self._static_power -= static_power
+
+    def _update_entity_power(self, entity: Union[Node, Link]):
+        """Apply the change in power of a single entity to the running totals."""
+        if entity not in self._entity_power:
+            return
+        old_dynamic_power, old_static_power = self._entity_power[entity]
+        measurement = entity.measure_power()
+        self._entity_power[entity] = (measurement.dynamic, measurement.static)
+        self._dynamic_power += measurement.dynamic - old_dynamic_power
+        self._static_power += measurement.static - old_static_power
+
+
+def _power_changed(entity: Union[Node, Link]):
+    """Notify every infrastructure containing the entity that its power may have changed."""
+    for infrastructure in entity._infrastructures:
+        infrastructure._update_entity_power(entity)
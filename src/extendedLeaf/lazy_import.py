@@ -0,0 +1,25 @@
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module which is imported on the first access of one of its attributes.
+
+    Used by the result and visualization modules for their heavy dependencies (pandas, plotly, matplotlib), so the
+    simulation and processes which never plot do not pay for importing them.
+
+    Args:
+        name: The absolute name of the module, e.g. "plotly.graph_objs".
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = "imported" if self._module is not None else "not imported"
+        return f"<lazy module {self._name} ({state})>"
@@ -0,0 +1,205 @@
+import math
+from typing import List, Tuple, Dict, Optional, Union, Iterable
+
+import numpy as np
+
+from src.extendedLeaf.application import Application, Task, DataFlow
+from src.extendedLeaf.infrastructure import Node, Link
+from src.extendedLeaf.power import PowerDomain
+
+
+class CarbonLedger:
+    """Attributes the energy consumed and carbon released by the infrastructure to the applications placed on it.
+
+    The attribution follows :meth:`Task.measure_power` and :meth:`DataFlow.measure_power`: an application is charged
+    for the share `cu / used_cu` of every node and `bit_rate / used_bandwidth` of every link its unpaused tasks and
+    data flows are placed on. The numerators of these shares are kept in a sparse application-to-entity matrix which
+    is only updated when a task or data flow is allocated, deallocated, paused or unpaused. At every update of the
+    power domain the denominators are read from the infrastructure and the energy and carbon of all applications are
+    computed with a single sparse matrix-vector product over the recorded data of the entities.
+
+    Args:
+        power_domain: (Optional) The power domain whose recorded data is attributed. The ledger registers itself as a
+            listener of the power domain, alternatively :meth:`record` can be called manually.
+        applications: (Optional) The applications to attribute carbon to, more can be added via
+            :meth:`add_application`.
+        keep_history: If true, the energy and carbon of every application is stored for every update.
+    """
+
+    def __init__(self, power_domain: Optional[PowerDomain] = None, applications: Iterable[Application] = (),
+                 keep_history: bool = True):
+        self.applications: List[Application] = []
+        self.keep_history = keep_history
+        self._application_rows: Dict[int, int] = {}
+
+        # Infrastructure entities (columns), indexed by their id and by their name as used in the data of the power
+        # domain, which may be shared by several entities, e.g. a node and a link
+        self._entities: List[Union[Node, Link]] = []
+        self._entity_columns: Dict[int, int] = {}
+        self._name_columns: Dict[str, List[int]] = {}
+
+        # Sparse matrix of share numerators, {(row, column): cu or bit rate}
+        self._numerators: Dict[Tuple[int, int], float] = {}
+        self._item_numerators: Dict[int, List[Tuple[int, int, float]]] = {}
+        self._coo: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+        self._energy = np.zeros(0)
+        self._carbon = np.zeros(0)
+        self._times: List[str] = []
+        self._energy_history: List[np.ndarray] = []
+        self._carbon_history: List[np.ndarray] = []
+
+        for application in applications:
+            self.add_application(application)
+        if power_domain is not None:
+            power_domain.add_listener(self.record)
+
+    def add_application(self, application: Application):
+        if id(application) in self._application_rows:
+            raise ValueError(f"Error: Application {application.name} is already part of the ledger.")
+        self._application_rows[id(application)] = len(self.applications)
+        self.applications.append(application)
+        self._energy = np.append(self._energy, 0.0)
+        self._carbon = np.append(self._carbon, 0.0)
+        application.add_allocation_listener(self._allocation_changed)
+        for task in application.tasks():
+            self._allocation_changed(task)
+        for data_flow in application.data_flows():
+            self._allocation_changed(data_flow)
+
+    def energy(self, application: Application) -> float:
+        """Return the total energy (Wh) attributed to the application."""
+        return float(self._energy[self._row(application)])
+
+    def carbon(self, application: Application) -> float:
+        """Return the total carbon (gCO2eq) attributed to the application."""
+        return float(self._carbon[self._row(application)])
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """Return the total energy and carbon of every application, keyed by the application names."""
+        return {application.name: {"Power Used": float(energy), "Carbon Released": float(carbon)}
+                for application, energy, carbon in zip(self.applications, self._energy, self._carbon)}
+
+    def history(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Return the recorded times and the (times, applications) arrays of energy and carbon at these times.
+
+        Applications added during the simulation have zeros before they were added.
+        """
+        if not self.keep_history:
+            raise ValueError(f"Error: The ledger does not keep a history.")
+        energy = np.zeros((len(self._times), len(self.applications)))
+        carbon = np.zeros((len(self._times), len(self.applications)))
+        for i, (energy_row, carbon_row) in enumerate(zip(self._energy_history, self._carbon_history)):
+            energy[i, :len(energy_row)] = energy_row
+            carbon[i, :len(carbon_row)] = carbon_row
+        return self._times, energy, carbon
+
+    def record(self, time: str, data: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Attribute the data recorded by the power domain at `time` to the applications.
+
+        Args:
+            time: The time of the update
+            data: The recorded data, i.e.
+                {PowerSource: {Entity: {Power used, Carbon intensity, Carbon Released}}...{Total Carbon Released}}
+
+        Returns:
+            The energy and carbon attributed to every application during the update.
+        """
+        entity_energy = np.zeros(len(self._entities))
+        entity_carbon = np.zeros(len(self._entities))
+        for power_source_name, power_source_data in data.items():
+            for entity_name, reading in power_source_data.items():
+                if not isinstance(reading, dict):
+                    continue
+                column = self._data_column(power_source_name, entity_name)
+                if column is not None:
+                    entity_energy[column] += reading["Power Used"]
+                    entity_carbon[column] += reading["Carbon Released"]
+
+        rows, columns, numerators = self._sparse_numerators()
+        denominators = np.array([_used_capacity(entity) for entity in self._entities], dtype=float)[columns]
+        shares = np.divide(numerators, denominators, out=np.zeros_like(numerators), where=denominators > 0)
+        energy = np.bincount(rows, weights=shares * entity_energy[columns], minlength=len(self.applications))
+        carbon = np.bincount(rows, weights=shares * entity_carbon[columns], minlength=len(self.applications))
+
+        self._energy += energy
+        self._carbon += carbon
+        if self.keep_history:
+            self._times.append(time)
+            self._energy_history.append(energy)
+            self._carbon_history.append(carbon)
+        return energy, carbon
+
+    def _row(self, application: Application) -> int:
+        try:
+            return self._application_rows[id(application)]
+        except KeyError:
+            raise ValueError(f"Error: Application {application.name} is not part of the ledger.")
+
+    def _column(self, entity: Union[Node, Link]) -> int:
+        column = self._entity_columns.get(id(entity))
+        if column is None:
+            column = self._entity_columns[id(entity)] = len(self._entities)
+            self._entities.append(entity)
+            self._name_columns.setdefault(entity.name, []).append(column)
+        return column
+
+    def _data_column(self, power_source_name: str, entity_name: str) -> Optional[int]:
+        """Return the column of the entity whose reading is recorded for the power source, if it is part of the
+        ledger."""
+        columns = self._name_columns.get(entity_name)
+        if columns is None:
+            return None
+        if len(columns) == 1:
+            return columns[0]
+        # Entities sharing a name are told apart by the power source they are powered by
+        columns = [column for column in columns if _power_source_name(self._entities[column]) == power_source_name]
+        if len(columns) > 1:
+            raise ValueError(f"Error: The reading of {entity_name} from {power_source_name} can not be attributed, "
+                             f"{len(columns)} entities of the ledger share the name and the power source.")
+        return columns[0] if columns else None
+
+    def _sparse_numerators(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._coo is None:
+            keys = list(self._numerators.keys())
+            self._coo = (np.array([row for row, _ in keys], dtype=np.intp),
+                         np.array([column for _, column in keys], dtype=np.intp),
+                         np.array(list(self._numerators.values()), dtype=float))
+        return self._coo
+
+    def _allocation_changed(self, item: Union[Task, DataFlow]):
+        """Replace the numerators contributed by the task or data flow with its current allocation."""
+        for row, column, numerator in self._item_numerators.pop(id(item), []):
+            remaining = self._numerators[(row, column)] - numerator
+            if math.isclose(remaining, 0, abs_tol=1e-9):
+                del self._numerators[(row, column)]
+            else:
+                self._numerators[(row, column)] = remaining
+
+        row = self._row(item.application)
+        if item.paused:
+            allocation = []
+        elif isinstance(item, Task):
+            allocation = [] if item.node is None else [(item.node, item.cu)]
+        else:
+            allocation = [] if item.links is None else [(link, item.bit_rate) for link in item.links]
+
+        item_numerators = []
+        for entity, numerator in allocation:
+            column = self._column(entity)
+            self._numerators[(row, column)] = self._numerators.get((row, column), 0) + numerator
+            item_numerators.append((row, column, numerator))
+        if item_numerators:
+            self._item_numerators[id(item)] = item_numerators
+        self._coo = None
+
+
+def _power_source_name(entity: Union[Node, Link]) -> Optional[str]:
+    power_source = getattr(entity.power_model, "power_source", None)
+    return None if power_source is None else power_source.name
+
+
+def _used_capacity(entity: Union[Node, Link]) -> float:
+    if isinstance(entity, Node):
+        return entity.used_cu
+    return entity.used_bandwidth
@@ -5,22 +5,26 @@ import os
 import re
 
 from abc import ABC, abstractmethod
-from functools import reduce
-from typing import Union, Collection, Callable, Optional, Iterable
+from typing import Union, Collection, Callable, Optional, Iterable, List, Tuple, Dict
 
 import numpy as np
 import simpy
 from simpy import Environment
-from enum import auto
+from enum import Enum, auto
 
 logger = logging.getLogger(__name__)
 _unnamed_power_meters_created = 0
 
 
 class PowerMeasurement:
+    __slots__ = ("dynamic", "static")
+
     def __init__(self, dynamic: float, static: float):
         """Power measurement of one or more entities at a certain point in time.
 
+        Measurements are mutable, the in-place helpers :meth:`iadd` and :meth:`scale_into` allow accumulating many
+        measurements without allocating a new object for every intermediate result.
+
         Args:
             dynamic: Dynamic (load-dependent) power usage in Watt
             static: Static (load-independent) power usage in Watt
@@ -29,8 +33,23 @@ class PowerMeasurement:
         self.static = static
 
     @classmethod
-    def sum(cls, measurements: Iterable["PowerMeasurement"]):
-        dynamic, static = reduce(lambda acc, cur: (acc[0] + cur.dynamic, acc[1] + cur.static), measurements, (0, 0))
+    def sum(cls, measurements: Union[Iterable["PowerMeasurement"], np.ndarray]):
+        """Sum measurements into a new measurement.
+
+        Args:
+            measurements: Either an iterable of measurements, or a NumPy array of shape (n, 2) holding the dynamic and
+                static power of one measurement per row.
+        """
+        if isinstance(measurements, np.ndarray) and measurements.dtype != object:
+            if measurements.size == 0:
+                return PowerMeasurement(0, 0)
+            dynamic, static = measurements.reshape(-1, 2).sum(axis=0)
+            return PowerMeasurement(float(dynamic), float(static))
+        dynamic = 0
+        static = 0
+        for measurement in measurements:
+            dynamic += measurement.dynamic
+            static += measurement.static
         return PowerMeasurement(dynamic, static)
 
     def __repr__(self):
@@ -57,6 +76,18 @@ class PowerMeasurement:
     def multiply(self, factor: float):
         return PowerMeasurement(self.dynamic * factor, self.static * factor)
 
+    def iadd(self, other: "PowerMeasurement") -> "PowerMeasurement":
+        """Add another measurement to this one in place and return it."""
+        self.dynamic += other.dynamic
+        self.static += other.static
+        return self
+
+    def scale_into(self, factor: float, out: "PowerMeasurement") -> "PowerMeasurement":
+        """Write this measurement multiplied by `factor` into `out` (which may be this measurement) and return it."""
+        out.dynamic = self.dynamic * factor
+        out.static = self.static * factor
+        return out
+
     def total(self) -> float:
         return float(self)
 
@@ -67,7 +98,7 @@ class PowerModel(ABC):
 
     @abstractmethod
     def measure(self) -> PowerMeasurement:
-        """Return the current power usage."""
+        """Return the current power usage as a new measurement, callers are free to modify it in place."""
 
     @abstractmethod
     def set_parent(self, parent):
@@ -211,10 +242,37 @@ class PowerAware(ABC):
     def measure_power(self) -> PowerMeasurement:
         """Returns the power that is currently used by the entity."""
 
+    def power_shares(self) -> List[Tuple["PowerAware", float]]:
+        """Returns the entities whose power this entity consumes, each with the share of its power that is consumed.
+
+        Used by :class:`MeterGroup` to measure entities shared by many meters only once. The weighted sum of the
+        shares' measurements must equal :meth:`measure_power`. By default an entity consumes all of its own power.
+        """
+        return [(self, 1.0)]
+
+    def power_share_loads(self) -> List[Tuple["PowerAware", float, bool]]:
+        """Returns :meth:`power_shares` split into the part which only changes when the entity is allocated,
+        deallocated, paused or unpaused and the part which changes with the load of the entities it shares.
+
+        Every entity is returned with either its share (False) or the load this entity places on it (True), e.g. the
+        CU of a task on its node, whose share is this load over the total load placed on the shared entity. Entities
+        returned with a load must therefore provide this total via `used_load()`, like :class:`Node` and
+        :class:`Link`. Used by :class:`MeterGroup` to keep the membership of its meters between measurements. By
+        default the shares of :meth:`power_shares` are returned, which therefore must not change without the group
+        being invalidated.
+        """
+        return [(entity, share, False) for entity, share in self.power_shares()]
+
 
 class PowerMeter:
     """Power meter that stores the power of one or more entites in regular intervals.
 
+    Measurements are stored in a columnar NumPy buffer of (time, dynamic, static) rows which grows as needed, or which
+    only keeps the latest `buffer_size` measurements when used as a ring buffer for long runs. The ring buffer has
+    twice the size and every measurement is written to both halves, so the latest measurements are always a
+    contiguous window. The accessors :meth:`times`, :meth:`dynamic` and :meth:`static` therefore return views of the
+    buffer without copying.
+
     Args:
         entities: Can be either (1) a single :class:`PowerAware` entity (2) a list of :class:`PowerAware` entities
             (3) a function which returns a list of :class:`PowerAware` entities, if the number of these entities
@@ -222,13 +280,16 @@ class PowerMeter:
         name: Name of the power meter for logging and reporting
         measurement_interval: The frequency in which measurement take place.
         callback: A function which will be called with the PowerMeasurement result after each conducted measurement.
+        buffer_size: (Optional) If provided, only the latest `buffer_size` measurements are kept.
     """
+    _INITIAL_CAPACITY = 1024
 
     def __init__(self,
                  entities: Union[PowerAware, Collection[PowerAware], Callable[[], Collection[PowerAware]]],
                  name: Optional[str] = None,
                  measurement_interval: Optional[float] = 1,
-                 callback: Optional[Callable[[PowerMeasurement], None]] = None):
+                 callback: Optional[Callable[[PowerMeasurement], None]] = None,
+                 buffer_size: Optional[int] = None):
         self.entities = entities
         if name is None:
             global _unnamed_power_meters_created
@@ -238,7 +299,85 @@ class PowerMeter:
             self.name = name
         self.measurement_interval = measurement_interval
         self.callback = callback
-        self.measurements = []
+        if buffer_size is not None and buffer_size < 1:
+            raise ValueError(f"Error: Invalid buffer size {buffer_size} for power meter {self.name}.")
+        self.buffer_size = buffer_size
+        self._buffer = np.empty((2 * buffer_size if buffer_size else self._INITIAL_CAPACITY, 3))
+        self._start = 0  # index of the oldest measurement, only moves when the ring buffer is full
+        self._length = 0
+        self._measurements: Optional[List[PowerMeasurement]] = None
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def measurements(self) -> List[PowerMeasurement]:
+        """The stored measurements as a list of :class:`PowerMeasurement`, only built when accessed."""
+        if self._measurements is None:
+            self._measurements = [PowerMeasurement(dynamic, static) for dynamic, static
+                                  in self.measurement_array()[:, 1:].tolist()]
+        return self._measurements
+
+    def measurement_array(self) -> np.ndarray:
+        """Return a (n, 3) view of the stored (time, dynamic, static) measurements in chronological order."""
+        return self._buffer[self._start:self._start + self._length]
+
+    def times(self) -> np.ndarray:
+        return self.measurement_array()[:, 0]
+
+    def dynamic(self) -> np.ndarray:
+        return self.measurement_array()[:, 1]
+
+    def static(self) -> np.ndarray:
+        return self.measurement_array()[:, 2]
+
+    def totals(self) -> np.ndarray:
+        """Return the total (dynamic + static) power of every measurement."""
+        measurements = self.measurement_array()
+        return measurements[:, 1] + measurements[:, 2]
+
+    def total(self) -> PowerMeasurement:
+        """Return the sum of all stored measurements."""
+        return PowerMeasurement.sum(self.measurement_array()[:, 1:])
+
+    def measure(self) -> PowerMeasurement:
+        """Measure the current power of the entities."""
+        if isinstance(self.entities, PowerAware):
+            return self.entities.measure_power()
+        measurement = PowerMeasurement(0, 0)
+        for entity in self._current_entities():
+            measurement.iadd(entity.measure_power())
+        return measurement
+
+    def _current_entities(self) -> Collection[PowerAware]:
+        if isinstance(self.entities, PowerAware):
+            return [self.entities]
+        if isinstance(self.entities, Collection):
+            return self.entities
+        elif isinstance(self.entities, Callable):
+            return self.entities()
+        raise ValueError(f"{self.name}: Unsupported type {type(self.entities)} for observable={self.entities}.")
+
+    def record(self, time: float, measurement: PowerMeasurement):
+        """Store a measurement taken at `time` and pass it to the callback."""
+        row = (time, measurement.dynamic, measurement.static)
+        if self.buffer_size is None:
+            if self._length == len(self._buffer):
+                self._buffer = np.concatenate([self._buffer, np.empty_like(self._buffer)])
+            self._buffer[self._length] = row
+            self._length += 1
+        else:
+            # Written to both halves, so the window from the oldest measurement never wraps around
+            index = (self._start + self._length) % self.buffer_size
+            self._buffer[index] = row
+            self._buffer[index + self.buffer_size] = row
+            if self._length < self.buffer_size:
+                self._length += 1
+            else:
+                self._start = (self._start + 1) % self.buffer_size
+        self._measurements = None
+        if self.callback is not None:
+            self.callback(measurement)
 
     def run(self, env: simpy.Environment, delay: Optional[float] = 0):
         """Starts the power meter process.
@@ -254,25 +393,135 @@ class PowerMeter:
         """
         yield env.timeout(delay)
         while True:
-            if isinstance(self.entities, PowerAware):
-                measurement = self.entities.measure_power()
-            else:
-                if isinstance(self.entities, Collection):
-                    entities = self.entities
-                elif isinstance(self.entities, Callable):
-                    entities = self.entities()
-                else:
-                    raise ValueError(
-                        f"{self.name}: Unsupported type {type(self.entities)} for observable={self.entities}.")
-                measurement = PowerMeasurement.sum(entity.measure_power() for entity in entities)
-            self.measurements.append(measurement)
-            if self.callback is not None:
-                self.callback(measurement)
-            logger.debug(f"{env.now}: {self.name}: {measurement}")
+            measurement = self.measure()
+            self.record(env.now, measurement)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{env.now}: {self.name}: {measurement}")
             yield env.timeout(self.measurement_interval)
 
 
-class PowerType(auto):
+class MeterGroup:
+    """Runs many power meters as a single process which measures every underlying entity only once per measurement.
+
+    Each meter is resolved into the entities whose power it consumes (see :meth:`PowerAware.power_share_loads`), e.g.
+    an application into the nodes and links it is placed on, weighted by its load on them. The unique entities are
+    measured once and the measurements of all meters are computed from the sparse entity-to-meter membership, so many
+    meters observing the same infrastructure do not multiply the cost of a measurement. The meters store their
+    measurements as if they were run on their own.
+
+    The membership is kept between measurements and only rebuilt when it changes, i.e. when a task or data flow of an
+    application measured by the group is allocated, deallocated, paused or unpaused, or when a meter whose entities are
+    given by a function returns other entities. Only the loads of the shared entities are read at every measurement.
+    If the entities of a meter change otherwise, :meth:`invalidate` has to be called.
+
+    Args:
+        meters: The power meters of the group, all of which must share the same measurement interval.
+        measurement_interval: The frequency in which measurement take place. Defaults to the meters' interval.
+    """
+
+    def __init__(self, meters: Iterable[PowerMeter] = (), measurement_interval: Optional[float] = None):
+        self.meters: List[PowerMeter] = []
+        self.measurement_interval = measurement_interval
+        self._membership = None  # (rows, columns, loads, scaled, entities, scaled columns), see _build_membership
+        self._entities_signature = None  # ids of the entities of meters given by a function
+        self._observed_applications: Dict[int, object] = {}
+        for meter in meters:
+            self.add_meter(meter)
+
+    def add_meter(self, meter: PowerMeter):
+        if self.measurement_interval is None:
+            self.measurement_interval = meter.measurement_interval
+        elif meter.measurement_interval != self.measurement_interval:
+            raise ValueError(f"Error: Power meter {meter.name} measures every {meter.measurement_interval} instead of "
+                             f"every {self.measurement_interval} like the other meters of the group.")
+        self.meters.append(meter)
+        self.invalidate()
+
+    def invalidate(self):
+        """Rebuild the membership of the meters at the next measurement."""
+        self._membership = None
+
+    def measure(self) -> np.ndarray:
+        """Measure the current power of all meters.
+
+        Returns:
+            Array of shape (number of meters, 2) holding the dynamic and static power of each meter.
+        """
+        meter_entities = [meter._current_entities() for meter in self.meters]
+        entities_signature = [tuple(id(entity) for entity in entities)
+                              for meter, entities in zip(self.meters, meter_entities) if callable(meter.entities)]
+        if self._membership is None or entities_signature != self._entities_signature:
+            self._membership = self._build_membership(meter_entities)
+            self._entities_signature = entities_signature
+        rows, columns, loads, scaled, entities, scaled_columns = self._membership
+
+        power = np.array([(m.dynamic, m.static) for m in (entity.measure_power() for entity in entities)],
+                         dtype=float).reshape(-1, 2)
+        used_loads = np.ones(len(entities))
+        used_loads[scaled_columns] = [entities[column].used_load() for column in scaled_columns]
+        denominators = np.where(scaled, used_loads[columns], 1.0)
+        weights = np.divide(loads, denominators, out=np.zeros_like(loads), where=denominators > 0)
+        weighted_power = power[columns] * weights[:, None]
+        result = np.empty((len(self.meters), 2))
+        result[:, 0] = np.bincount(rows, weights=weighted_power[:, 0], minlength=len(self.meters))
+        result[:, 1] = np.bincount(rows, weights=weighted_power[:, 1], minlength=len(self.meters))
+        return result
+
+    def _build_membership(self, meter_entities: List[Collection[PowerAware]]):
+        rows = []
+        columns = []
+        loads = []
+        scaled = []
+        entity_index: Dict[int, int] = {}
+        entities = []
+        for row, current_entities in enumerate(meter_entities):
+            for entity in current_entities:
+                self._observe_allocations(entity)
+                for shared_entity, load, is_scaled in entity.power_share_loads():
+                    if is_scaled and not callable(getattr(shared_entity, "used_load", None)):
+                        raise ValueError(f"Error: Power meter {self.meters[row].name} measures {shared_entity} by its "
+                                         f"load, which requires {shared_entity.__class__.__name__}.used_load().")
+                    column = entity_index.get(id(shared_entity))
+                    if column is None:
+                        column = entity_index[id(shared_entity)] = len(entities)
+                        entities.append(shared_entity)
+                    rows.append(row)
+                    columns.append(column)
+                    loads.append(load)
+                    scaled.append(is_scaled)
+        columns = np.asarray(columns, dtype=np.intp)
+        scaled = np.asarray(scaled, dtype=bool)
+        return (np.asarray(rows, dtype=np.intp), columns, np.asarray(loads, dtype=float), scaled, entities,
+                np.unique(columns[scaled]).tolist())
+
+    def _observe_allocations(self, entity: PowerAware):
+        """Invalidate the membership whenever the allocation of the application of the entity changes."""
+        application = entity if hasattr(entity, "add_allocation_listener") else getattr(entity, "application", None)
+        if application is not None and id(application) not in self._observed_applications:
+            self._observed_applications[id(application)] = application
+            application.add_allocation_listener(self._allocation_changed)
+
+    def _allocation_changed(self, item):
+        self.invalidate()
+
+    def run(self, env: simpy.Environment, delay: Optional[float] = 0):
+        """Starts the process of the meter group, replaces calling :meth:`PowerMeter.run` for each meter.
+
+        Args:
+            env: Simpy environment (for timing the measurements)
+            delay: The delay after which the measurements shall be conducted.
+        """
+        yield env.timeout(delay)
+        while True:
+            for meter, (dynamic, static) in zip(self.meters, self.measure().tolist()):
+                measurement = PowerMeasurement(dynamic, static)
+                meter.record(env.now, measurement)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"{env.now}: {meter.name}: {measurement}")
+            yield env.timeout(self.measurement_interval)
+
+
+class PowerType(Enum):
     """Power is consumed from a source that is renewable, we assume that the carbon intensity is small and static."""
     RENEWABLE = auto()
 
@@ -443,13 +692,34 @@ class PowerSource(ABC):
         if not start_found:
             raise AttributeError(f"Error: Start time {start_time} was not found in data")
         self.power_data = power_data
+        # Precomputed lookups of the data set by increment
+        self._power_data_times = list(power_data.keys())
+        self.power_data_array = np.array(list(power_data.values()), dtype=float)
         return power_data
 
     def _map_to_time(self, current_increment: int = 0) -> str:
         if self.power_data is None:
             raise ValueError(f"Error: no data set has been provided")
-        times = list(self.power_data.keys())
-        return times[current_increment]
+        return self._power_data_times[current_increment]
+
+    def set_power_data(self, values):
+        """Replace the values of the data set, e.g. with a perturbed copy, the times of the readings are kept.
+
+                Args:
+                    values: The new value of every reading, in order of `power_data`.
+        """
+        if getattr(self, "power_data_array", None) is None:
+            raise ValueError(f"Error: Power Source {self.name} has no data set to replace.")
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.power_data_array.shape:
+            raise ValueError(f"Error: Power Source {self.name} requires {len(self.power_data_array)} readings, "
+                             f"got {values.shape}.")
+        self.power_data_array = values
+        self.power_data = dict(zip(self._power_data_times, values.tolist()))
+
+    def get_carbon_intensity_series(self, times: np.ndarray) -> np.ndarray:
+        """Return the carbon intensity at each of the times as array, see `get_carbon_intensity_at_time`."""
+        return np.array([self.get_carbon_intensity_at_time(int(time)) for time in times], dtype=float)
 
 
 class PoweredInfrastructureDistributor:
@@ -545,6 +815,10 @@ class PowerDomain:
                         if no entities are provided it is assumed and checked that powered infrastructure is provided
                         statically with the power source.
                     update_interval: The number of units of time between measurements of the carbon released.
+                    keep_captured_data: If false, the recorded data is only passed to the sinks of the power domain
+                        (see :meth:`add_sink`) instead of being kept in `captured_data` and the `remaining_power_log`
+                        of the power sources until the end of the simulation, so the memory used for results stays
+                        bounded in long simulations.
                     power_source_events: a list of events the user wants to occur during runtime, the structure follows:
                         - time of event, in the format hh:mm:ss
                         - if executed, this is an internal attribute used to determine during runtime if the event has
@@ -562,7 +836,8 @@ class PowerDomain:
     """
     def __init__(self, env: Environment = None, name: str = None,
                  powered_infrastructure_distributor: PoweredInfrastructureDistributor = None,
-                 start_time_str: str = "00:00:00", powered_infrastructure=None, update_interval: int = 1):
+                 start_time_str: str = "00:00:00", powered_infrastructure=None, update_interval: int = 1,
+                 keep_captured_data: bool = True):
         if env is None:
             raise ValueError(f"Error: Power Domain was not supplied an environment. ")
         else:
@@ -575,6 +850,9 @@ class PowerDomain:
         self.carbon_emitted: [float] = []  # running count of carbon emissions
         self.captured_data: {str: {str: {str: {str: str}}}} = {}  # data to be potentially written to file
         self.logging_data: {str: {str: {str: {str: str}}}} = {}  # any data that needs to be logged which is captured in events
+        self._listeners: [Callable[[str, dict], None]] = []  # called with the data recorded at every update
+        self.keep_captured_data = keep_captured_data
+        self.sinks = []  # ResultSinks receiving the data recorded at every update
 
         self.powered_infrastructure_distributor: PoweredInfrastructureDistributor = powered_infrastructure_distributor\
                                                                                     or PoweredInfrastructureDistributor()
@@ -637,6 +915,8 @@ class PowerDomain:
             self.update_carbon_intensity(current_carbon_intensities)
             self.update_recorded_data(str(self.env.now + self.start_time_index), current_carbon_intensities)
             self.update_logs()
+            self.update_listeners(str(self.env.now + self.start_time_index))
+            self.update_sinks(str(self.env.now + self.start_time_index))
             yield env.timeout(self.update_interval)
 
     def record_power_consumption(self, entity, power_source, power_consumed, time_to_recharge=1):
@@ -734,6 +1014,50 @@ class PowerDomain:
     def update_recorded_data(self, time, data):
         self.captured_data[time] = data
 
+    def update_listeners(self, time):
+        """Pass the final data recorded at `time` to the listeners, i.e. including the power consumption logged via
+        :meth:`record_power_consumption`, e.g. battery recharges."""
+        data = self.captured_data[time]
+        for listener in self._listeners:
+            listener(time, data)
+
+    def update_sinks(self, time):
+        """Pass the final data recorded at `time` to the sinks and drop it if captured data is not kept."""
+        if not self.sinks and self.keep_captured_data:
+            return
+        data = self.captured_data[time]
+        for sink in self.sinks:
+            sink.append(time, data)
+        if not self.keep_captured_data:
+            del self.captured_data[time]
+            # Only the total is required from the carbon emitted so far
+            self.carbon_emitted = [self.return_total_carbon_emissions()]
+            # The power available at `time` was passed to the sinks as "Power Available"
+            for power_source in self.power_sources:
+                if power_source is not None:
+                    power_source.remaining_power_log.pop(time, None)
+
+    def add_sink(self, sink):
+        """Add a :class:`ResultSink` which receives the data recorded at every update while the simulation runs."""
+        self.sinks.append(sink)
+
+    def flush_sinks(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close_sinks(self):
+        """Write the remaining buffered data of all sinks and close them, should be called once the simulation ended."""
+        for sink in self.sinks:
+            sink.close()
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """Register a function which is called with the time and the data recorded at every update, i.e.
+            {PowerSource: {Entity: {Power used, Carbon intensity, Carbon Released}}...{Total Carbon Released}}"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, dict], None]):
+        self._listeners.remove(listener)
+
     def add_power_source(self, power_source):
         if power_source in self.power_sources:
             raise ValueError(f"Error: Power source {power_source.name} is already present at priority "
@@ -840,6 +1164,9 @@ class SolarPower(PowerSource):
     def get_carbon_intensity_at_time(self, time) -> float:
         return self.inherent_carbon_intensity
 
+    def get_carbon_intensity_series(self, times: np.ndarray) -> np.ndarray:
+        return np.full(len(times), self.inherent_carbon_intensity, dtype=float)
+
 
 class WindPower(PowerSource):
     """A concrete example class of the PowerSource class
@@ -872,6 +1199,9 @@ class WindPower(PowerSource):
     def get_carbon_intensity_at_time(self, time) -> float:
         return self.inherent_carbon_intensity
 
+    def get_carbon_intensity_series(self, times: np.ndarray) -> np.ndarray:
+        return np.full(len(times), self.inherent_carbon_intensity, dtype=float)
+
 
 class GridPower(PowerSource):
     """A concrete example class of the PowerSource class
@@ -905,6 +1235,10 @@ class GridPower(PowerSource):
         time = self._map_to_time((time_int // self.update_interval) % len(self.power_data))
         return float(self.power_data[time])
 
+    def get_carbon_intensity_series(self, times: np.ndarray) -> np.ndarray:
+        increments = (np.asarray(times, dtype=np.int64) // self.update_interval) % len(self.power_data_array)
+        return self.power_data_array[increments]
+
 
 class BatteryPower(PowerSource):
     """A concrete example class of the PowerSource class
@@ -965,6 +1299,9 @@ class BatteryPower(PowerSource):
         #  Only produced from recharging the battery
         return self.carbon_intensity
 
+    def get_carbon_intensity_series(self, times: np.ndarray) -> np.ndarray:
+        return np.full(len(times), self.carbon_intensity, dtype=float)
+
 
 def validate_str_time(time_string: str):
     pattern = re.compile(r'^([01]\d|2[0-3]):([0-5]\d):([0-5]\d)$')
@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import gzip
+import json
+import lzma
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.extendedLeaf.lazy_import import LazyModule
+from src.extendedLeaf.power import PowerDomain
+from src.extendedLeaf.sinks import RESULT_COLUMNS, read_columnar
+
+pd = LazyModule("pandas")
+
+_TABLE_DTYPES = {"time": np.int64, "power_source": "category", "entity": "category", "power_used": float,
+                 "carbon_intensity": float, "carbon_released": float, "power_available": float}
+
+# Attributes of the captured data and the columns of the long-form table holding them
+ATTRIBUTE_COLUMNS = {"Power Used": "power_used", "Carbon Intensity": "carbon_intensity",
+                     "Carbon Released": "carbon_released", "Power Available": "power_available"}
+
+
+def results_table(captured_data: Dict[str, dict]) -> pd.DataFrame:
+    """ Flatten the captured data of a power domain, i.e. {time: {power source: {entity: {...}}}}, into a long-form
+        table with one row per time and entity and the columns time, power_source, entity, power_used,
+        carbon_intensity, carbon_released and power_available.
+
+        The nested dictionaries are flattened in a single pass into columns, power sources and entities are stored as
+        categoricals in the order they first appear. """
+    return _tables_from_updates(captured_data.items())[0]
+
+
+class ResultsStore:
+    """Read-only access to the results of a simulation, either saved to a file or still in memory.
+
+    The results are loaded lazily on the first query into a long-form table (see :func:`results_table`) sorted by
+    time. Queries select entities and power sources via their categorical codes and time ranges via binary search, so
+    they are answered with vectorized slices instead of walking the nested captured data.
+
+    A store can be passed to :class:`FigurePlotter` in place of a power domain to re-plot saved runs.
+
+    Args:
+        filepath: Path of the results, as written by :meth:`FileHandler.write_out_results` (JSON or NDJSON, optionally
+            gzip or lzma compressed), :meth:`FileHandler.write_out_table` (CSV, Parquet or Feather) or the result
+            sinks (CSV, NDJSON or columnar).
+        file_format: (Optional) One of "json", "ndjson", "columnar", "csv", "parquet" or "feather". Inferred from the
+            file extension by default.
+    """
+    _EXTENSIONS = {".json": "json", ".ndjson": "ndjson", ".npy": "columnar", ".csv": "csv", ".parquet": "parquet",
+                   ".feather": "feather"}
+
+    def __init__(self, filepath: Optional[str] = None, file_format: Optional[str] = None):
+        self.filepath = filepath
+        if filepath is not None and file_format is None:
+            file_format = self._infer_format(filepath)
+        if file_format is not None and file_format not in self._EXTENSIONS.values():
+            raise ValueError(f"Error: Unsupported results format {file_format}.")
+        self.file_format = file_format
+        self._table: Optional[pd.DataFrame] = None
+        self._power_source_table: Optional[pd.DataFrame] = None
+        self._captured_data: Optional[Dict[str, dict]] = None
+        self._times: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_captured_data(cls, captured_data: Dict[str, dict]) -> "ResultsStore":
+        """Create a store for the captured data of a power domain which is still in memory."""
+        store = cls()
+        store._captured_data = captured_data
+        return store
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame) -> "ResultsStore":
+        """Create a store for a long-form table with the columns of :func:`results_table`."""
+        store = cls()
+        store._set_table(table)
+        return store
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """The long-form table of all results, sorted by time."""
+        if self._table is None:
+            self._set_table(*self._load())
+        return self._table
+
+    @property
+    def power_source_table(self) -> pd.DataFrame:
+        """Table with one row per time and power source and the columns time, power_source, power_used and
+        carbon_released (summed over the entities of the power source), carbon_intensity and power_available, sorted
+        by time.
+
+        When loaded from a long-form table only power sources which powered at least one entity at a time are
+        contained, otherwise all power sources of the captured data are.
+        """
+        if self._power_source_table is None:
+            table = self.table
+            if self._power_source_table is None:
+                self._power_source_table = table.groupby(["time", "power_source"], observed=True, sort=False).agg(
+                    power_used=("power_used", "sum"), carbon_released=("carbon_released", "sum"),
+                    carbon_intensity=("carbon_intensity", "first"), power_available=("power_available", "first"),
+                ).reset_index()
+        return self._power_source_table
+
+    @property
+    def captured_data(self) -> Dict[str, dict]:
+        """The results in the nested structure of :attr:`PowerDomain.captured_data`, rebuilt when loaded from a file.
+
+        Only power sources which powered at least one entity at a time are contained.
+        """
+        if self._captured_data is None:
+            self._captured_data = _captured_data_from_table(self.table)
+        return self._captured_data
+
+    @classmethod
+    def convert_to_time_string(cls, time) -> str:
+        return PowerDomain.convert_to_time_string(time)
+
+    def times(self) -> np.ndarray:
+        """Return the sorted unique times of the results."""
+        if self._times is None:
+            self._times = pd.unique(self.table["time"].to_numpy())
+        return self._times
+
+    def entities(self) -> List[str]:
+        return sorted(self.table["entity"].cat.categories)
+
+    def power_sources(self) -> List[str]:
+        return sorted(self.table["power_source"].cat.categories)
+
+    def select(self, entities: Union[None, str, Iterable[str]] = None,
+               power_sources: Union[None, str, Iterable[str]] = None,
+               start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        """Return the rows of the given entities and power sources between the times `start` (inclusive) and `end`
+        (exclusive), all rows are returned for the criteria which are not given."""
+        table = self._time_slice(start, end)
+        mask = None
+        for column, names in (("entity", entities), ("power_source", power_sources)):
+            if names is None:
+                continue
+            column_mask = _category_mask(table[column], [names] if isinstance(names, str) else names)
+            mask = column_mask if mask is None else mask & column_mask
+        return table if mask is None else table[mask]
+
+    def carbon_released(self, entities: Union[None, str, Iterable[str]] = None,
+                        power_sources: Union[None, str, Iterable[str]] = None,
+                        start: Optional[int] = None, end: Optional[int] = None) -> pd.Series:
+        """Return the total carbon released per entity between `start` and `end`."""
+        rows = self.select(entities, power_sources, start, end)
+        return rows.groupby("entity", observed=True)["carbon_released"].sum()
+
+    def entity_series(self, attribute: str = "Carbon Released", entities: Optional[Iterable[str]] = None,
+                      start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        """Return a (times, entities) table of an attribute, times an entity was not powered at are NaN."""
+        column = _attribute_column(attribute)
+        rows = self.select(entities=entities, start=start, end=end)
+        series = rows.pivot_table(index="time", columns="entity", values=column, aggfunc="sum", observed=True)
+        return self._reindex_times(series, start, end, entities)
+
+    def gather_entities(self, attributes: Iterable[str], entities: Iterable[str],
+                        times: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Gather attributes of entities into (entities, times) arrays with a single indexed scatter per attribute.
+
+        Args:
+            attributes: The attributes to gather, e.g. "Power Used".
+            entities: Names of the entities, one row of the arrays per entity.
+            times: (Optional) The times of the array columns, defaults to :meth:`times`.
+
+        Returns:
+            The array of every attribute, NaN where an entity was not powered at a time. If an entity was powered by
+            several power sources at once, the reading of the last power source is used.
+        """
+        times = self.times() if times is None else np.asarray(times, dtype=np.int64)
+        entities = list(entities)
+        rows = self.select(entities=entities, start=int(times.min()), end=int(times.max()) + 1) \
+            if entities and len(times) else None
+        return _gather(rows, "entity", attributes, entities, times)
+
+    def gather_power_sources(self, attributes: Iterable[str], power_sources: Iterable[str],
+                             times: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Gather attributes of power sources from :attr:`power_source_table` into (power sources, times) arrays,
+        NaN where a power source was not part of the power domain at a time (see :meth:`gather_entities`)."""
+        times = self.times() if times is None else np.asarray(times, dtype=np.int64)
+        power_sources = list(power_sources)
+        rows = None
+        if power_sources and len(times):
+            table = self.power_source_table
+            time = table["time"].to_numpy()
+            lower, upper = _time_bounds(time, int(times.min()), int(times.max()) + 1)
+            table = table.iloc[lower:upper]
+            rows = table[_category_mask(table["power_source"], power_sources)]
+        return _gather(rows, "power_source", attributes, power_sources, times)
+
+    def power_source_series(self, attribute: str = "Carbon Released",
+                            power_sources: Optional[Iterable[str]] = None,
+                            start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        """Return a (times, power sources) table of an attribute.
+
+        Power and carbon are summed over the entities of a power source, the power available and carbon intensity are
+        the values of the power source itself.
+        """
+        column = _attribute_column(attribute)
+        table = self.power_source_table
+        lower, upper = _time_bounds(table["time"].to_numpy(), start, end)
+        rows = table.iloc[lower:upper]
+        if power_sources is not None:
+            rows = rows[_category_mask(rows["power_source"], power_sources)]
+        series = rows.pivot_table(index="time", columns="power_source", values=column, aggfunc="first", observed=True)
+        return self._reindex_times(series, start, end, power_sources)
+
+    def _reindex_times(self, series: pd.DataFrame, start: Optional[int], end: Optional[int],
+                       columns: Optional[Iterable[str]]) -> pd.DataFrame:
+        times = self.times()
+        lower, upper = _time_bounds(times, start, end)
+        series = series.reindex(index=times[lower:upper])
+        if columns is not None:
+            series = series.reindex(columns=list(columns))
+        series.columns = list(series.columns)
+        return series
+
+    def _time_slice(self, start: Optional[int], end: Optional[int]) -> pd.DataFrame:
+        table = self.table
+        if start is None and end is None:
+            return table
+        time = table["time"].to_numpy()
+        lower, upper = _time_bounds(time, start, end)
+        return table.iloc[lower:upper]
+
+    def _set_table(self, table: pd.DataFrame, power_source_table: Optional[pd.DataFrame] = None):
+        self._table = _sorted_by_time(table.astype(_TABLE_DTYPES))
+        self._power_source_table = None if power_source_table is None else _sorted_by_time(power_source_table)
+        self._times = None
+
+    def _load(self) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+        if self._captured_data is not None:
+            return _tables_from_updates(self._captured_data.items())
+        if self.filepath is None:
+            raise ValueError(f"Error: The results store has neither a file nor captured data.")
+        if self.file_format == "json":
+            with _open_text(self.filepath) as file:
+                return _tables_from_updates(json.load(file).items())
+        if self.file_format == "ndjson":
+            with _open_text(self.filepath) as file:
+                return _tables_from_updates(update for line in file if line.strip()
+                                            for update in json.loads(line).items())
+        if self.file_format == "columnar":
+            return pd.DataFrame(read_columnar(self.filepath)), None
+        if self.file_format == "csv":
+            return pd.read_csv(self.filepath), None
+        if self.file_format == "parquet":
+            return pd.read_parquet(self.filepath), None
+        return pd.read_feather(self.filepath), None
+
+    @classmethod
+    def _infer_format(cls, filepath: str) -> str:
+        name = filepath.lower()
+        for compression_extension in (".gz", ".xz"):
+            if name.endswith(compression_extension):
+                name = name[:-len(compression_extension)]
+        for extension, file_format in cls._EXTENSIONS.items():
+            if name.endswith(extension):
+                return file_format
+        raise ValueError(f"Error: Cannot infer the results format of {filepath}, please provide `file_format`.")
+
+
+_get_readings = itemgetter("Power Used", "Carbon Intensity", "Carbon Released")
+
+
+def _tables_from_updates(updates: Iterable[Tuple[str, dict]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # The entities of a power source rarely change between updates, so the categorical codes are built once per
+    # distinct set of entities and every update only contributes a block of codes and its readings.
+    entity_codes: Dict[str, int] = {}
+    power_source_codes: Dict[str, int] = {}
+    code_blocks: Dict[Tuple[str, ...], np.ndarray] = {}
+    times, power_sources, powers_available, block_sizes = [], [], [], []
+    entity_blocks: List[np.ndarray] = []
+    readings = []
+    for time, data in updates:
+        time = int(time)
+        for power_source, power_source_data in data.items():
+            entities = tuple([entity for entity, reading in power_source_data.items() if isinstance(reading, dict)])
+            block = code_blocks.get(entities)
+            if block is None:
+                block = code_blocks[entities] = np.array(
+                    [entity_codes.setdefault(entity, len(entity_codes)) for entity in entities], dtype=np.int32)
+            entity_blocks.append(block)
+            readings.extend(map(_get_readings, map(power_source_data.__getitem__, entities)))
+            times.append(time)
+            power_sources.append(power_source_codes.setdefault(power_source, len(power_source_codes)))
+            powers_available.append(power_source_data.get("Power Available"))
+            block_sizes.append(len(entities))
+
+    block_sizes = np.array(block_sizes, dtype=np.intp)
+    times = np.array(times, dtype=np.int64)
+    power_sources = pd.Categorical.from_codes(np.array(power_sources, dtype=np.int32), list(power_source_codes))
+    powers_available = np.array(powers_available, dtype=float)
+    values = np.array(readings, dtype=float).reshape(-1, 3)
+    entity_codes_column = np.concatenate(entity_blocks) if entity_blocks else np.zeros(0, dtype=np.int32)
+    table = pd.DataFrame({
+        "time": np.repeat(times, block_sizes),
+        "power_source": pd.Categorical.from_codes(np.repeat(power_sources.codes, block_sizes),
+                                                  power_sources.categories),
+        "entity": pd.Categorical.from_codes(entity_codes_column, list(entity_codes)),
+        "power_used": values[:, 0],
+        "carbon_intensity": values[:, 1],
+        "carbon_released": values[:, 2],
+        "power_available": np.repeat(powers_available, block_sizes),
+    }, columns=RESULT_COLUMNS)
+
+    # Reduce the readings of every block, i.e. power source and update, power sources without entities use zero
+    block_values = np.zeros((len(block_sizes), 3))
+    block_values[:, 1] = np.nan
+    non_empty = block_sizes > 0
+    if np.any(non_empty):
+        block_starts = (np.cumsum(block_sizes) - block_sizes)[non_empty]
+        block_values[non_empty] = np.add.reduceat(values, block_starts, axis=0)
+        block_values[non_empty, 1] = values[block_starts, 1]
+    power_source_table = pd.DataFrame({
+        "time": times,
+        "power_source": power_sources,
+        "power_used": block_values[:, 0],
+        "carbon_released": block_values[:, 2],
+        "carbon_intensity": block_values[:, 1],
+        "power_available": powers_available,
+    })
+    return table, power_source_table
+
+
+def _sorted_by_time(table: pd.DataFrame) -> pd.DataFrame:
+    time = table["time"].to_numpy()
+    if len(time) > 1 and np.any(time[1:] < time[:-1]):
+        table = table.iloc[np.argsort(time, kind="stable")]
+    return table.reset_index(drop=True)
+
+
+def _gather(rows: Optional[pd.DataFrame], name_column: str, attributes: Iterable[str], names: List[str],
+            times: np.ndarray) -> Dict[str, np.ndarray]:
+    """Scatter the attributes of the rows into (names, times) arrays, NaN where no row exists."""
+    attributes = list(attributes)
+    columns = [_attribute_column(attribute) for attribute in attributes]
+    results = {attribute: np.full((len(names), len(times)), np.nan) for attribute in attributes}
+    if rows is None or not len(rows):
+        return results
+
+    # Map the categorical codes of the rows to the requested names
+    name_values = rows[name_column]
+    categories = name_values.cat.categories
+    row_of_category = np.full(len(categories) + 1, -1)
+    category_indices = categories.get_indexer(names)
+    row_of_category[category_indices[category_indices >= 0]] = np.flatnonzero(category_indices >= 0)
+    name_rows = row_of_category[name_values.cat.codes.to_numpy()]
+
+    row_times = rows["time"].to_numpy()
+    time_order = np.argsort(times, kind="stable")
+    positions = np.searchsorted(times, row_times, sorter=time_order).clip(max=len(times) - 1)
+    time_columns = time_order[positions]
+    valid = (name_rows >= 0) & (times[time_columns] == row_times)
+    for attribute, column in zip(attributes, columns):
+        results[attribute][name_rows[valid], time_columns[valid]] = rows[column].to_numpy()[valid]
+    return results
+
+
+def _captured_data_from_table(table: pd.DataFrame) -> Dict[str, dict]:
+    captured_data: Dict[str, dict] = {}
+    for time, power_source, entity, power_used, carbon_intensity, carbon_released, power_available in zip(
+            *(table[column].tolist() for column in RESULT_COLUMNS)):
+        power_sources = captured_data.setdefault(str(time), {})
+        power_source_data = power_sources.get(power_source)
+        if power_source_data is None:
+            power_source_data = power_sources[power_source] = {"Total Carbon Released": 0}
+            if not np.isnan(power_available):
+                power_source_data["Power Available"] = power_available
+        power_source_data[entity] = {"Power Used": power_used, "Carbon Intensity": carbon_intensity,
+                                     "Carbon Released": carbon_released}
+        power_source_data["Total Carbon Released"] += carbon_released
+    return captured_data
+
+
+def _open_text(filepath: str):
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "rt")
+    if filepath.endswith(".xz"):
+        return lzma.open(filepath, "rt")
+    return open(filepath)
+
+
+def _attribute_column(attribute: str) -> str:
+    if attribute in ATTRIBUTE_COLUMNS:
+        return ATTRIBUTE_COLUMNS[attribute]
+    if attribute in ATTRIBUTE_COLUMNS.values():
+        return attribute
+    raise ValueError(f"Error: Unknown attribute {attribute}, expected one of {list(ATTRIBUTE_COLUMNS)}.")
+
+
+def _category_mask(column: pd.Series, names: Iterable[str]) -> np.ndarray:
+    categories = column.cat.categories
+    codes = categories.get_indexer(list(names))
+    return np.isin(column.cat.codes.to_numpy(), codes[codes >= 0])
+
+
+def _time_bounds(time: np.ndarray, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+    lower = 0 if start is None else int(np.searchsorted(time, start, side="left"))
+    upper = len(time) if end is None else int(np.searchsorted(time, end, side="left"))
+    return lower, upper
@@ -0,0 +1,230 @@
+import csv
+import gzip
+import json
+import lzma
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Tuple, Optional, TextIO, Iterable
+
+import numpy as np
+
+# Columns of the long-form representation of the data recorded by a power domain, one row per entity and update
+RESULT_COLUMNS = ("time", "power_source", "entity", "power_used", "carbon_intensity", "carbon_released",
+                  "power_available")
+
+TickData = Dict[str, Dict[str, object]]  # {PowerSource: {Entity: {...}, "Total Carbon Released": float, ...}}
+
+# Supported compressions of result files and the extensions appended to their file names
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "lzma": ".xz"}
+
+_COMPACT_SEPARATORS = (",", ":")
+
+
+def open_result_file(filepath: str, compression: Optional[str] = None) -> TextIO:
+    """Open a text file for writing results, optionally compressed with `gzip` or `lzma`."""
+    if compression is None:
+        return open(filepath, "w", newline="")
+    if compression == "gzip":
+        return gzip.open(filepath, "wt", newline="")
+    if compression == "lzma":
+        return lzma.open(filepath, "wt", newline="")
+    raise ValueError(f"Error: Unsupported compression {compression}, "
+                     f"expected one of {[c for c in COMPRESSION_EXTENSIONS if c is not None]}.")
+
+
+def write_json_stream(file: TextIO, updates: Iterable[Tuple[str, TickData]]):
+    """Write (time, data) updates as a single compact JSON object, one update at a time.
+
+    The result equals `json.dumps(captured_data, separators=(",", ":"))` without holding the whole string in memory.
+    """
+    file.write("{")
+    for i, (time, data) in enumerate(updates):
+        if i:
+            file.write(",")
+        file.write(json.dumps(time))
+        file.write(":")
+        file.write(json.dumps(data, separators=_COMPACT_SEPARATORS))
+    file.write("}")
+
+
+def write_ndjson(file: TextIO, updates: Iterable[Tuple[str, TickData]]):
+    """Write (time, data) updates as newline delimited JSON, one compact `{time: data}` object per line."""
+    for time, data in updates:
+        file.write(json.dumps({time: data}, separators=_COMPACT_SEPARATORS))
+        file.write("\n")
+
+
+def iter_result_rows(time: str, data: TickData) -> Iterator[Tuple]:
+    """Flatten the data recorded by a power domain at a certain time into rows of :data:`RESULT_COLUMNS`."""
+    for power_source, power_source_data in data.items():
+        power_available = power_source_data.get("Power Available")
+        for entity, reading in power_source_data.items():
+            if isinstance(reading, dict):
+                yield (time, power_source, entity, reading["Power Used"], reading["Carbon Intensity"],
+                       reading["Carbon Released"], power_available)
+
+
+class ResultSink(ABC):
+    """Abstract base class for sinks which receive the data recorded by a :class:`PowerDomain` while it is running.
+
+    Updates are buffered and written in batches of `flush_interval` updates, so the results are on disk incrementally
+    while the memory used for them stays bounded. Sinks are added via :meth:`PowerDomain.add_sink` and have to be
+    closed via :meth:`PowerDomain.close_sinks` (or :meth:`close`) once the simulation ended to write the last batch.
+
+    Args:
+        flush_interval: The number of updates which are buffered before they are written.
+    """
+
+    def __init__(self, flush_interval: int = 100):
+        if flush_interval < 1:
+            raise ValueError(f"Error: Invalid flush interval {flush_interval}, it must be at least 1.")
+        self.flush_interval = flush_interval
+        self._batch: List[Tuple[str, TickData]] = []
+        self.closed = False
+
+    def append(self, time: str, data: TickData):
+        """Buffer the data recorded at `time` and write the batch once it is full."""
+        if self.closed:
+            raise ValueError(f"Error: Cannot append to the closed sink {self}.")
+        self._batch.append((time, data))
+        if len(self._batch) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered updates."""
+        if self._batch:
+            self._write_batch(self._batch)
+            self._batch = []
+
+    def close(self):
+        """Write all buffered updates and release the resources of the sink."""
+        if not self.closed:
+            self.flush()
+            self._close()
+            self.closed = True
+
+    @abstractmethod
+    def _write_batch(self, batch: List[Tuple[str, TickData]]):
+        """Write a batch of (time, data) updates."""
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvSink(ResultSink):
+    """Writes the recorded data as CSV file in long form with the columns :data:`RESULT_COLUMNS`.
+
+    Args:
+        filepath: Path of the CSV file, it is overwritten if it exists.
+        flush_interval: The number of updates which are buffered before they are written.
+    """
+
+    def __init__(self, filepath: str, flush_interval: int = 100):
+        super().__init__(flush_interval)
+        self.filepath = filepath
+        self._file = open_result_file(filepath)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(RESULT_COLUMNS)
+
+    def _write_batch(self, batch: List[Tuple[str, TickData]]):
+        for time, data in batch:
+            self._writer.writerows(iter_result_rows(time, data))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class NdjsonSink(ResultSink):
+    """Writes the recorded data as newline delimited JSON, one `{time: data}` object per update.
+
+    Merging all lines results in the same structure as :attr:`PowerDomain.captured_data`.
+
+    Args:
+        filepath: Path of the NDJSON file, it is overwritten if it exists.
+        flush_interval: The number of updates which are buffered before they are written.
+        compression: (Optional) Compress the file with `gzip` or `lzma`.
+    """
+
+    def __init__(self, filepath: str, flush_interval: int = 100, compression: Optional[str] = None):
+        super().__init__(flush_interval)
+        self.filepath = filepath
+        self._file = open_result_file(filepath, compression)
+
+    def _write_batch(self, batch: List[Tuple[str, TickData]]):
+        write_ndjson(self._file, batch)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ColumnarSink(ResultSink):
+    """Writes the recorded data in a binary columnar format.
+
+    Every batch is appended to the file as a NumPy structured array with the fields of :data:`RESULT_COLUMNS`, use
+    :func:`read_columnar` to read all batches back into a single array.
+
+    Args:
+        filepath: Path of the file, it is overwritten if it exists.
+        flush_interval: The number of updates which are buffered before they are written.
+    """
+
+    def __init__(self, filepath: str, flush_interval: int = 100):
+        super().__init__(flush_interval)
+        self.filepath = filepath
+        self._file = open(filepath, "wb")
+
+    def _write_batch(self, batch: List[Tuple[str, TickData]]):
+        rows = [row for time, data in batch for row in iter_result_rows(time, data)]
+        if rows:
+            np.save(self._file, _to_structured_array(rows), allow_pickle=False)
+            self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class CallbackSink(ResultSink):
+    """Passes every batch of (time, data) updates to a user defined function.
+
+    Args:
+        callback: Function called with the list of (time, data) updates of every batch.
+        flush_interval: The number of updates which are buffered before the callback is called.
+    """
+
+    def __init__(self, callback: Callable[[List[Tuple[str, TickData]]], None], flush_interval: int = 1):
+        super().__init__(flush_interval)
+        self.callback = callback
+
+    def _write_batch(self, batch: List[Tuple[str, TickData]]):
+        self.callback(batch)
+
+
+def read_columnar(filepath: str) -> np.ndarray:
+    """Read all batches written by a :class:`ColumnarSink` into a single structured array."""
+    batches = []
+    with open(filepath, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        while file.tell() < size:
+            batches.append(np.load(file, allow_pickle=False))
+    if not batches:
+        return _to_structured_array([])
+    # String fields may differ in width between batches
+    dtype = np.result_type(*[batch.dtype for batch in batches])
+    return np.concatenate([batch.astype(dtype) for batch in batches])
+
+
+def _to_structured_array(rows: List[Tuple]) -> np.ndarray:
+    power_source_width = max((len(row[1]) for row in rows), default=1)
+    entity_width = max((len(row[2]) for row in rows), default=1)
+    dtype = np.dtype([("time", np.int64), ("power_source", f"U{power_source_width}"), ("entity", f"U{entity_width}"),
+                      ("power_used", np.float64), ("carbon_intensity", np.float64), ("carbon_released", np.float64),
+                      ("power_available", np.float64)])
+    return np.array([(int(row[0]),) + tuple(row[1:]) for row in rows], dtype=dtype)
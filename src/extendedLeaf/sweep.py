@@ -0,0 +1,218 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from simpy import Environment, Process
+
+from src.extendedLeaf.infrastructure import Infrastructure
+from src.extendedLeaf.power import PowerDomain
+
+
+class Scenario:
+    """A simulation which is set up and ready to be run, as returned by the scenario factory of a
+    :class:`ParameterSweep`.
+
+    While the simulation runs, the energy provided by every power source is accumulated from the data recorded by
+    the power domains, so the summary does not depend on `keep_captured_data`.
+
+    Args:
+        env: The simpy environment, the processes of the simulation are either registered with the environment or
+            via :meth:`add_process`, which also allows the scenario to be checkpointed.
+        power_domains: The power domains whose carbon and energy are summarised.
+        until: The time until which the simulation is run, see `Environment.run`.
+        infrastructure: (Optional) The infrastructure whose nodes and links are counted for pauses, defaults to the
+            entities of the power domains.
+    """
+
+    def __init__(self, env: Environment, power_domains: Iterable[PowerDomain], until: float,
+                 infrastructure: Optional[Infrastructure] = None):
+        self.env = env
+        self.power_domains: List[PowerDomain] = list(power_domains)
+        if not self.power_domains:
+            raise ValueError(f"Error: A scenario requires at least one power domain.")
+        self.until = until
+        self.infrastructure = infrastructure
+        self.processes: List[Tuple[Callable, tuple]] = []  # (function, args) of the processes, see add_process
+        self._running_processes: List[Process] = []
+        self._energy_recorders: Dict[str, _EnergyRecorder] = {}
+        for power_domain in self.power_domains:
+            self._energy_recorders[power_domain.name] = _EnergyRecorder()
+            power_domain.add_listener(self._energy_recorders[power_domain.name])
+
+    def __getstate__(self):
+        # The running processes belong to the environment, they are started again when a checkpoint is restored
+        state = self.__dict__.copy()
+        state["_running_processes"] = []
+        return state
+
+    def add_process(self, function: Callable, *args) -> Process:
+        """Start the process `function(*args)`, e.g. `scenario.add_process(power_domain.run, env)`.
+
+        The function is kept so the process can be started again when a checkpoint of the scenario is restored, see
+        :class:`Checkpoint`. It must therefore be periodic and keep its state in objects rather than local variables,
+        like :meth:`PowerDomain.run` and :meth:`EventDomain.run`.
+        """
+        self.processes.append((function, args))
+        process = self.env.process(function(*args))
+        self._running_processes.append(process)
+        return process
+
+    def advance(self, until: float):
+        """Run the simulation until the time `until`, which must not be after the end of the scenario."""
+        if until > self.until:
+            raise ValueError(f"Error: Cannot advance the scenario to {until}, it ends at {self.until}.")
+        self.env.run(until=until)
+
+    def run(self) -> dict:
+        """Run the simulation and return its summary, see :meth:`summary`."""
+        self.env.run(until=self.until)
+        return self.summary()
+
+    def entities(self) -> list:
+        """Return the nodes and links counted for pauses."""
+        if self.infrastructure is not None:
+            return self.infrastructure.nodes() + self.infrastructure.links()
+        entities = []
+        for power_domain in self.power_domains:
+            entities.extend(entity for entity in power_domain.powered_infrastructure if entity not in entities)
+            for power_source in power_domain.power_sources:
+                entities.extend(entity for entity in power_source.powered_infrastructure if entity not in entities)
+        return entities
+
+    def summary(self) -> dict:
+        """Return a compact, JSON serializable summary of the simulation so far:
+
+            {"total_carbon": float,
+             "power_domains": {power domain: {"total_carbon": float, "energy": {power source: float}}},
+             "pause_counts": {entity: int}, only entities which were paused at least once,
+             "total_pauses": int}
+        """
+        power_domains = {}
+        for power_domain in self.power_domains:
+            energy = self._energy_recorders[power_domain.name].energy
+            power_domains[power_domain.name] = {"total_carbon": float(power_domain.return_total_carbon_emissions()),
+                                                "energy": {name: float(energy[name]) for name in sorted(energy)}}
+        pause_counts = {entity.name: entity.pause_count for entity in self.entities()
+                        if getattr(entity, "pause_count", 0)}
+        return {"total_carbon": sum(summary["total_carbon"] for summary in power_domains.values()),
+                "power_domains": power_domains,
+                "pause_counts": pause_counts,
+                "total_pauses": sum(pause_counts.values())}
+
+
+class _EnergyRecorder:
+    """Accumulates the energy provided by every power source of a power domain. A class rather than a closure, so
+    scenarios can be pickled."""
+
+    def __init__(self):
+        self.energy: Dict[str, float] = {}
+
+    def __call__(self, time: str, data: dict):
+        for power_source_name, readings in data.items():
+            power_used = sum(reading["Power Used"] for reading in readings.values() if isinstance(reading, dict))
+            self.energy[power_source_name] = self.energy.get(power_source_name, 0.0) + power_used
+
+
+def _run_configuration(factory: Callable[..., Scenario], parameters: dict) -> dict:
+    """Build and run the scenario of a single configuration, this is executed in the worker processes."""
+    return factory(**parameters).run()
+
+
+class ParameterSweep:
+    """Runs a scenario for every configuration of a parameter grid in a pool of processes.
+
+    Instead of editing the constants of a scenario and re-running it, the scenario is built by a factory which takes
+    the swept parameters as keyword arguments, e.g.
+
+        sweep = ParameterSweep(create_scenario, {"battery_size": [20, 40], "start_time": ["06:00:00", "12:00:00"]})
+        for parameters, summary in sweep.run():
+            print(parameters, summary["total_carbon"])
+
+    Args:
+        factory: A function taking the parameters of a configuration as keyword arguments and returning a
+            :class:`Scenario`. It is sent to the worker processes, so it must be defined at the top level of a module.
+        grid: Either {parameter: [values]}, which is expanded to the cartesian product of the values, or a list of
+            configurations {parameter: value}. Values must be picklable.
+        max_workers: (Optional) The number of processes, defaults to the number of CPUs. With a single worker the
+            configurations are run in this process.
+        cache_dir: (Optional) A directory in which the summary of every configuration is stored, configurations with
+            a stored summary are not run again. The summaries are keyed by the factory and the parameters, so the
+            cache must be cleared when the scenario itself changes.
+    """
+
+    def __init__(self, factory: Callable[..., Scenario], grid: Union[Dict[str, list], List[dict]],
+                 max_workers: int = None, cache_dir: str = None):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError(f"Error: The number of workers must be at least 1, got {max_workers}.")
+        self.factory = factory
+        self.grid = grid
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+
+    def configurations(self) -> List[dict]:
+        """Return the parameters of every configuration of the grid in order."""
+        if isinstance(self.grid, dict):
+            names = list(self.grid)
+            return [dict(zip(names, values)) for values in itertools.product(*(self.grid[name] for name in names))]
+        return [dict(configuration) for configuration in self.grid]
+
+    def cache_key(self, parameters: dict) -> str:
+        """Return the key of the cached summary of a configuration."""
+        description = json.dumps({"factory": f"{self.factory.__module__}.{self.factory.__qualname__}",
+                                  "parameters": parameters}, sort_keys=True, default=_describe)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def run(self) -> List[Tuple[dict, dict]]:
+        """Run all configurations which are not cached.
+
+        Returns:
+            (parameters, summary) of every configuration in order, see :meth:`Scenario.summary`.
+        """
+        configurations = self.configurations()
+        summaries = [self._load_summary(parameters) for parameters in configurations]
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+
+        workers = min(self.max_workers or os.cpu_count() or 1, len(pending))
+        if workers <= 1:
+            for i in pending:
+                summaries[i] = _run_configuration(self.factory, configurations[i])
+                self._store_summary(configurations[i], summaries[i])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {i: executor.submit(_run_configuration, self.factory, configurations[i]) for i in pending}
+                for i, future in futures.items():
+                    summaries[i] = future.result()
+                    self._store_summary(configurations[i], summaries[i])
+        return list(zip(configurations, summaries))
+
+    def _cache_path(self, parameters: dict) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{self.cache_key(parameters)}.json")
+
+    def _load_summary(self, parameters: dict) -> Optional[dict]:
+        cache_path = self._cache_path(parameters)
+        if cache_path is None or not os.path.exists(cache_path):
+            return None
+        with open(cache_path) as file:
+            return json.load(file)["summary"]
+
+    def _store_summary(self, parameters: dict, summary: dict):
+        cache_path = self._cache_path(parameters)
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written to a temporary file first, so an interrupted sweep does not leave a partial summary behind
+        with open(f"{cache_path}.tmp", "w") as file:
+            json.dump({"parameters": parameters, "summary": summary}, file, default=_describe)
+        os.replace(f"{cache_path}.tmp", cache_path)
+
+
+def _describe(value) -> str:
+    """Describe parameter values which are not JSON serializable, e.g. power source classes."""
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
@@ -0,0 +1,126 @@
+import os
+import pickle
+import sys
+from collections import deque
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from simpy import Environment
+
+from src.extendedLeaf.power import PowerDomain
+
+
+class WhatIf:
+    """Evaluates candidate decisions of a running simulation, e.g. "how much carbon is released over the next hour if
+    this application is placed on that node?", without simulating the past again.
+
+    For every candidate the process is forked (copy-on-write, Linux and macOS only). The child applies the candidate
+    to its copy of the simulation, simulates the lookahead and sends a summary back to the parent, whose simulation is
+    left untouched. Several candidates are evaluated in parallel, e.g. within an orchestrator:
+
+        what_if = WhatIf(env, horizon=60, power_domains=[power_domain])
+        carbon = what_if.evaluate([partial(self.place_on, application, node) for node in nodes])
+        self.place_on(application, nodes[int(np.argmin(carbon))])
+
+    The lookahead runs in the middle of the current simulation step, so the process which called :meth:`evaluate`
+    (e.g. :meth:`EventDomain.run`) is not resumed during the lookahead. The sinks of `power_domains` are detached in
+    the children, as their files are shared with the parent.
+
+    Args:
+        env: The simpy environment of the running simulation.
+        horizon: The duration of the lookahead.
+        power_domains: (Optional) The power domains whose carbon released during the lookahead is the default summary.
+        summarize: (Optional) A function called in the child after the lookahead, which returns a picklable summary,
+            e.g. the charge of a battery. Defaults to the carbon released by `power_domains` during the lookahead.
+        max_workers: (Optional) The maximum number of children at a time, defaults to the number of CPUs.
+    """
+
+    def __init__(self, env: Environment, horizon: float, power_domains: Iterable[PowerDomain] = (),
+                 summarize: Optional[Callable[[], Any]] = None, max_workers: int = None):
+        if horizon <= 0:
+            raise ValueError(f"Error: The horizon of the lookahead must be positive, got {horizon}.")
+        if max_workers is not None and max_workers < 1:
+            raise ValueError(f"Error: The number of workers must be at least 1, got {max_workers}.")
+        self.env = env
+        self.horizon = horizon
+        self.power_domains: List[PowerDomain] = list(power_domains)
+        if summarize is None and not self.power_domains:
+            raise ValueError(f"Error: Either power domains or a summarize function have to be provided.")
+        self.summarize = summarize
+        self.max_workers = max_workers
+
+    def evaluate(self, candidates: Sequence[Callable[[], Any]]) -> list:
+        """Evaluate every candidate in a forked copy of the simulation.
+
+        Args:
+            candidates: Functions without arguments which apply a decision to the simulation, they are only called in
+                the children and do not need to be picklable.
+
+        Returns:
+            The summary of every candidate in order.
+        """
+        if not hasattr(os, "fork"):
+            raise ValueError(f"Error: What-if evaluation requires os.fork, which is not available on {sys.platform}.")
+        candidates = list(candidates)
+        workers = min(self.max_workers or os.cpu_count() or 1, len(candidates))
+        results, errors = [None] * len(candidates), []
+        running = deque()
+
+        # Buffered output would otherwise be written by the parent and every child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for index, candidate in enumerate(candidates):
+            if len(running) >= workers:
+                self._collect(*running.popleft(), results, errors)
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                self._run_child(candidate, write_fd)
+            os.close(write_fd)
+            running.append((index, pid, read_fd))
+        while running:
+            self._collect(*running.popleft(), results, errors)
+
+        if errors:
+            index, error = errors[0]
+            raise ValueError(f"Error: What-if candidate {index} failed, {error!r}") from error
+        return results
+
+    def _carbon_released(self) -> float:
+        return sum(power_domain.return_total_carbon_emissions() for power_domain in self.power_domains)
+
+    def _run_child(self, candidate: Callable[[], Any], write_fd: int):
+        """Apply the candidate, simulate the lookahead and write the summary to the pipe, never returns."""
+        try:
+            for power_domain in self.power_domains:
+                power_domain.sinks = []
+            carbon_released = self._carbon_released()
+            candidate()
+            self.env.run(until=self.env.now + self.horizon)
+            summary = self.summarize() if self.summarize is not None else self._carbon_released() - carbon_released
+            payload = pickle.dumps((True, summary))
+        except BaseException as e:
+            try:
+                payload = pickle.dumps((False, e))
+            except Exception:
+                payload = pickle.dumps((False, RuntimeError(repr(e))))
+        try:
+            with os.fdopen(write_fd, "wb") as file:
+                file.write(payload)
+        finally:
+            # Skip the cleanup of the parent's interpreter state, e.g. atexit handlers and open files
+            os._exit(0)
+
+    @staticmethod
+    def _collect(index: int, pid: int, read_fd: int, results: list, errors: list):
+        with os.fdopen(read_fd, "rb") as file:
+            payload = file.read()
+        os.waitpid(pid, 0)
+        if not payload:
+            errors.append((index, RuntimeError("the child terminated without a summary")))
+            return
+        ok, value = pickle.loads(payload)
+        if ok:
+            results[index] = value
+        else:
+            errors.append((index, value))
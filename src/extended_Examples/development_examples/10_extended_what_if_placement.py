@@ -0,0 +1,104 @@
+import logging
+from functools import partial
+
+import numpy as np
+import simpy
+
+from src.extendedLeaf.application import Application, SourceTask, ProcessingTask, SinkTask
+from src.extendedLeaf.events import EventDomain, Event
+from src.extendedLeaf.infrastructure import Node, Link, Infrastructure
+from src.extendedLeaf.orchestrator import Orchestrator
+from src.extendedLeaf.power import PowerModelNode, PowerModelLink, SolarPower, GridPower, BatteryPower, PowerDomain
+from src.extendedLeaf.whatif import WhatIf
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s\t%(message)s')
+
+
+def main():
+    """
+    Log Output:
+        INFO	Carbon released over the next 60 minutes when placing the processing task on grid_node: ... gCo2
+        INFO	Carbon released over the next 60 minutes when placing the processing task on solar_node: ... gCo2
+        INFO	Carbon released over the next 60 minutes when placing the processing task on battery_node: ... gCo2
+        INFO	Placing Application1 with its processing task on ...
+        INFO	Total carbon emitted: ... gCo2
+    """
+    env = simpy.Environment()
+    infrastructure = Infrastructure()
+
+    source_node = Node("source_node", cu=40, power_model=PowerModelNode(max_power=30, static_power=3))
+    grid_node = Node("grid_node", cu=40, power_model=PowerModelNode(max_power=40, static_power=5))
+    solar_node = Node("solar_node", cu=40, power_model=PowerModelNode(max_power=70, static_power=10))
+    battery_node = Node("battery_node", cu=30, power_model=PowerModelNode(max_power=50, static_power=7))
+    sink_node = Node("sink_node", cu=25, power_model=PowerModelNode(max_power=50, static_power=6))
+    for processing_node in [grid_node, solar_node, battery_node]:
+        infrastructure.add_link(Link(name=f"source_link_to_{processing_node.name}", src=source_node,
+                                     dst=processing_node, bandwidth=50e6, power_model=PowerModelLink(400e-9)))
+        infrastructure.add_link(Link(name=f"{processing_node.name}_link_to_sink", src=processing_node, dst=sink_node,
+                                     bandwidth=50e6, power_model=PowerModelLink(400e-9)))
+
+    power_domain = PowerDomain(env, name="Power Domain 1", start_time_str="12:00:00", update_interval=1)
+    grid_power = GridPower(env, power_domain=power_domain, priority=5, static=True,
+                           powered_infrastructure=[grid_node, sink_node])
+    solar_power = SolarPower(env, power_domain=power_domain, priority=1, static=True,
+                             powered_infrastructure=[source_node, solar_node] + infrastructure.links())
+    battery_power = BatteryPower(env, power_domain=power_domain, priority=0, total_power_available=30, static=True,
+                                 powered_infrastructure=[battery_node])
+    power_domain.add_power_source(grid_power)
+    power_domain.add_power_source(solar_power)
+    power_domain.add_power_source(battery_power)
+
+    source_task = SourceTask(cu=0.4, bound_node=source_node)
+    processing_task = ProcessingTask(cu=20)
+    sink_task = SinkTask(cu=12, bound_node=sink_node)
+    application = Application(name="Application1")
+    application.add_task(source_task)
+    application.add_task(processing_task, incoming_data_flows=[(source_task, 1000)])
+    application.add_task(sink_task, incoming_data_flows=[(processing_task, 300)])
+
+    orchestrator = LookaheadOrchestrator(infrastructure, power_domain, [grid_node, solar_node, battery_node])
+
+    event_domain = EventDomain(env, update_interval=1, start_time_str="12:00:00")
+    event_domain.add_event(Event(event=battery_power.recharge_battery, args=[grid_power], time_str="12:00:00",
+                                 repeat=False))
+    event_domain.add_event(Event(event=orchestrator.place_with_lookahead, args=[application], time_str="12:10:00",
+                                 repeat=False))
+
+    env.process(event_domain.run())
+    env.process(power_domain.run(env))
+    env.run(until=180)
+    logger.info(f"Total carbon emitted: {power_domain.return_total_carbon_emissions()} gCo2")
+
+
+class LookaheadOrchestrator(Orchestrator):
+    """Places the processing task of an application on the candidate node which releases the least carbon over the
+    lookahead, every candidate is simulated in a fork of the running simulation."""
+
+    def __init__(self, infrastructure: Infrastructure, power_domain: PowerDomain, candidate_nodes: [Node],
+                 horizon: int = 60):
+        super().__init__(infrastructure, power_domain)
+        self.candidate_nodes = candidate_nodes
+        self.horizon = horizon
+        self._processing_node = None
+
+    def _processing_task_placement(self, processing_task: ProcessingTask, application: Application) -> Node:
+        return self._processing_node
+
+    def place_on(self, application: Application, node: Node):
+        self._processing_node = node
+        self.place(application)
+
+    def place_with_lookahead(self, application: Application):
+        what_if = WhatIf(self.power_domain.env, self.horizon, power_domains=[self.power_domain])
+        carbon = what_if.evaluate([partial(self.place_on, application, node) for node in self.candidate_nodes])
+        for node, node_carbon in zip(self.candidate_nodes, carbon):
+            logger.info(f"Carbon released over the next {self.horizon} minutes when placing the processing task on "
+                        f"{node.name}: {node_carbon} gCo2")
+        best_node = self.candidate_nodes[int(np.argmin(carbon))]
+        logger.info(f"Placing {application.name} with its processing task on {best_node.name}")
+        self.place_on(application, best_node)
+
+
+if __name__ == '__main__':
+    main()
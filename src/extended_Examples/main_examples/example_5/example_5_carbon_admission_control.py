@@ -5,13 +5,13 @@ import numpy as np
 import simpy
 
 from src.extendedLeaf.animate import Animation, AllowCertainDebugFilter
-from src.extendedLeaf.application import Application, SourceTask, ProcessingTask, SinkTask
+from src.extendedLeaf.application import Application, ApplicationTemplate, SourceTask, ProcessingTask, SinkTask
 from src.extendedLeaf.events import EventDomain, Event
 from src.extendedLeaf.file_handler import FileHandler, FigurePlotter
 from src.extendedLeaf.infrastructure import Node, Link, Infrastructure
 from src.extendedLeaf.orchestrator import Orchestrator
-from src.extendedLeaf.power import PowerModelNode, PowerMeasurement, PowerMeter, PowerModelLink, SolarPower, \
-    GridPower, PowerDomain, BatteryPower, PoweredInfrastructureDistributor
+from src.extendedLeaf.power import PowerModelNode, PowerMeasurement, PowerMeter, MeterGroup, PowerModelLink, \
+    SolarPower, GridPower, PowerDomain, BatteryPower, PoweredInfrastructureDistributor
 from src.extended_Examples.main_examples.example_5.settings import *
 
 handler = logging.StreamHandler()
@@ -21,37 +21,20 @@ logging.basicConfig(level=logging.DEBUG, format='%(levelname)s\t%(message)s', ha
 
 
 def create_application_type_1(sensor, server):
-    applications = []
-    for i in range(NO_TYPE1_APPLICATIONS):
-        app1_source_task = SourceTask(cu=int(0.4 * sensor.power_model.max_power), bound_node=sensor)
-        app1_processing_task = ProcessingTask(cu=50)
-        app1_sink_task = SinkTask(cu=150, bound_node=server)
-        application = Application(name=f"{i}_Application_Type_1")
-        application.add_task(app1_source_task)
-        application.add_task(app1_processing_task, incoming_data_flows=[(app1_source_task, 1000)])
-        application.add_task(app1_sink_task, incoming_data_flows=[(app1_processing_task, 300)])
-
-        applications.append(application)
-    return applications
+    template = ApplicationTemplate(name="Application_Type_1")
+    source_task = template.add_task(SourceTask, cu=int(0.4 * sensor.power_model.max_power), bound_node=sensor)
+    processing_task = template.add_task(ProcessingTask, cu=50, incoming_data_flows=[(source_task, 1000)])
+    template.add_task(SinkTask, cu=150, incoming_data_flows=[(processing_task, 300)], bound_node=server)
+    return [template.instantiate(name=f"{i}_Application_Type_1") for i in range(NO_TYPE1_APPLICATIONS)]
 
 
 def create_application_type_2(sensor, server):
-    applications = []
-    for i in range(NO_TYPE2_APPLICATIONS):
-        app1_source_task = SourceTask(cu=int(0.4 * sensor.power_model.max_power), bound_node=sensor)
-        app1_processing_task_1 = ProcessingTask(cu=50)
-        app1_processing_task_2 = ProcessingTask(cu=50)
-        app1_sink_task = SinkTask(cu=100, bound_node=server)
-
-        application = Application(name=f"{i}_Application_Type_2")
-
-        application.add_task(app1_source_task)
-        application.add_task(app1_processing_task_1, incoming_data_flows=[(app1_source_task, 750)])
-        application.add_task(app1_processing_task_2, incoming_data_flows=[(app1_processing_task_1, 1000)])
-        application.add_task(app1_sink_task, incoming_data_flows=[(app1_processing_task_2, 300)])
-
-        applications.append(application)
-    return applications
+    template = ApplicationTemplate(name="Application_Type_2")
+    source_task = template.add_task(SourceTask, cu=int(0.4 * sensor.power_model.max_power), bound_node=sensor)
+    processing_task_1 = template.add_task(ProcessingTask, cu=50, incoming_data_flows=[(source_task, 750)])
+    processing_task_2 = template.add_task(ProcessingTask, cu=50, incoming_data_flows=[(processing_task_1, 1000)])
+    template.add_task(SinkTask, cu=100, incoming_data_flows=[(processing_task_2, 300)], bound_node=server)
+    return [template.instantiate(name=f"{i}_Application_Type_2") for i in range(NO_TYPE2_APPLICATIONS)]
 
 
 def main():
@@ -161,9 +144,9 @@ def main():
     env.process(event_domain.run())
     env.process(power_domain.run(env))
 
-    env.process(infrastructure_pm.run(env))
-    env.process(application1_pm.run(env))
-    env.process(application2_pm.run(env))
+    # The meters share the same nodes, measure each of them only once per time step
+    meter_group = MeterGroup([infrastructure_pm, application1_pm, application2_pm])
+    env.process(meter_group.run(env))
 
     env.run(until=600)  # run the simulation for 10 hours (until the battery is fully drained)
 
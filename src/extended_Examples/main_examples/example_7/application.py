@@ -1,21 +1,39 @@
-from src.extendedLeaf.application import Application, ProcessingTask, SourceTask, SinkTask
+from src.extendedLeaf.application import Application, ApplicationTemplate, ProcessingTask, SourceTask, SinkTask
 from src.extended_Examples.main_examples.example_7.settings import *
 
+# The sensor application template for the current settings, see `sensor_application_template`
+_sensor_application_template = None
+
+
+def sensor_application_template():
+    """ Every crop sensor runs the same application, so the task graph is validated once and shared. The template is
+        built from the current settings, which may be changed after the import, e.g. by `sweep.apply_settings`.
+
+        Returns:
+            The template and the ids of its source and sink tasks.
+    """
+    global _sensor_application_template
+    settings = (SENSOR_SOURCE_TASK_CU, SENSOR_SOURCE_TO_FOG_BIT_RATE, SENSOR_FOG_PROCESSOR_CU,
+                SENSOR_FOG_TO_CLOUD_BIT_RATE, SENSOR_CLOUD_TASK_CU)
+    if _sensor_application_template is None or _sensor_application_template[0] != settings:
+        template = ApplicationTemplate("Sensor_Application")
+        source_task = template.add_task(SourceTask, cu=SENSOR_SOURCE_TASK_CU)
+        processing_task = template.add_task(
+            ProcessingTask, cu=SENSOR_FOG_PROCESSOR_CU, incoming_data_flows=[(source_task, SENSOR_SOURCE_TO_FOG_BIT_RATE)])
+        sink_task = template.add_task(
+            SinkTask, cu=SENSOR_CLOUD_TASK_CU, incoming_data_flows=[(processing_task, SENSOR_FOG_TO_CLOUD_BIT_RATE)])
+        _sensor_application_template = (settings, template, source_task, sink_task)
+    return _sensor_application_template[1:]
+
 
 class SensorApplication(Application):
 
     def __init__(self, name, source_node, sink_node):
-        super().__init__(name)
+        template, source_task, sink_task = sensor_application_template()
+        super().__init__(name, template=template, bound_nodes={source_task: source_node, sink_task: sink_node})
         self.source_node = source_node
         self.sink_node = sink_node
 
-        source_task = SourceTask(cu=SENSOR_SOURCE_TASK_CU, bound_node=self.source_node)
-        self.add_task(source_task)
-        processing_task = ProcessingTask(cu=SENSOR_FOG_PROCESSOR_CU)
-        self.add_task(processing_task, incoming_data_flows=[(source_task, SENSOR_SOURCE_TO_FOG_BIT_RATE)])
-        sink_task = SinkTask(cu=SENSOR_CLOUD_TASK_CU, bound_node=self.sink_node)
-        self.add_task(sink_task, incoming_data_flows=[(processing_task, SENSOR_FOG_TO_CLOUD_BIT_RATE)])
-
 
 class DroneApplication(Application):
 
@@ -1,5 +1,4 @@
 import networkx as nx
-import matplotlib
 import simpy
 
 from src.extended_Examples.main_examples.example_7.infrastructure import *
@@ -9,7 +8,6 @@ from src.extendedLeaf.power import PowerDomain, PowerSource
 from src.extended_Examples.main_examples.example_7.settings import *
 from src.extendedLeaf.infrastructure import Infrastructure
 
-matplotlib.use('TkAgg')
 _recharge_station_counter = 0
 
 
@@ -32,6 +32,7 @@ def main():
 
     # Plot results
     total_carbon_consumed_list = []
+    figures_to_export = []  # (figure, number of plots, filename), written in parallel at the end
     file_handler = FileHandler()
     for i, plot in enumerate(farm.plots):
         filename = f"Plot_Results_{plot.plot_index}"
@@ -69,16 +70,17 @@ def main():
         figs = [fig0, fig1, fig2, fig3, fig4, fig5]
         for j, fig in enumerate(figs):
             main_fig = FigurePlotter.aggregate_subplots([fig], title="")
-            file_handler.write_figure_to_file(main_fig, 1, filename=f"example_pd{plot.plot_index}_7-{j}")
+            figures_to_export.append((main_fig, 1, f"example_pd{plot.plot_index}_7-{j}"))
 
         total_carbon_consumed_list.append(fig6)
         print(f"{plot.name} Total carbon emitted: {plot.power_domain.return_total_carbon_emissions()} gCo2eq")
 
         main_fig = FigurePlotter.aggregate_subplots(figs, title=f"Results for Scenario 7 Plot {i+1}.")
-        file_handler.write_figure_to_file(main_fig, len(figs), filename=f"plot{plot.plot_index}")
+        figures_to_export.append((main_fig, len(figs), f"plot{plot.plot_index}"))
 
     main_fig = FigurePlotter.aggregate_subplots(total_carbon_consumed_list, title="Summative Graphs for Example 7.")
-    file_handler.write_figure_to_file(main_fig, len(total_carbon_consumed_list), filename=f"Main_results")
+    figures_to_export.append((main_fig, len(total_carbon_consumed_list), "Main_results"))
+    file_handler.write_figures_to_files(figures_to_export)
 
 
 if __name__ == '__main__':
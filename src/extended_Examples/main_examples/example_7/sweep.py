@@ -0,0 +1,63 @@
+import simpy
+
+from src.extendedLeaf.events import EventDomain, Event
+from src.extendedLeaf.power import GridPower, SolarPower, WindPower
+from src.extendedLeaf.sweep import ParameterSweep, Scenario
+from src.extended_Examples.main_examples.example_7 import application, farm, infrastructure, mobility, orchestrator
+from src.extended_Examples.main_examples.example_7 import settings
+
+# The modules of the example which import the settings, see `apply_settings`
+EXAMPLE_MODULES = [application, infrastructure, farm, mobility, orchestrator]
+
+
+def apply_settings(**overrides):
+    """Set the settings of the example to their values in settings.py, except for `overrides`.
+
+    The modules of the example import the settings by name, so they are replaced in every module rather than in
+    settings.py.
+    """
+    for name in overrides:
+        if not name.isupper() or not hasattr(settings, name):
+            raise ValueError(f"Error: {name} is not a setting of example 7.")
+    for module in EXAMPLE_MODULES:
+        for name, value in vars(settings).items():
+            if name.isupper() and name in vars(module):
+                setattr(module, name, overrides.get(name, value))
+
+
+def create_scenario(**overrides) -> Scenario:
+    """Build the farm of example 7 with the settings in `overrides`, see `main.py`."""
+    apply_settings(**overrides)
+    env = simpy.Environment()
+    current_farm = farm.Farm(env)
+
+    event_domain = EventDomain(env, update_interval=1, start_time_str=farm.START_TIME)
+    event_domain.add_event(Event(event=current_farm.deploy_sensor_applications, args=[], time_str="12:00:00",
+                                 repeat=True, repeat_counter=120))
+    event_domain.add_event(Event(event=current_farm.terminate_sensor_applications, args=[], time_str="13:00:00",
+                                 repeat=True, repeat_counter=120))
+
+    power_domains = [current_farm.main_power_domain] + [plot.power_domain for plot in current_farm.plots]
+    scenario = Scenario(env, power_domains, until=2880, infrastructure=current_farm.infrastructure)
+    # Started via the scenario rather than Farm.run, so the scenario can be checkpointed
+    for power_domain in power_domains:
+        scenario.add_process(power_domain.run, env)
+    scenario.add_process(event_domain.run)
+    scenario.add_process(mobility.MobilityManager().run, env, current_farm)
+    return scenario
+
+
+def main():
+    grid = {"DRONE_BATTERY_SIZE": [35, 40, 45],
+            "POWER_SOURCES_AVAILABLE": [settings.POWER_SOURCES_AVAILABLE,
+                                        [[SolarPower, WindPower, GridPower], [WindPower, GridPower], [WindPower],
+                                         [GridPower]]]}
+    sweep = ParameterSweep(create_scenario, grid, cache_dir="sweep_cache")
+    for parameters, summary in sweep.run():
+        print(f"Drone battery size: {parameters['DRONE_BATTERY_SIZE']}, "
+              f"power sources: {[[power_source.__name__ for power_source in power_sources] for power_sources in parameters['POWER_SOURCES_AVAILABLE']]}")
+        print(f"\tTotal carbon emitted: {summary['total_carbon']} gCo2eq, pauses: {summary['total_pauses']}")
+
+
+if __name__ == '__main__':
+    main()
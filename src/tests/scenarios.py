@@ -0,0 +1,33 @@
+import simpy
+
+from src.extendedLeaf.events import Event, EventDomain
+from src.extendedLeaf.infrastructure import Node, Infrastructure
+from src.extendedLeaf.power import PowerModelNode, PowerDomain, GridPower, SolarPower, BatteryPower
+from src.extendedLeaf.sweep import Scenario
+
+
+def create_recharged_scenario() -> Scenario:
+    """A sensor powered by a battery which is recharged from the grid every hour, and a server powered by solar power
+    or the grid."""
+    env = simpy.Environment()
+    infrastructure = Infrastructure()
+    sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=10, static_power=5))
+    server = Node("Server", cu=10, power_model=PowerModelNode(max_power=10, static_power=5))
+    infrastructure.add_node(sensor)
+    infrastructure.add_node(server)
+
+    power_domain = PowerDomain(env, name="Power Domain", start_time_str="10:00:00", powered_infrastructure=[server])
+    battery = BatteryPower(env, power_domain=power_domain, static=True, powered_infrastructure=[sensor])
+    battery.remaining_power = 2
+    grid = GridPower(env, power_domain=power_domain, priority=1)
+    power_domain.add_power_source(SolarPower(env, power_domain=power_domain, priority=0))
+    power_domain.add_power_source(grid)
+    power_domain.add_power_source(battery)
+
+    event_domain = EventDomain(env, start_time_str="10:00:00")
+    event_domain.add_event(Event(event=battery.recharge_battery, args=[grid], time_str="10:30:00", repeat=True,
+                                 repeat_counter=60))
+    scenario = Scenario(env, [power_domain], until=240, infrastructure=infrastructure)
+    scenario.add_process(power_domain.run, env)
+    scenario.add_process(event_domain.run)
+    return scenario
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from src.extendedLeaf.animate import AnimationTopology, TopologyArtists, NODE_SIZE, OfflineAnimation
+
+
+def captured_data():
+    reading = {"Power Used": 1, "Carbon Intensity": 100, "Carbon Released": 0.1}
+    return {
+        "720": {"Grid": {"Server": reading, "Sensor": reading, "Total Carbon Released": 0.2, "Power Available": 50}},
+        "721": {"Grid": {"Server": reading, "Total Carbon Released": 0.1, "Power Available": 50},
+                "Solar": {"Sensor": reading, "Total Carbon Released": 0.1, "Power Available": 10}},
+        "722": {"Grid": {"Server": reading, "Total Carbon Released": 0.1, "Power Available": 50},
+                "Solar": {"Sensor": reading, "Total Carbon Released": 0.1, "Power Available": 10}},
+        "723": {"Grid": {"Server": reading, "Sensor": reading, "Total Carbon Released": 0.2, "Power Available": 50}},
+    }
+
+
+class TestAnimationTopology(unittest.TestCase):
+    """ Given the data captured by a power domain whose sensor switches between power sources. """
+
+    def setUp(self):
+        self.topology = AnimationTopology(captured_data())
+
+    def test_topology(self):
+        """ Test that all nodes and edges are laid out once and their presence is known for every time. """
+        self.assertEqual(len(self.topology), 4)
+        self.assertEqual(self.topology.nodes, ["Grid", "Server", "Sensor", "Solar"])
+        self.assertEqual(self.topology.edges, [("Grid", "Server"), ("Grid", "Sensor"), ("Solar", "Sensor")])
+        self.assertEqual(set(self.topology.layout), set(self.topology.nodes))
+        np.testing.assert_array_equal(self.topology.edge_presence[:, 1], [True, False, False, True])
+        np.testing.assert_array_equal(self.topology.node_presence[:, 3], [False, True, True, False])
+
+        # The layout is deterministic
+        other = AnimationTopology(captured_data())
+        for node in self.topology.nodes:
+            np.testing.assert_array_equal(self.topology.layout[node], other.layout[node])
+
+    def test_changes(self):
+        """ Test that consecutive frames use the precomputed diffs and jumps compare the presence of the frames. """
+        shown_nodes, hidden_nodes, shown_edges, hidden_edges = self.topology.changes(None, 0)
+        self.assertEqual((list(shown_nodes), list(shown_edges)), ([0, 1, 2], [0, 1]))
+
+        shown_nodes, hidden_nodes, shown_edges, hidden_edges = self.topology.changes(0, 1)
+        self.assertEqual((list(shown_nodes), list(hidden_nodes)), ([3], []))
+        self.assertEqual((list(shown_edges), list(hidden_edges)), ([2], [1]))
+
+        _, _, shown_edges, hidden_edges = self.topology.changes(1, 2)
+        self.assertEqual((len(shown_edges), len(hidden_edges)), (0, 0))
+
+        shown_nodes, hidden_nodes, shown_edges, hidden_edges = self.topology.changes(3, 1)
+        self.assertEqual((list(shown_nodes), list(hidden_nodes)), ([3], []))
+        self.assertEqual((list(shown_edges), list(hidden_edges)), ([2], [1]))
+
+
+class TestTopologyArtists(unittest.TestCase):
+    """ Given the artists of a topology drawn on a figure without a display. """
+
+    def setUp(self):
+        self.figure = Figure()
+        FigureCanvasAgg(self.figure)
+        self.topology = AnimationTopology(captured_data())
+        self.artists = TopologyArtists(self.figure.add_subplot(), self.topology)
+
+    def test_show(self):
+        """ Test that only the artists of changed nodes and edges are updated between frames. """
+        self.artists.show(0)
+        np.testing.assert_array_equal(self.artists.node_collection.get_sizes(), [NODE_SIZE] * 3 + [0])
+        self.assertEqual([artist.get_visible() for artist in self.artists.edge_artists], [True, True, False])
+        self.assertEqual(self.artists.title.get_text(), "Time Step: 12:00:00")
+
+        changed = self.artists.show(1)
+        self.assertEqual([artist.get_visible() for artist in self.artists.edge_artists], [True, False, True])
+        self.assertTrue(self.artists.label_artists[3].get_visible())
+        self.assertEqual(len(changed), 5)  # title, nodes, Solar label and two edges
+
+        changed = self.artists.show(2)
+        self.assertEqual(changed, [self.artists.title])
+        self.figure.canvas.draw()
+
+
+class TestOfflineAnimation(unittest.TestCase):
+    """ Given an offline animation of captured data. """
+
+    def setUp(self):
+        self.animation = OfflineAnimation(captured_data(), figsize=(3, 2), dpi=50)
+
+    def test_frame_indices(self):
+        """ Test that frames are selected by time. """
+        self.assertEqual(self.animation.frame_indices(), [0, 1, 2, 3])
+        self.assertEqual(self.animation.frame_indices(start=721, end=723), [1, 2])
+        self.assertEqual(self.animation.frame_indices(step=2), [0, 2])
+        with self.assertRaises(ValueError):
+            self.animation.frame_indices(step=0)
+
+    def test_write(self):
+        """ Test that frames are rendered in parallel to images and assembled into a GIF. """
+        self.assertEqual(self.animation.render_frame(0).shape, (100, 150, 4))
+        with tempfile.TemporaryDirectory() as directory:
+            filepaths = self.animation.write_frames(os.path.join(directory, "frames"), max_workers=2)
+            self.assertEqual([os.path.basename(filepath) for filepath in filepaths],
+                             [f"frame_0000{i}.png" for i in range(4)])
+            self.assertTrue(all(os.path.exists(filepath) for filepath in filepaths))
+
+            gif_path = self.animation.write_gif(os.path.join(directory, "animation.gif"), start=721, max_workers=1)
+            with Image.open(gif_path) as gif:
+                self.assertEqual(gif.n_frames, 3)
+
+            with self.assertRaises(ValueError):
+                self.animation.write_gif(os.path.join(directory, "empty.gif"), start=800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+
+from src.extendedLeaf.application import Application, ApplicationTemplate, SourceTask, ProcessingTask, SinkTask
+from src.extendedLeaf.infrastructure import Node
+from src.extendedLeaf.power import PowerModelNode
+
+
+class TestApplication(unittest.TestCase):
+    """ Given an application built task by task. """
+
+    def setUp(self):
+        self.sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.server = Node("Server", power_model=PowerModelNode(power_per_cu=20e-3, static_power=20))
+        self.application = Application("Application")
+
+    def test_add_task(self):
+        """ Test that ids follow the insertion order and that data flows are created. """
+        source_task = SourceTask(cu=1, bound_node=self.sensor)
+        processing_task = ProcessingTask(cu=50)
+        sink_task = SinkTask(cu=150, bound_node=self.server)
+        self.application.add_task(source_task)
+        self.application.add_task(processing_task, incoming_data_flows=[(source_task, 1000)])
+        self.application.add_task(sink_task, incoming_data_flows=[(processing_task, 300)])
+
+        self.assertEqual([source_task.id, processing_task.id, sink_task.id], [0, 1, 2])
+        self.assertEqual(self.application.topological_order(), [source_task, processing_task, sink_task])
+        self.assertEqual(list(self.application.graph.edges), [(0, 1), (1, 2)])
+        self.assertEqual(self.application.get_application_paths(source_task), [[0, 1, 2]])
+
+    def test_add_tasks(self):
+        """ Test that a wide fan-in application can be added in bulk. """
+        source_tasks = [SourceTask(cu=1, bound_node=self.sensor) for _ in range(100)]
+        sink_task = SinkTask(cu=150, bound_node=self.server)
+        self.application.add_tasks([(source_task, None) for source_task in source_tasks] +
+                                   [(sink_task, [(source_task, 10) for source_task in source_tasks])])
+
+        self.assertEqual(sink_task.id, 100)
+        self.assertEqual(len(self.application.data_flows()), 100)
+        self.assertEqual(self.application.topological_order()[-1], sink_task)
+        self.assertEqual(self.application.graph.in_degree(sink_task.id), 100)
+
+    def test_add_invalid_task(self):
+        """ Test that invalid tasks are rejected without changing the application. """
+        source_task = SourceTask(cu=1, bound_node=self.sensor)
+        self.application.add_task(source_task)
+        other_source_task = SourceTask(cu=1, bound_node=self.sensor)
+        with self.assertRaises(AssertionError):
+            # the source of the data flow is not part of the application
+            self.application.add_tasks([(ProcessingTask(cu=1), [(source_task, 10)]),
+                                        (SinkTask(cu=1, bound_node=self.server), [(other_source_task, 10)])])
+        with self.assertRaises(AssertionError):
+            # a task cannot be added twice
+            self.application.add_task(source_task)
+        with self.assertRaises(AssertionError):
+            # sink tasks cannot have outgoing data flows
+            sink_task = SinkTask(cu=1, bound_node=self.server)
+            self.application.add_task(sink_task, incoming_data_flows=[(source_task, 10)])
+            self.application.add_task(ProcessingTask(cu=1), incoming_data_flows=[(sink_task, 10)])
+
+        self.assertEqual(len(self.application.tasks()), 2)
+        self.assertEqual(self.application._next_task_id, 2)
+
+
+class TestApplicationTemplate(unittest.TestCase):
+    """ Given an application template shared by many applications. """
+
+    def setUp(self):
+        self.sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.other_sensor = Node("Other Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.server = Node("Server", power_model=PowerModelNode(power_per_cu=20e-3, static_power=20))
+
+        self.template = ApplicationTemplate("Template")
+        self.source_task = self.template.add_task(SourceTask, cu=1)
+        self.processing_task = self.template.add_task(ProcessingTask, cu=50,
+                                                      incoming_data_flows=[(self.source_task, 1000)])
+        self.sink_task = self.template.add_task(SinkTask, cu=150,
+                                                incoming_data_flows=[(self.processing_task, 300)],
+                                                bound_node=self.server)
+
+    def test_instantiate(self):
+        """ Test that an instance matches an application built task by task. """
+        application = self.template.instantiate("Instance", bound_nodes={self.source_task: self.sensor})
+
+        expected = Application("Expected")
+        source_task = SourceTask(cu=1, bound_node=self.sensor)
+        processing_task = ProcessingTask(cu=50)
+        sink_task = SinkTask(cu=150, bound_node=self.server)
+        expected.add_task(source_task)
+        expected.add_task(processing_task, incoming_data_flows=[(source_task, 1000)])
+        expected.add_task(sink_task, incoming_data_flows=[(processing_task, 300)])
+
+        self.assertEqual(application.name, "Instance")
+        self.assertEqual([repr(task) for task in application.tasks()], [repr(task) for task in expected.tasks()])
+        self.assertEqual([df.bit_rate for df in application.data_flows()], [df.bit_rate for df in expected.data_flows()])
+        self.assertEqual(list(application.graph.edges), list(expected.graph.edges))
+        self.assertEqual(application.tasks()[0].bound_node, self.sensor)
+        self.assertEqual(application.tasks()[2].bound_node, self.server)
+        self.assertTrue(all(task.application is application for task in application.tasks()))
+        self.assertEqual(application.get_application_paths(application.tasks()[0]),
+                         expected.get_application_paths(expected.tasks()[0]))
+
+    def test_add_task_to_instance(self):
+        """ Test that tasks added to an instance are part of its paths, rather than the paths of the template. """
+        application = self.template.instantiate(bound_nodes={self.source_task: self.sensor})
+        source_task = application.tasks()[0]
+        application.add_task(SinkTask(cu=10, bound_node=self.server), incoming_data_flows=[(source_task, 100)])
+
+        self.assertEqual(application.get_application_paths(source_task), [[0, 1, 2], [0, 3]])
+        self.assertEqual(self.template.instantiate(bound_nodes={self.source_task: self.sensor})
+                         .get_application_paths(source_task), [[0, 1, 2]])
+
+    def test_instances_are_independent(self):
+        """ Test that the instances share the topology but not their tasks or allocation state. """
+        application_1 = self.template.instantiate(bound_nodes={self.source_task: self.sensor})
+        application_2 = self.template.instantiate(bound_nodes={self.source_task: self.other_sensor})
+        # The graph is only built once it is needed
+        self.assertIsNone(application_1._graph)
+
+        application_1.tasks()[0].allocate(self.sensor)
+
+        self.assertEqual(application_1.tasks()[0].node, self.sensor)
+        self.assertIsNone(application_2.tasks()[0].node)
+        self.assertEqual(application_2.tasks()[0].bound_node, self.other_sensor)
+        self.assertIsNot(application_1.data_flows()[0], application_2.data_flows()[0])
+
+    def test_invalid_templates(self):
+        """ Test that invalid task graphs are rejected when the template is built. """
+        template = ApplicationTemplate()
+        source_task = template.add_task(SourceTask)
+        with self.assertRaises(AssertionError):
+            # processing task without incoming data flows
+            template.add_task(ProcessingTask, cu=1)
+        with self.assertRaises(AssertionError):
+            # data flow from a task that does not exist yet
+            template.add_task(SinkTask, incoming_data_flows=[(source_task + 1, 10)])
+        with self.assertRaises(ValueError):
+            # processing tasks cannot be bound to a node
+            template.add_task(ProcessingTask, incoming_data_flows=[(source_task, 10)], bound_node=self.sensor)
+        with self.assertRaises(ValueError):
+            # the source task was never bound to a node
+            template.instantiate()
+        with self.assertRaises(ValueError):
+            # templates cannot be changed once instantiated
+            self.template.instantiate(bound_nodes={self.source_task: self.sensor})
+            self.template.add_task(SinkTask, incoming_data_flows=[(self.processing_task, 10)], bound_node=self.server)
+
+
+if __name__ == '__main__':
+    unittest.main()
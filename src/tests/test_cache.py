@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from src.extendedLeaf.cache import ResultCache, fingerprint
+from src.extendedLeaf.events import Event, EventDomain
+from src.extendedLeaf.power import BatteryPower, SolarPower
+from src.extendedLeaf.sinks import CallbackSink
+from src.tests.scenarios import create_recharged_scenario
+
+
+class TestFingerprint(unittest.TestCase):
+    """ Given a scenario with a battery recharged by events and a server powered by solar power or the grid. """
+
+    def setUp(self):
+        self.scenario = create_recharged_scenario()
+
+    def test_deterministic(self):
+        """ Test that building the same scenario again gives the same fingerprint. """
+        self.assertEqual(fingerprint(self.scenario), fingerprint(create_recharged_scenario()))
+        self.assertEqual(fingerprint(self.scenario), fingerprint(self.scenario))
+
+    def test_inputs(self):
+        """ Test that any change of the inputs changes the fingerprint. """
+        expected = fingerprint(self.scenario)
+        power_domain = self.scenario.power_domains[0]
+        solar, battery = [next(power_source for power_source in power_domain.power_sources
+                               if isinstance(power_source, power_type)) for power_type in [SolarPower, BatteryPower]]
+        changes = [(self.scenario, "until", 300),
+                   (power_domain, "start_time_string", "11:00:00"),
+                   (battery, "remaining_power", 3),
+                   (self.scenario.infrastructure.nodes()[0].power_model, "static_power", 6)]
+        for obj, attribute, value in changes:
+            original = getattr(obj, attribute)
+            setattr(obj, attribute, value)
+            self.assertNotEqual(fingerprint(self.scenario), expected, attribute)
+            setattr(obj, attribute, original)
+            self.assertEqual(fingerprint(self.scenario), expected, attribute)
+
+        data = solar.power_data_array.copy()
+        data[-1] += 1
+        solar.set_power_data(data)
+        self.assertNotEqual(fingerprint(self.scenario), expected)
+
+        scenario = create_recharged_scenario()
+        event_domain = scenario.processes[1][0].__self__
+        event_domain.events[0].time_int += 15
+        self.assertNotEqual(fingerprint(scenario), expected)
+
+    def test_unsupported(self):
+        """ Test that scenarios holding state which can not be hashed, e.g. generators, are rejected. """
+        self.scenario.infrastructure.nodes()[0].flight = (step for step in range(3))
+        with self.assertRaises(ValueError):
+            fingerprint(self.scenario)
+
+    def test_unregistered_process(self):
+        """ Test that scenarios with processes which were not added via the scenario are rejected. """
+        event_domain = EventDomain(self.scenario.env, start_time_str="10:00:00")
+        event_domain.add_event(Event(event=self.scenario.infrastructure.nodes()[0]._reserve_cu, args=[5],
+                                     time_str="10:30:00"))
+        self.scenario.env.process(event_domain.run())
+        with self.assertRaises(ValueError):
+            fingerprint(self.scenario)
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                ResultCache(directory).run(self.scenario)
+
+
+class TestResultCache(unittest.TestCase):
+    """ Given a cache in an empty directory. """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.directory.name, "cache"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run(self):
+        """ Test that a scenario is run once and its result is loaded afterwards. """
+        self.assertIsNone(self.cache.load(create_recharged_scenario()))
+        scenario = create_recharged_scenario()
+        self.assertIs(self.cache.run(scenario), scenario)
+        self.assertEqual(scenario.env.now, 240)
+        self.assertTrue(os.path.exists(self.cache.path(create_recharged_scenario())))
+
+        cached = self.cache.run(create_recharged_scenario())
+        self.assertIsNot(cached, scenario)
+        self.assertEqual(cached.env.now, 240)
+        self.assertEqual(cached.summary(), scenario.summary())
+        self.assertEqual(cached.power_domains[0].captured_data, scenario.power_domains[0].captured_data)
+
+        # A different scenario is not loaded from the cache
+        other = create_recharged_scenario()
+        other.until = 120
+        self.assertIsNone(self.cache.load(other))
+        self.assertIs(self.cache.run(other), other)
+        self.assertEqual(len(os.listdir(self.cache.cache_dir)), 2)
+
+    def test_sinks(self):
+        """ Test that scenarios whose results are written to sinks are not cached. """
+        scenario = create_recharged_scenario()
+        scenario.power_domains[0].add_sink(CallbackSink(lambda batch: None))
+        with self.assertRaises(ValueError):
+            self.cache.run(scenario)
+
+
+if __name__ == '__main__':
+    unittest.main()
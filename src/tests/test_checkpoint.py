@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from src.extendedLeaf.checkpoint import Checkpoint
+from src.extendedLeaf.power import SolarPower
+from src.tests.scenarios import create_recharged_scenario
+
+
+class TestCheckpoint(unittest.TestCase):
+    """ Given a scenario checkpointed half way. """
+
+    def setUp(self):
+        self.scenario = create_recharged_scenario()
+        self.scenario.advance(100)
+        self.checkpoint = Checkpoint.capture(self.scenario)
+
+    def test_restore(self):
+        """ Test that a restored scenario continues exactly like the uninterrupted one. """
+        expected = create_recharged_scenario()
+        expected_summary = expected.run()
+        self.assertEqual(self.checkpoint.time, 100)
+
+        restored = self.checkpoint.restore()
+        self.assertEqual(restored.env.now, 100)
+        self.assertEqual(restored.run(), expected_summary)
+        self.assertEqual(restored.power_domains[0].captured_data, expected.power_domains[0].captured_data)
+        # The original scenario is not affected by its checkpoints
+        self.assertEqual(self.scenario.run(), expected_summary)
+
+    def test_branch(self):
+        """ Test that branches of a checkpoint are independent of each other. """
+        branch = self.checkpoint.restore()
+        other_branch = self.checkpoint.restore()
+        solar, other_solar = [next(power_source for power_source in scenario.power_domains[0].power_sources
+                                   if isinstance(power_source, SolarPower)) for scenario in [branch, other_branch]]
+        self.assertIsNot(solar, other_solar)
+        solar.set_power_data(solar.power_data_array * 0)  # an overcast afternoon
+        energy = branch.run()["power_domains"]["Power Domain"]["energy"]
+        other_energy = other_branch.run()["power_domains"]["Power Domain"]["energy"]
+        self.assertLess(energy["Solar"], other_energy["Solar"])
+        self.assertGreater(energy["Grid"], other_energy["Grid"])
+
+    def test_save(self):
+        """ Test that checkpoints are written to and read from files. """
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "checkpoint.pickle")
+            self.checkpoint.save(filepath)
+            checkpoint = Checkpoint.load(filepath)
+        self.assertEqual(checkpoint.time, 100)
+        self.assertEqual(checkpoint.restore().run(), self.checkpoint.restore().run())
+
+    def test_pending_process(self):
+        """ Test that scenarios with processes which can not be restarted are not checkpointed. """
+        def flight(env):
+            yield env.timeout(50)
+        self.scenario.env.process(flight(self.scenario.env))
+        with self.assertRaises(ValueError):
+            Checkpoint.capture(self.scenario)
+
+        self.scenario.advance(160)
+        Checkpoint.capture(self.scenario)
+        self.scenario.power_domains[0].add_listener(lambda time, data: None)
+        with self.assertRaises(ValueError):
+            Checkpoint.capture(self.scenario)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from src.extendedLeaf.downsampling import downsample, lttb_indices, min_max_indices
+
+
+class TestDownsampling(unittest.TestCase):
+    """ Given several long time series with peaks, drops and gaps. """
+
+    def setUp(self):
+        self.x = np.arange(10000)
+        self.y = np.vstack([np.sin(self.x / 500), np.full(len(self.x), 5.0)])
+        self.y[0, 4321] = 20  # peak
+        self.y[1, 7000] = -3  # drop
+        self.y[1, 2000:3000] = np.nan  # gap
+
+    def test_lttb(self):
+        """ Test that LTTB keeps the end points, peaks and drops of every series. """
+        indices = lttb_indices(self.x, self.y, 500)
+        self.assertEqual(indices.shape, (2, 500))
+        self.assertTrue(np.all(np.diff(indices, axis=1) > 0))
+        self.assertEqual(list(indices[:, 0]), [0, 0])
+        self.assertEqual(list(indices[:, -1]), [9999, 9999])
+        self.assertIn(4321, indices[0])
+        self.assertIn(7000, indices[1])
+
+        x, y = downsample(self.x, self.y, 500, "lttb")
+        self.assertEqual(x.shape, (2, 500))
+        self.assertTrue(np.isnan(y[1]).any())
+
+    def test_min_max(self):
+        """ Test that min-max keeps the extremes of every bucket in order of time. """
+        indices = min_max_indices(self.y, 500)
+        self.assertEqual(indices.shape, (2, 500))
+        self.assertTrue(np.all(np.diff(indices, axis=1) >= 0))
+        self.assertIn(4321, indices[0])
+        self.assertIn(7000, indices[1])
+
+        x, y = downsample(self.x, self.y[1], 500, "minmax")
+        self.assertEqual(y.shape, (500,))
+        self.assertEqual(np.nanmin(y), -3)
+        self.assertTrue(np.isnan(y).any())
+
+    def test_short_series(self):
+        """ Test that short series are returned unchanged and invalid arguments are rejected. """
+        x, y = downsample(self.x[:100], self.y[:, :100], 500, "lttb")
+        np.testing.assert_array_equal(y, self.y[:, :100])
+        np.testing.assert_array_equal(x[1], self.x[:100])
+
+        with self.assertRaises(ValueError):
+            downsample(self.x, self.y, 500, "average")
+        with self.assertRaises(ValueError):
+            downsample(self.x, self.y, 2)
+        with self.assertRaises(ValueError):
+            downsample(self.x[:10], self.y, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
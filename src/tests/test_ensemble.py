@@ -0,0 +1,125 @@
+import unittest
+
+import numpy as np
+import simpy
+
+from src.extendedLeaf.ensemble import BlockBootstrap, Ensemble, GaussianNoise, StreamingQuantiles, perturb
+from src.extendedLeaf.infrastructure import Node, Infrastructure
+from src.extendedLeaf.power import PowerModelNode, PowerDomain, GridPower, SolarPower
+from src.extendedLeaf.sweep import Scenario
+
+
+def create_scenario() -> Scenario:
+    """A sensor powered by solar power, or by the grid when there is not enough sunshine."""
+    env = simpy.Environment()
+    infrastructure = Infrastructure()
+    sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=10, static_power=5))
+    infrastructure.add_node(sensor)
+    power_domain = PowerDomain(env, name="Power Domain", start_time_str="10:00:00", powered_infrastructure=[sensor])
+    power_domain.add_power_source(SolarPower(env, power_domain=power_domain, priority=0))
+    power_domain.add_power_source(GridPower(env, power_domain=power_domain, priority=1))
+    env.process(power_domain.run(env))
+    return Scenario(env, [power_domain], until=120, infrastructure=infrastructure)
+
+
+class TestPerturbations(unittest.TestCase):
+    """ Given the data set of a power source. """
+
+    def setUp(self):
+        self.values = np.arange(96, dtype=float)
+        self.rng = np.random.default_rng(0)
+
+    def test_gaussian_noise(self):
+        """ Test that readings are scaled by noise and never negative. """
+        perturbed = GaussianNoise(0.5)(self.values, self.rng)
+        self.assertEqual(perturbed.shape, self.values.shape)
+        self.assertTrue(np.all(perturbed >= 0))
+        self.assertFalse(np.array_equal(perturbed, self.values))
+        np.testing.assert_array_equal(GaussianNoise(0)(self.values, self.rng), self.values)
+        with self.assertRaises(ValueError):
+            GaussianNoise(-1)
+
+    def test_block_bootstrap(self):
+        """ Test that blocks of consecutive readings are drawn from around their own time of day. """
+        perturbed = BlockBootstrap(block_length=4, window=2)(self.values, self.rng)
+        self.assertEqual(perturbed.shape, self.values.shape)
+        shift = (perturbed - self.values + 48) % 96 - 48
+        self.assertTrue(np.all(np.abs(shift) <= 2))
+        np.testing.assert_array_equal(shift.reshape(24, 4), np.repeat(shift[::4, None], 4, axis=1))
+        np.testing.assert_array_equal(BlockBootstrap(window=0)(self.values, self.rng), self.values)
+
+    def test_perturb(self):
+        """ Test that the power sources are perturbed by the entries matching their name or class. """
+        scenario = create_scenario()
+        solar, grid = scenario.power_domains[0].power_sources
+        original_solar, original = solar.power_data_array.copy(), grid.power_data_array.copy()
+        perturb(scenario, {SolarPower: lambda values, rng: values + 1, "Solar": [lambda values, rng: values * 2]},
+                self.rng)
+        np.testing.assert_array_equal(solar.power_data_array, (original_solar + 1) * 2)
+        self.assertEqual(list(solar.power_data.values()), list(solar.power_data_array))
+        self.assertEqual(solar.get_power_at_time(0), solar.power_data_array[0])
+        np.testing.assert_array_equal(grid.power_data_array, original)
+        with self.assertRaises(ValueError):
+            solar.set_power_data([1, 2, 3])
+
+
+class TestStreamingQuantiles(unittest.TestCase):
+    """ Given a stream of observations. """
+
+    def test_values(self):
+        """ Test that the quantiles are exact for few observations and close to them for many. """
+        quantiles = StreamingQuantiles([0.25, 0.5], shape=(2,))
+        for values in [[3, 30], [1, 10], [2, 20]]:
+            quantiles.add(values)
+        np.testing.assert_array_equal(quantiles.values(), [[1.5, 15], [2, 20]])
+        np.testing.assert_array_equal(quantiles.mean(), [2, 20])
+
+        rng = np.random.default_rng(1)
+        observations = rng.normal(size=(2000, 3)) * [1, 2, 3]
+        quantiles = StreamingQuantiles([0.05, 0.5, 0.95], shape=(3,))
+        for values in observations:
+            quantiles.add(values)
+        self.assertEqual(quantiles.count, 2000)
+        np.testing.assert_allclose(quantiles.values(), np.quantile(observations, [0.05, 0.5, 0.95], axis=0),
+                                   atol=0.15)
+
+        with self.assertRaises(ValueError):
+            quantiles.add([1, 2])
+        with self.assertRaises(ValueError):
+            StreamingQuantiles([0.5, 1])
+        with self.assertRaises(ValueError):
+            StreamingQuantiles([0.5]).values()
+
+
+class TestEnsemble(unittest.TestCase):
+    """ Given an ensemble over noisy solar power and grid carbon intensity. """
+
+    def setUp(self):
+        self.perturbations = {SolarPower: [BlockBootstrap(), GaussianNoise(0.5)], "Grid": GaussianNoise(0.1)}
+
+    def test_run(self):
+        """ Test that forked replicas give the same distributions as replicas built in process. """
+        result = Ensemble(create_scenario, self.perturbations, replicas=8, max_workers=2).run()
+        self.assertEqual(result.replicas, 8)
+        np.testing.assert_array_equal(result.times, np.arange(600, 720))
+        self.assertEqual(result.power_sources, ["Grid", "Solar"])
+        self.assertEqual(result.carbon().shape, (3, 120))
+        self.assertTrue(np.all(np.diff(result.cumulative_carbon(), axis=0) >= 0))
+        self.assertTrue(np.all(result.cumulative_carbon()[:, -1] >= result.total_carbon.min()))
+        self.assertTrue(np.all(result.cumulative_carbon()[:, -1] <= result.total_carbon.max()))
+        lower, upper = result.total_carbon_interval(0.9)
+        self.assertLess(lower, upper)
+
+        in_process = Ensemble(create_scenario, self.perturbations, replicas=8, max_workers=1).run()
+        np.testing.assert_array_equal(in_process.estimates, result.estimates)
+        np.testing.assert_array_equal(in_process.total_carbon, result.total_carbon)
+        np.testing.assert_array_equal(in_process.energy("Solar"), result.energy("Solar"))
+
+        with self.assertRaises(ValueError):
+            result.energy("Wind")
+        with self.assertRaises(ValueError):
+            Ensemble(create_scenario, self.perturbations, replicas=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PLOTTING_MODULES = ["pandas", "plotly", "matplotlib", "tkinter"]
+
+
+def loaded_modules(modules: list, statement: str = "pass") -> list:
+    """Import the modules and run the statement in a fresh interpreter, return the plotting modules it loaded."""
+    code = "; ".join([f"import {module}" for module in modules] + [statement, "import sys",
+                     f"print(' '.join(m for m in {PLOTTING_MODULES} if m in sys.modules))"])
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+class TestImports(unittest.TestCase):
+    """ Given a fresh interpreter. """
+
+    def test_simulation_core(self):
+        """ Test that the simulation core does not import any plotting library. """
+        self.assertEqual(loaded_modules(["src.extendedLeaf.power", "src.extendedLeaf.infrastructure",
+                                         "src.extendedLeaf.application", "src.extendedLeaf.events",
+                                         "src.extendedLeaf.orchestrator", "src.extendedLeaf.sinks",
+                                         "src.extendedLeaf.ledger"]), [])
+
+    def test_visualization_modules(self):
+        """ Test that the visualization modules import their plotting libraries on first use. """
+        self.assertEqual(loaded_modules(["src.extendedLeaf.file_handler", "src.extendedLeaf.animate",
+                                         "src.extendedLeaf.results"]), [])
+        loaded = loaded_modules(["src.extendedLeaf.file_handler"], "src.extendedLeaf.file_handler.base_figure()")
+        self.assertIn("plotly", loaded)
+        self.assertNotIn("matplotlib", loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
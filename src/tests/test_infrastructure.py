@@ -0,0 +1,71 @@
+import unittest
+
+from src.extendedLeaf.application import Application, SourceTask, SinkTask
+from src.extendedLeaf.infrastructure import Infrastructure, Node, Link
+from src.extendedLeaf.power import PowerModelNode, PowerModelLink, PowerMeasurement
+
+
+class TestInfrastructure(unittest.TestCase):
+    """ Given an infrastructure of two nodes connected by a link. """
+
+    def setUp(self):
+        self.infrastructure = Infrastructure(validate_power=True)
+        self.sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.server = Node("Server", power_model=PowerModelNode(power_per_cu=20e-3, static_power=20))
+        self.link = Link(name="Link", src=self.sensor, dst=self.server, bandwidth=50e6,
+                         power_model=PowerModelLink(1e-6))
+        self.infrastructure.add_link(self.link)
+        for entity in [self.sensor, self.server, self.link]:
+            entity.paused = False
+
+    def assert_power_equal(self, expected: PowerMeasurement, actual: PowerMeasurement):
+        self.assertAlmostEqual(expected.dynamic, actual.dynamic)
+        self.assertAlmostEqual(expected.static, actual.static)
+
+    def expected_power(self) -> PowerMeasurement:
+        return PowerMeasurement.sum([self.sensor.measure_power(), self.server.measure_power(),
+                                     self.link.measure_power()])
+
+    def test_measure_power(self):
+        """ Test that the running totals follow allocations and pausing. """
+        self.assert_power_equal(PowerMeasurement(0, 20.007), self.infrastructure.measure_power())
+
+        application = Application()
+        source_task = SourceTask(cu=5, bound_node=self.sensor)
+        sink_task = SinkTask(cu=100, bound_node=self.server)
+        application.add_task(source_task)
+        application.add_task(sink_task, incoming_data_flows=[(source_task, 1000)])
+        source_task.allocate(self.sensor)
+        sink_task.allocate(self.server)
+        application.data_flows()[0].allocate([self.link])
+        self.assert_power_equal(self.expected_power(), self.infrastructure.measure_power())
+
+        self.server.paused = True
+        self.assert_power_equal(self.expected_power(), self.infrastructure.measure_power())
+
+        self.server.paused = False
+        application.deallocate()
+        self.assert_power_equal(PowerMeasurement(0, 20.007), self.infrastructure.measure_power())
+
+    def test_remove_node(self):
+        """ Test that removing a node also removes the power of its links. """
+        self.link._reserve_bandwidth(1000)
+        self.infrastructure.remove_node(self.server)
+
+        self.assert_power_equal(self.sensor.measure_power(), self.infrastructure.measure_power())
+        self.assertEqual(self.server._infrastructures, [])
+        self.assertEqual(self.link._infrastructures, [])
+
+    def test_validate_power(self):
+        """ Test that the debug mode detects totals diverging from a full recomputation. """
+        # Changing a power model in place is not tracked
+        self.server.power_model.static_power = 30
+        with self.assertRaises(RuntimeError):
+            self.infrastructure.measure_power()
+
+        self.infrastructure.refresh_power()
+        self.assert_power_equal(PowerMeasurement(0, 30.007), self.infrastructure.measure_power())
+
+
+if __name__ == '__main__':
+    unittest.main()
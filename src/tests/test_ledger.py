@@ -0,0 +1,147 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import simpy
+
+from src.extendedLeaf.application import Application, SourceTask, SinkTask
+from src.extendedLeaf.events import Event, EventDomain
+from src.extendedLeaf.infrastructure import Node, Link
+from src.extendedLeaf.ledger import CarbonLedger
+from src.extendedLeaf.power import PowerModelNode, PowerModelLink, PowerDomain, GridPower, BatteryPower
+
+
+class TestCarbonLedger(unittest.TestCase):
+    """ Given two applications sharing a server and a link. """
+
+    def setUp(self):
+        self.sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.server = Node("Server", power_model=PowerModelNode(power_per_cu=20e-3, static_power=20))
+        self.link = Link(name="Link", src=self.sensor, dst=self.server, bandwidth=50e6,
+                         power_model=PowerModelLink(1e-6))
+
+        self.applications = []
+        for cu in [1, 3]:
+            application = Application(f"Application {cu}")
+            source_task = SourceTask(cu=cu, bound_node=self.sensor)
+            sink_task = SinkTask(cu=10 * cu, bound_node=self.server)
+            application.add_task(source_task)
+            application.add_task(sink_task, incoming_data_flows=[(source_task, 1000 * cu)])
+            self.applications.append(application)
+        self.ledger = CarbonLedger(applications=self.applications)
+
+        self.data = {"Grid": {"Sensor": {"Power Used": 4, "Carbon Intensity": 100, "Carbon Released": 0.4},
+                              "Server": {"Power Used": 40, "Carbon Intensity": 100, "Carbon Released": 4},
+                              "Total Carbon Released": 4.4, "Power Available": 100},
+                     "Solar": {"Link": {"Power Used": 8, "Carbon Intensity": 10, "Carbon Released": 0.08},
+                               "Total Carbon Released": 0.08, "Power Available": 100}}
+
+    def allocate(self, application: Application):
+        source_task, sink_task = application.tasks()
+        source_task.allocate(self.sensor)
+        sink_task.allocate(self.server)
+        application.data_flows()[0].allocate([self.link])
+
+    def test_record(self):
+        """ Test that the recorded data is split by the share of the allocated resources. """
+        energy, carbon = self.ledger.record("0", self.data)
+        np.testing.assert_array_equal(energy, [0, 0])
+
+        for application in self.applications:
+            self.allocate(application)
+        energy, carbon = self.ledger.record("1", self.data)
+        np.testing.assert_allclose(energy, [1 + 10 + 2, 3 + 30 + 6])
+        np.testing.assert_allclose(carbon, [0.1 + 1 + 0.02, 0.3 + 3 + 0.06])
+
+        # Paused tasks do not consume power, as in Task.measure_power
+        self.applications[1].tasks()[1].pause()
+        energy, _ = self.ledger.record("2", self.data)
+        np.testing.assert_allclose(energy, [1 + 10 + 2, 3 + 6])
+
+        self.applications[1].tasks()[1].unpause()
+        self.applications[0].deallocate()
+        energy, _ = self.ledger.record("3", self.data)
+        np.testing.assert_allclose(energy, [0, 4 + 40 + 8])
+
+        self.assertAlmostEqual(self.ledger.energy(self.applications[0]), 26)
+        self.assertAlmostEqual(self.ledger.carbon(self.applications[1]), 3.36 + 0.36 + 4.48)
+        times, energy_history, _ = self.ledger.history()
+        self.assertEqual(times, ["0", "1", "2", "3"])
+        np.testing.assert_allclose(energy_history.sum(axis=0), [26, 39 + 9 + 52])
+
+    def test_shared_names(self):
+        """ Test that entities sharing a name are attributed separately by the power source powering them. """
+        self.link.name = "Server"
+        self.server.power_model.power_source = SimpleNamespace(name="Grid")
+        self.link.power_model.power_source = SimpleNamespace(name="Solar")
+        for application in self.applications:
+            self.allocate(application)
+        self.data["Solar"]["Server"] = self.data["Solar"].pop("Link")
+        energy, carbon = self.ledger.record("0", self.data)
+        np.testing.assert_allclose(energy, [1 + 10 + 2, 3 + 30 + 6])
+        np.testing.assert_allclose(carbon, [0.1 + 1 + 0.02, 0.3 + 3 + 0.06])
+
+        self.link.power_model.power_source = SimpleNamespace(name="Grid")
+        with self.assertRaises(ValueError):
+            self.ledger.record("1", self.data)
+
+    def test_add_application(self):
+        """ Test that applications can be added while they are placed and during the simulation. """
+        self.allocate(self.applications[0])
+        self.ledger.record("0", self.data)
+
+        application = Application("Late Application")
+        source_task = SourceTask(cu=6, bound_node=self.sensor)
+        application.add_task(source_task)
+        source_task.allocate(self.sensor)
+        self.ledger.add_application(application)
+        energy, _ = self.ledger.record("1", self.data)
+        np.testing.assert_allclose(energy, [4 / 7 + 40 + 8, 0, 4 * 6 / 7])
+
+        _, energy_history, _ = self.ledger.history()
+        self.assertEqual(energy_history.shape, (2, 3))
+        self.assertEqual(energy_history[0, 2], 0)
+        with self.assertRaises(ValueError):
+            self.ledger.add_application(application)
+
+    def test_power_domain(self):
+        """ Test that the ledger receives the final data of every update, including logged power consumption. """
+        env = simpy.Environment()
+        power_domain = PowerDomain(env, name="Power Domain", start_time_str="10:00:00")
+        battery = BatteryPower(env, power_domain=power_domain, static=True, powered_infrastructure=[self.sensor])
+        battery.remaining_power = 2
+        grid = GridPower(env, power_domain=power_domain, priority=1, static=True,
+                         powered_infrastructure=[self.server, self.link])
+        power_domain.add_power_source(battery)
+        power_domain.add_power_source(grid)
+        self.allocate(self.applications[0])
+        ledger = CarbonLedger(power_domain, applications=self.applications[:1])
+        listener_totals = []
+        power_domain.add_listener(lambda time, data: listener_totals.append(
+            sum(reading["Power Used"] for readings in data.values() for reading in readings.values()
+                if isinstance(reading, dict))))
+
+        event_domain = EventDomain(env, start_time_str="10:00:00")
+        event_domain.add_event(Event(event=battery.recharge_battery, args=[grid], time_str="10:30:00", repeat=True,
+                                     repeat_counter=60))
+        # e.g. the movement of a drone, which is logged in addition to the measured power of the server
+        event_domain.add_event(Event(event=power_domain.record_power_consumption, args=[self.server, grid, 5],
+                                     time_str="10:45:00"))
+        env.process(event_domain.run())
+        env.process(power_domain.run(env))
+        env.run(until=120)
+
+        readings = [(entity, reading) for data in power_domain.captured_data.values()
+                    for readings in data.values() for entity, reading in readings.items() if isinstance(reading, dict)]
+        self.assertIn(battery.name, [entity for entity, _ in readings])
+        self.assertEqual(len(listener_totals), 120)
+        self.assertAlmostEqual(sum(listener_totals), sum(reading["Power Used"] for _, reading in readings))
+        self.assertAlmostEqual(ledger.energy(self.applications[0]),
+                               sum(reading["Power Used"] for entity, reading in readings if entity != battery.name))
+        self.assertAlmostEqual(ledger.carbon(self.applications[0]),
+                               sum(reading["Carbon Released"] for entity, reading in readings
+                                   if entity != battery.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
+import gzip
 import json
+import lzma
 import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock
 
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
 from src.extendedLeaf.events import Event, EventDomain
 from src.extendedLeaf.file_handler import FileHandler
 from src.extendedLeaf.power import PowerDomain, SolarPower
@@ -287,6 +294,85 @@ class TestPowerDomain(unittest.TestCase):
         self.assertEqual(expected_data, data_written)
         self.assertEqual(expected_filepath, filepath_written_to)
 
+    def test_write_out_results_streamed(self):
+        """ Test that the streamed layouts write the same data compactly and optionally compressed. """
+        file_handler = FileHandler()
+        self.power_domain.captured_data = {str(time): {'Grid': {'node1': {'Power Used': time,
+                                                                          'Carbon Intensity': 2,
+                                                                          'Carbon Released': 2 * time},
+                                                                'Total Carbon Released': 2 * time}}
+                                           for time in range(3)}
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath, data_written = file_handler.write_out_results(self.power_domain, dir_path, "stream",
+                                                                    layout="stream")
+            self.assertIsNone(data_written)
+            self.assertEqual(filepath, os.path.join(dir_path, "stream.json"))
+            with open(filepath) as file:
+                self.assertEqual(file.read(), json.dumps(self.power_domain.captured_data, separators=(",", ":")))
+
+            filepath, _ = file_handler.write_out_results(self.power_domain, dir_path, "ndjson", layout="ndjson",
+                                                         compression="gzip")
+            self.assertEqual(filepath, os.path.join(dir_path, "ndjson.ndjson.gz"))
+            with gzip.open(filepath, "rt") as file:
+                lines = [json.loads(line) for line in file]
+            self.assertEqual(lines, [{time: data} for time, data in self.power_domain.captured_data.items()])
+
+            filepath, _ = file_handler.write_out_results(self.power_domain, dir_path, "lzma", layout="stream",
+                                                         compression="lzma")
+            with lzma.open(filepath, "rt") as file:
+                self.assertEqual(json.load(file), self.power_domain.captured_data)
+
+            with self.assertRaises(ValueError):
+                file_handler.write_out_results(self.power_domain, dir_path, "invalid", layout="json",
+                                               compression="gzip")
+
+    def test_write_out_table(self):
+        """ Test that the captured data is exported as long-form table. """
+        file_handler = FileHandler()
+        self.power_domain.captured_data = {"0": {'Grid': {'node1': {'Power Used': 0.06,
+                                                                    'Carbon Intensity': 2,
+                                                                    'Carbon Released': 0.12},
+                                                          'Total Carbon Released': 0.12,
+                                                          'Power Available': 10}},
+                                           "1": {'Wind': {'node2': {'Power Used': 0.1,
+                                                                    'Carbon Intensity': 1,
+                                                                    'Carbon Released': 0.1},
+                                                          'Total Carbon Released': 0.1}}}
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath, table = file_handler.write_out_table(self.power_domain, dir_path, "table")
+            self.assertEqual(filepath, os.path.join(dir_path, "table.csv"))
+            read_table = pd.read_csv(filepath)
+
+        self.assertEqual(list(read_table.columns), ["time", "power_source", "entity", "power_used",
+                                                    "carbon_intensity", "carbon_released", "power_available"])
+        self.assertEqual(list(table["time"]), [0, 1])
+        self.assertEqual(list(read_table["entity"]), ["node1", "node2"])
+        self.assertEqual(list(table["carbon_released"]), [0.12, 0.1])
+        self.assertEqual(table["power_available"][0], 10)
+        self.assertTrue(np.isnan(read_table["power_available"][1]))
+
+        with self.assertRaises(ValueError):
+            file_handler.write_out_table(self.power_domain, file_format="xlsx")
+
+    def test_write_figures_to_files(self):
+        """ Test that figures are exported without a display, sized and named in order, in a process pool. """
+        file_handler = FileHandler(figure_width=800)
+        figures = [(go.Figure(go.Scatter(x=[0, 1], y=[i, i + 1])), i + 1, name)
+                   for i, name in enumerate(["first", "invalid name", "third"])]
+        with tempfile.TemporaryDirectory() as dir_path:
+            file_handler.results_dir = dir_path
+            filepaths = file_handler.write_figures_to_files(figures, file_format="json", max_workers=2)
+            self.assertEqual([os.path.basename(filepath) for filepath in filepaths],
+                             ["first.json", "figure_0.json", "third.json"])
+            with open(filepaths[2]) as file:
+                layout = json.load(file)["layout"]
+            self.assertEqual((layout["width"], layout["height"]), (800, 730))
+
+            filepath = file_handler.write_figure_to_file(figures[0][0], 1, "single", width=500, file_format="html")
+            self.assertEqual(filepath, os.path.join(dir_path, "single.html"))
+            self.assertTrue(os.path.exists(filepath))
+            self.assertEqual(figures[0][0].layout.width, 500)
+
 
 class TestEventDomain(unittest.TestCase):
     """ Given a power domain.
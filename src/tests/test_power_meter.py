@@ -0,0 +1,216 @@
+import unittest
+
+import numpy as np
+import simpy
+
+from src.extendedLeaf.application import Application, SourceTask, SinkTask
+from src.extendedLeaf.infrastructure import Node, Link, Infrastructure
+from src.extendedLeaf.power import PowerAware, PowerMeasurement, PowerMeter, PowerModelNode, PowerModelLink, MeterGroup
+
+
+class TestPowerMeasurement(unittest.TestCase):
+    """ Given power measurements of several entities. """
+
+    def setUp(self):
+        self.measurements = [PowerMeasurement(1, 2), PowerMeasurement(3, 4), PowerMeasurement(0.5, 0)]
+
+    def test_sum(self):
+        """ Test that lists, generators and NumPy arrays are summed alike. """
+        for measurements in [self.measurements, (m for m in self.measurements),
+                             np.array([[1, 2], [3, 4], [0.5, 0]])]:
+            result = PowerMeasurement.sum(measurements)
+            self.assertEqual((result.dynamic, result.static), (4.5, 6))
+
+        empty = PowerMeasurement.sum([])
+        self.assertEqual((empty.dynamic, empty.static), (0, 0))
+        empty = PowerMeasurement.sum(np.empty((0, 2)))
+        self.assertEqual((empty.dynamic, empty.static), (0, 0))
+
+    def test_in_place_helpers(self):
+        """ Test that iadd and scale_into modify the measurement without allocating a new one. """
+        accumulator = PowerMeasurement(0, 0)
+        for measurement in self.measurements:
+            self.assertIs(accumulator.iadd(measurement), accumulator)
+        self.assertEqual((accumulator.dynamic, accumulator.static), (4.5, 6))
+
+        self.assertIs(accumulator.scale_into(2, accumulator), accumulator)
+        self.assertEqual((accumulator.dynamic, accumulator.static), (9, 12))
+
+        out = PowerMeasurement(0, 0)
+        self.measurements[0].scale_into(0.5, out)
+        self.assertEqual((out.dynamic, out.static), (0.5, 1))
+        self.assertEqual((self.measurements[0].dynamic, self.measurements[0].static), (1, 2))
+
+        with self.assertRaises(AttributeError):
+            # measurements are slotted
+            accumulator.total_power = 5
+
+
+class TestPowerMeter(unittest.TestCase):
+    """ Given a power meter measuring a single node. """
+
+    def setUp(self):
+        self.env = simpy.Environment()
+        self.node = Node("Node", cu=10, power_model=PowerModelNode(max_power=10, static_power=2))
+        self.node.paused = False
+        self.node._reserve_cu(5)
+
+    def test_run(self):
+        """ Test that measurements are stored in the columnar buffer and exposed without copying. """
+        callback_measurements = []
+        power_meter = PowerMeter(self.node, name="meter", callback=callback_measurements.append)
+        power_meter._buffer = np.empty((4, 3))  # force the buffer to grow during the run
+        self.env.process(power_meter.run(self.env))
+        self.env.run(until=10)
+
+        self.assertEqual(len(power_meter), 10)
+        np.testing.assert_array_equal(power_meter.times(), np.arange(10))
+        np.testing.assert_array_equal(power_meter.dynamic(), np.full(10, 4.0))
+        np.testing.assert_array_equal(power_meter.static(), np.full(10, 2.0))
+        np.testing.assert_array_equal(power_meter.totals(), np.full(10, 6.0))
+        self.assertTrue(np.shares_memory(power_meter.dynamic(), power_meter._buffer))
+        self.assertEqual(len(callback_measurements), 10)
+
+        self.assertEqual([(m.dynamic, m.static) for m in power_meter.measurements], [(4.0, 2.0)] * 10)
+        total = power_meter.total()
+        self.assertEqual((total.dynamic, total.static), (40.0, 20.0))
+
+    def test_ring_buffer(self):
+        """ Test that a ring buffer only keeps the latest measurements. """
+        power_meter = PowerMeter(self.node, buffer_size=4)
+        for time in range(10):
+            power_meter.record(time, PowerMeasurement(time, 0))
+
+        self.assertEqual(len(power_meter), 4)
+        np.testing.assert_array_equal(power_meter.times(), [6, 7, 8, 9])
+        np.testing.assert_array_equal(power_meter.dynamic(), [6, 7, 8, 9])
+
+        power_meter.record(10, PowerMeasurement(10, 0))
+        np.testing.assert_array_equal(power_meter.times(), [7, 8, 9, 10])
+
+        # Reading does not copy or rearrange the buffer
+        buffer = power_meter._buffer
+        for time in range(11, 20):
+            power_meter.record(time, PowerMeasurement(time, 0))
+            np.testing.assert_array_equal(power_meter.times(), np.arange(time - 3, time + 1))
+            self.assertTrue(np.shares_memory(power_meter.dynamic(), buffer))
+        self.assertIs(power_meter._buffer, buffer)
+        self.assertEqual(power_meter.total().dynamic, 16 + 17 + 18 + 19)
+
+        with self.assertRaises(ValueError):
+            PowerMeter(self.node, buffer_size=0)
+
+
+class TestMeterGroup(unittest.TestCase):
+    """ Given applications sharing the nodes and link of an infrastructure. """
+
+    def setUp(self):
+        self.env = simpy.Environment()
+        self.infrastructure = Infrastructure()
+        self.sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=0.15, static_power=0.007))
+        self.server = Node("Server", power_model=PowerModelNode(power_per_cu=20e-3, static_power=20))
+        self.link = Link(name="Link", src=self.sensor, dst=self.server, bandwidth=50e6,
+                         power_model=PowerModelLink(1e-6))
+        self.infrastructure.add_link(self.link)
+        for entity in [self.sensor, self.server, self.link]:
+            entity.paused = False
+
+        self.applications = []
+        for cu in [1, 2, 3]:
+            application = Application(f"Application {cu}")
+            source_task = SourceTask(cu=cu, bound_node=self.sensor)
+            sink_task = SinkTask(cu=10 * cu, bound_node=self.server)
+            application.add_task(source_task)
+            application.add_task(sink_task, incoming_data_flows=[(source_task, 1000 * cu)])
+            source_task.allocate(self.sensor)
+            sink_task.allocate(self.server)
+            application.data_flows()[0].allocate([self.link])
+            self.applications.append(application)
+
+    def test_measure(self):
+        """ Test that the group measures the same power as the individual meters. """
+        meters = [PowerMeter(application) for application in self.applications]
+        meters.append(PowerMeter(self.infrastructure.nodes()))
+        meters.append(PowerMeter(lambda: self.infrastructure.links()))
+        meter_group = MeterGroup(meters)
+
+        for meter, (dynamic, static) in zip(meters, meter_group.measure()):
+            expected = meter.measure()
+            self.assertAlmostEqual(dynamic, expected.dynamic)
+            self.assertAlmostEqual(static, expected.static)
+
+        self.applications[0].tasks()[0].pause()
+        self.server.paused = True
+        for meter, (dynamic, static) in zip(meters, meter_group.measure()):
+            expected = meter.measure()
+            self.assertAlmostEqual(dynamic, expected.dynamic)
+            self.assertAlmostEqual(static, expected.static)
+
+    def test_membership(self):
+        """ Test that the membership is kept between measurements and rebuilt when the allocations change. """
+        links = [self.link]
+        meters = [PowerMeter(application) for application in self.applications]
+        meters.append(PowerMeter(lambda: list(links)))
+        meter_group = MeterGroup(meters)
+
+        def assert_measurements():
+            for meter, (dynamic, static) in zip(meters, meter_group.measure()):
+                expected = meter.measure()
+                self.assertAlmostEqual(dynamic, expected.dynamic)
+                self.assertAlmostEqual(static, expected.static)
+
+        assert_measurements()
+        membership = meter_group._membership
+        assert_measurements()
+        self.assertIs(meter_group._membership, membership)
+
+        # Applications outside of the group change the shares but not the membership
+        other_task = SourceTask(cu=4, bound_node=self.sensor)
+        other_application = Application("Other Application")
+        other_application.add_task(other_task)
+        other_task.allocate(self.sensor)
+        assert_measurements()
+        self.assertIs(meter_group._membership, membership)
+
+        self.applications[0].deallocate()
+        self.assertIsNone(meter_group._membership)
+        assert_measurements()
+        self.applications[1].data_flows()[0].pause()
+        assert_measurements()
+
+        links.clear()
+        assert_measurements()
+        self.assertEqual(meter_group.measure()[3].tolist(), [0, 0])
+
+    def test_unknown_load(self):
+        """ Test that entities measured by their load have to provide the total load placed on them. """
+        class Share(PowerAware):
+            def __init__(self, entity):
+                self.entity = entity
+
+            def measure_power(self) -> PowerMeasurement:
+                return self.entity.measure_power()
+
+            def power_share_loads(self):
+                return [(self.entity, 1.0, True)]
+
+        meter_group = MeterGroup([PowerMeter(Share(self.sensor)), PowerMeter(Share(self.infrastructure), name="meter")])
+        with self.assertRaisesRegex(ValueError, "meter"):
+            meter_group.measure()
+
+    def test_run(self):
+        """ Test that the group records the measurements of its meters in a single process. """
+        meters = [PowerMeter(application) for application in self.applications]
+        self.env.process(MeterGroup(meters).run(self.env))
+        self.env.run(until=5)
+
+        for meter, application in zip(meters, self.applications):
+            self.assertEqual(len(meter), 5)
+            self.assertAlmostEqual(meter.total().total(), 5 * float(application.measure_power()))
+
+        with self.assertRaises(ValueError):
+            MeterGroup([PowerMeter(self.sensor), PowerMeter(self.server, measurement_interval=2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+import plotly.graph_objs as go
+
+from src.extendedLeaf.file_handler import FileHandler, FigurePlotter
+from src.extendedLeaf.power import PowerDomain
+from src.extendedLeaf.results import ResultsStore
+from src.extendedLeaf.sinks import ColumnarSink, NdjsonSink, CsvSink
+
+
+def captured_data(number_of_times: int):
+    data = {}
+    for time in range(100, 100 + number_of_times):
+        data[str(time)] = {"Grid": {"Server": {"Power Used": time, "Carbon Intensity": 100, "Carbon Released": 2},
+                                    "Link": {"Power Used": 1, "Carbon Intensity": 100, "Carbon Released": 0.1},
+                                    "Total Carbon Released": 2.1, "Power Available": 50}}
+        if time % 2:
+            data[str(time)]["Solar"] = {"Sensor": {"Power Used": 3, "Carbon Intensity": 0, "Carbon Released": 0},
+                                        "Total Carbon Released": 0, "Power Available": time}
+        else:
+            data[str(time)]["Grid"]["Sensor"] = {"Power Used": 3, "Carbon Intensity": 100, "Carbon Released": 0.3}
+            data[str(time)]["Grid"]["Total Carbon Released"] = 2.4
+    return data
+
+
+class TestResultsStore(unittest.TestCase):
+    """ Given the results of a simulation saved in several formats. """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.captured_data = captured_data(10)
+        self.power_domain = PowerDomain(MagicMock(), "Test power domain")
+        self.power_domain.captured_data = self.captured_data
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def stores(self):
+        file_handler = FileHandler()
+        stores = [ResultsStore.from_captured_data(self.captured_data)]
+        for layout, compression in [("json", None), ("stream", "gzip"), ("ndjson", "lzma")]:
+            filepath, _ = file_handler.write_out_results(self.power_domain, self.directory.name, f"{layout}_results",
+                                                         layout=layout, compression=compression)
+            stores.append(ResultsStore(filepath))
+        stores.append(ResultsStore(file_handler.write_out_table(self.power_domain, self.directory.name)[0]))
+        for sink_class, filename in [(ColumnarSink, "results.npy"), (NdjsonSink, "results.ndjson"),
+                                     (CsvSink, "sink_results.csv")]:
+            with sink_class(self.path(filename), flush_interval=3) as sink:
+                for time, data in self.captured_data.items():
+                    sink.append(time, data)
+            stores.append(ResultsStore(self.path(filename)))
+        return stores
+
+    def test_queries(self):
+        """ Test that all formats answer queries alike. """
+        for store in self.stores():
+            np.testing.assert_array_equal(store.times(), np.arange(100, 110))
+            self.assertEqual(store.entities(), ["Link", "Sensor", "Server"])
+            self.assertEqual(store.power_sources(), ["Grid", "Solar"])
+
+            rows = store.select(entities="Server", start=102, end=105)
+            self.assertEqual(list(rows["time"]), [102, 103, 104])
+            self.assertEqual(list(rows["power_used"]), [102, 103, 104])
+            self.assertEqual(len(store.select(power_sources=["Solar"])), 5)
+
+            carbon = store.carbon_released(start=100, end=104)
+            self.assertAlmostEqual(carbon["Sensor"], 0.6)
+            self.assertAlmostEqual(carbon["Server"], 8)
+
+            sensor_carbon = store.entity_series("Carbon Released", entities=["Sensor", "Unknown"])
+            np.testing.assert_allclose(sensor_carbon["Sensor"], [0.3, 0] * 5)
+            self.assertTrue(sensor_carbon["Unknown"].isna().all())
+
+            power_available = store.power_source_series("Power Available", power_sources=["Solar"])["Solar"]
+            np.testing.assert_array_equal(power_available, [np.nan, 101, np.nan, 103, np.nan, 105, np.nan, 107,
+                                                            np.nan, 109])
+            grid_power = store.power_source_series("Power Used", power_sources=["Grid"], start=100, end=102)
+            np.testing.assert_allclose(grid_power["Grid"], [104, 102])
+
+    def test_captured_data(self):
+        """ Test that the nested captured data is rebuilt from a file. """
+        store = ResultsStore(FileHandler().write_out_table(self.power_domain, self.directory.name)[0])
+        self.assertEqual(store.captured_data.keys(), self.captured_data.keys())
+        self.assertEqual(store.captured_data["100"], self.captured_data["100"])
+        self.assertAlmostEqual(store.captured_data["101"]["Grid"]["Total Carbon Released"], 2.1)
+
+        with self.assertRaises(ValueError):
+            ResultsStore(self.path("results.txt"))
+        with self.assertRaises(ValueError):
+            store.entity_series("Unknown Attribute")
+
+    def test_figure_plotter(self):
+        """ Test that saved results can be re-plotted. """
+        store = ResultsStore(FileHandler().write_out_results(self.power_domain, self.directory.name, "results",
+                                                             layout="ndjson")[0])
+        server = MagicMock()
+        server.name = "Server"
+        figure = FigurePlotter(store).subplot_time_series_entities("Power Used", entities=[server])
+        self.assertEqual(list(figure.data[0].y)[:3], [100, 101, 102])
+
+        # Downsampling is selected per plot, the plotter default applies otherwise
+        figure_plotter = FigurePlotter(ResultsStore.from_captured_data(captured_data(100)), downsample="minmax",
+                                       max_points=20)
+        self.assertEqual(len(figure_plotter.subplot_time_series_entities("Power Used", [server]).data[0].y), 20)
+        figure = figure_plotter.subplot_time_series_entities("Power Used", [server], downsample="none")
+        self.assertEqual(len(figure.data[0].y), 100)
+        with self.assertRaises(ValueError):
+            FigurePlotter(store, downsample="average")
+
+    def test_event_lines(self):
+        """ Test that repeating events are drawn as a single shape and simultaneous events are spread vertically. """
+        def deploy():
+            pass
+
+        def terminate():
+            pass
+        events = [SimpleNamespace(event=deploy, args=[], time_int=time) for time in range(100, 110)]
+        events.append(SimpleNamespace(event=terminate, args=[], time_int=104))
+        event_domain = MagicMock()
+        event_domain.event_history = events
+        figure_plotter = FigurePlotter(self.power_domain, event_domain, show_event_lines=True)
+
+        figure = figure_plotter.subplot_events(events)
+        self.assertEqual(len(figure.layout.shapes), 1)
+        self.assertEqual(figure.layout.shapes[0].path, "".join(f"M{time},0V1" for time in range(10)))
+        self.assertEqual(figure.layout.shapes[0].yref, "y domain")
+        deploy_y, terminate_y = figure.data[0].y, figure.data[1].y
+        self.assertEqual(deploy_y[0], 0)
+        self.assertAlmostEqual(deploy_y[4], 0.075)
+        self.assertAlmostEqual(terminate_y[0], -0.075)
+
+        main_figure = FigurePlotter.aggregate_subplots([figure, figure])
+        self.assertEqual([shape.yref for shape in main_figure.layout.shapes], ["y domain", "y2 domain"])
+
+    def test_aggregate_subplots(self):
+        """ Test that legend groups share one colour and legend entry across all subplots. """
+        figures = []
+        for groups, axis_label in [(["Server", "Sensor"], "Energy Consumed (Wh)"), (["Sensor", "Link"], "(gC02eq)")]:
+            figure = go.Figure([go.Scatter(x=[0, 1], y=[1, 2], legendgroup=group, name=group) for group in groups])
+            figure.update_layout(title_text=axis_label, yaxis=dict(title=dict(text=axis_label)),
+                                 xaxis=dict(tickvals=[0, 1], ticktext=["12:00:00", "12:01:00"]))
+            figures.append(figure)
+
+        main_figure = FigurePlotter.aggregate_subplots(figures, title="Results")
+        colours = [trace.line.color for trace in main_figure.data]
+        self.assertEqual(colours[1], colours[2])
+        self.assertEqual(len(set(colours)), 3)
+        self.assertEqual([trace.showlegend for trace in main_figure.data], [True, True, False, True])
+        self.assertEqual([trace.yaxis for trace in main_figure.data], ["y", "y", "y2", "y2"])
+        self.assertEqual(main_figure.layout.yaxis.title.text, "(Wh)")
+        self.assertEqual(main_figure.layout.xaxis2.ticktext, ("12:00:00", "12:01:00"))
+        self.assertEqual(main_figure.layout.title.text, "Results")
+        self.assertEqual(figures[0].layout.yaxis.title.text, "Energy Consumed (Wh)")
+
+    def test_retrieve_select_data_entities(self):
+        """ Test that the series of the selected entities are gathered with NaN where they were not powered. """
+        entities = []
+        for name in ["Sensor", "Server", "Unknown"]:
+            entity = MagicMock()
+            entity.name = name
+            entities.append(entity)
+        figure_plotter = FigurePlotter(self.power_domain)
+        data = figure_plotter.retrieve_select_data_entities(self.captured_data, entities + [None])
+
+        self.assertEqual(list(data.keys()), ["Sensor", "Server", "Unknown"])
+        np.testing.assert_array_equal(data["Server"]["Power Used"], np.arange(100, 110))
+        np.testing.assert_array_equal(data["Sensor"]["Carbon Intensity"], [100, 0] * 5)
+        self.assertTrue(np.isnan(data["Unknown"]["Carbon Released"]).all())
+        self.assertTrue(np.isnan(data["Server"]["Total Carbon Released"]).all())
+        # The results store is reused until further data is captured
+        self.assertIs(figure_plotter.results(), figure_plotter.results(self.captured_data))
+
+    def test_retrieve_select_data_power_sources(self):
+        """ Test that the series of the selected power sources are summed over their entities and accumulated. """
+        power_sources = []
+        for name in ["Grid", "Solar"]:
+            power_source = MagicMock()
+            power_source.name = name
+            power_source.get_carbon_intensity_series.side_effect = lambda times: np.full(len(times), 100.0)
+            power_sources.append(power_source)
+        figure_plotter = FigurePlotter(self.power_domain)
+
+        for time_series in [self.power_domain, ResultsStore(FileHandler().write_out_table(self.power_domain,
+                                                                                          self.directory.name)[0])]:
+            data = figure_plotter.retrieve_select_data_power_sources(time_series, power_sources + [None])
+            self.assertEqual(list(data.keys()), ["Grid", "Solar"])
+            np.testing.assert_allclose(data["Grid"]["Carbon Released"], [2.4, 2.1] * 5)
+            np.testing.assert_allclose(data["Grid"]["Power Used"][:2], [104, 102])
+            # The running total starts at zero the first time a power source appears
+            np.testing.assert_allclose(data["Grid"]["Total Carbon Released"], np.cumsum([0] + [2.1, 2.4] * 4 + [2.1]))
+            np.testing.assert_array_equal(data["Solar"]["Power Available"], [np.nan, 101, np.nan, 103, np.nan, 105,
+                                                                             np.nan, 107, np.nan, 109])
+            np.testing.assert_array_equal(data["Solar"]["Total Carbon Released"], [np.nan, 0] * 5)
+            np.testing.assert_array_equal(data["Solar"]["Carbon Intensity"], np.full(10, 100.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
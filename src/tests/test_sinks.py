@@ -0,0 +1,138 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import simpy
+
+from src.extendedLeaf.events import Event, EventDomain
+from src.extendedLeaf.infrastructure import Node
+from src.extendedLeaf.power import PowerDomain, PowerModelNode, BatteryPower, GridPower
+from src.extendedLeaf.sinks import CsvSink, NdjsonSink, ColumnarSink, CallbackSink, read_columnar, RESULT_COLUMNS
+
+
+def tick_data(time: int):
+    return {"Grid": {"Server": {"Power Used": time, "Carbon Intensity": 100, "Carbon Released": time / 10},
+                     "Total Carbon Released": time / 10, "Power Available": 50},
+            "Solar Power": {"Microprocessor": {"Power Used": 1, "Carbon Intensity": 0, "Carbon Released": 0},
+                            "Total Carbon Released": 0, "Power Available": 10}}
+
+
+class TestResultSinks(unittest.TestCase):
+    """ Given a few updates recorded by a power domain. """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.updates = [(str(time), tick_data(time)) for time in range(5)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def test_csv_sink(self):
+        """ Test that the updates are written as long-form rows. """
+        with CsvSink(self.path("results.csv"), flush_interval=2) as sink:
+            for time, data in self.updates:
+                sink.append(time, data)
+        with open(self.path("results.csv")) as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(tuple(rows[0]), RESULT_COLUMNS)
+        self.assertEqual(len(rows), 1 + 2 * len(self.updates))
+        self.assertEqual(rows[-2], ["4", "Grid", "Server", "4", "100", "0.4", "50"])
+
+    def test_ndjson_sink(self):
+        """ Test that merging the written lines restores the captured data. """
+        with NdjsonSink(self.path("results.ndjson"), flush_interval=3) as sink:
+            for time, data in self.updates:
+                sink.append(time, data)
+            # Only full batches are written before the sink is closed
+            with open(self.path("results.ndjson")) as file:
+                self.assertEqual(len(file.readlines()), 3)
+        captured_data = {}
+        with open(self.path("results.ndjson")) as file:
+            for line in file:
+                captured_data.update(json.loads(line))
+        self.assertEqual(captured_data, dict(self.updates))
+
+    def test_columnar_sink(self):
+        """ Test that batches with differently sized names are read back into a single array. """
+        with ColumnarSink(self.path("results.npy"), flush_interval=2) as sink:
+            for time, data in self.updates:
+                sink.append(time, data)
+            sink.append("5", {"Battery With A Long Name": {"Sensor": {"Power Used": 2, "Carbon Intensity": 5,
+                                                                      "Carbon Released": 0.01}}})
+        results = read_columnar(self.path("results.npy"))
+        self.assertEqual(results.dtype.names, RESULT_COLUMNS)
+        self.assertEqual(len(results), 2 * len(self.updates) + 1)
+        self.assertEqual(list(results["time"][:4]), [0, 0, 1, 1])
+        self.assertEqual(results["power_source"][-1], "Battery With A Long Name")
+        self.assertEqual(results[results["entity"] == "Server"]["power_used"].sum(), 10)
+
+    def test_closed_sink(self):
+        """ Test that closed sinks reject further updates. """
+        batches = []
+        sink = CallbackSink(batches.append, flush_interval=10)
+        sink.append(*self.updates[0])
+        sink.close()
+        self.assertEqual(batches, [self.updates[:1]])
+        with self.assertRaises(ValueError):
+            sink.append(*self.updates[1])
+        with self.assertRaises(ValueError):
+            CallbackSink(batches.append, flush_interval=0)
+
+
+class TestPowerDomainSinks(unittest.TestCase):
+    """ Given a power domain which does not keep the captured data. """
+
+    def test_update_sinks(self):
+        """ Test that the recorded data is only passed to the sinks. """
+        power_domain = PowerDomain(MagicMock(), "Test power domain", keep_captured_data=False)
+        batches = []
+        power_domain.add_sink(CallbackSink(batches.append, flush_interval=2))
+        for time in range(3):
+            data = tick_data(time)
+            power_domain.update_carbon_intensity(data)
+            power_domain.update_recorded_data(str(time), data)
+            power_domain.update_sinks(str(time))
+
+        self.assertEqual(power_domain.captured_data, {})
+        self.assertEqual(len(power_domain.carbon_emitted), 1)
+        self.assertAlmostEqual(power_domain.return_total_carbon_emissions(), 0.3)
+        self.assertEqual([[time for time, _ in batch] for batch in batches], [["0", "1"]])
+        power_domain.close_sinks()
+        self.assertEqual([[time for time, _ in batch] for batch in batches], [["0", "1"], ["2"]])
+
+    def test_run(self):
+        """ Test that no recorded state grows with the number of updates while the simulation runs. """
+        env = simpy.Environment()
+        server = Node("Server", cu=10, power_model=PowerModelNode(max_power=10, static_power=5))
+        power_domain = PowerDomain(env, "Test power domain", start_time_str="10:00:00", keep_captured_data=False)
+        battery = BatteryPower(env, power_domain=power_domain, static=True, powered_infrastructure=[server])
+        battery.remaining_power = 2
+        grid = GridPower(env, power_domain=power_domain, priority=1)
+        power_domain.add_power_source(battery)
+        power_domain.add_power_source(grid)
+        batches = []
+        power_domain.add_sink(CallbackSink(batches.append, flush_interval=10))
+        event_domain = EventDomain(env, start_time_str="10:00:00")
+        event_domain.add_event(Event(event=battery.find_and_recharge_battery, args=[], time_str="10:30:00",
+                                     repeat=True, repeat_counter=60))
+        env.process(event_domain.run())
+        env.process(power_domain.run(env))
+        env.run(until=200)
+
+        self.assertEqual(sum(len(batch) for batch in batches), 200)
+        self.assertEqual(power_domain.captured_data, {})
+        self.assertEqual(len(power_domain.carbon_emitted), 1)
+        self.assertEqual(battery.remaining_power_log, {})
+        self.assertEqual(grid.remaining_power_log, {})
+        # Power consumption logged ahead, e.g. a recharge lasting several updates, is only kept until it is recorded
+        self.assertTrue(all(int(time) >= 200 + power_domain.start_time_index for time in power_domain.logging_data))
+
+
+if __name__ == '__main__':
+    unittest.main()
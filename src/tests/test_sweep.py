@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import simpy
+
+from src.extendedLeaf.infrastructure import Node, Infrastructure
+from src.extendedLeaf.power import PowerModelNode, PowerDomain, GridPower, BatteryPower, SolarPower
+from src.extendedLeaf.sweep import Scenario, ParameterSweep
+from src.tests.scenarios import create_recharged_scenario
+
+
+def create_scenario(battery_size: float = 0, static_power: float = 5, start_time: str = "12:00:00") -> Scenario:
+    """A sensor powered by a battery which is not recharged and a server powered by the grid."""
+    env = simpy.Environment()
+    infrastructure = Infrastructure()
+    sensor = Node("Sensor", cu=10, power_model=PowerModelNode(max_power=10, static_power=static_power))
+    server = Node("Server", cu=10, power_model=PowerModelNode(max_power=10, static_power=static_power))
+    infrastructure.add_node(sensor)
+    infrastructure.add_node(server)
+
+    power_domain = PowerDomain(env, name="Power Domain", start_time_str=start_time)
+    battery = BatteryPower(env, power_domain=power_domain, static=True, powered_infrastructure=[sensor])
+    battery.remaining_power = battery_size
+    grid = GridPower(env, power_domain=power_domain, static=True, powered_infrastructure=[server])
+    power_domain.add_power_source(battery)
+    power_domain.add_power_source(grid)
+    env.process(power_domain.run(env))
+    return Scenario(env, [power_domain], until=60, infrastructure=infrastructure)
+
+
+class TestScenario(unittest.TestCase):
+    """ Given a scenario whose battery runs out. """
+
+    def test_summary(self):
+        """ Test that the summary holds the carbon, energy per power source and pauses of the run. """
+        summary = create_scenario().run()
+        self.assertEqual(summary["pause_counts"], {"Sensor": 1})
+        self.assertEqual(summary["total_pauses"], 1)
+        energy = summary["power_domains"]["Power Domain"]["energy"]
+        self.assertEqual(list(energy), ["Battery", "Grid"])
+        self.assertAlmostEqual(energy["Battery"], 0)
+        self.assertAlmostEqual(energy["Grid"], 5)
+        self.assertGreater(summary["total_carbon"], 0)
+        self.assertEqual(summary["total_carbon"], summary["power_domains"]["Power Domain"]["total_carbon"])
+
+        with self.assertRaises(ValueError):
+            Scenario(simpy.Environment(), [], until=10)
+
+    def test_logged_energy(self):
+        """ Test that the energy in the summary includes the logged power consumption, e.g. battery recharges. """
+        scenario = create_recharged_scenario()
+        energy = scenario.run()["power_domains"]["Power Domain"]["energy"]
+        recorded_energy = {}
+        for data in scenario.power_domains[0].captured_data.values():
+            for power_source_name, readings in data.items():
+                recorded_energy[power_source_name] = recorded_energy.get(power_source_name, 0) + sum(
+                    reading["Power Used"] for reading in readings.values() if isinstance(reading, dict))
+        self.assertEqual(sorted(energy), sorted(recorded_energy))
+        for power_source_name, power_used in recorded_energy.items():
+            self.assertAlmostEqual(energy[power_source_name], power_used)
+
+
+class TestParameterSweep(unittest.TestCase):
+    """ Given a sweep over the battery size and static power of a scenario. """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.grid = {"battery_size": [0, 1000], "static_power": [5, 10]}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_configurations(self):
+        """ Test that grids are expanded to the cartesian product and lists of configurations are kept. """
+        sweep = ParameterSweep(create_scenario, self.grid)
+        self.assertEqual(sweep.configurations(), [{"battery_size": 0, "static_power": 5},
+                                                  {"battery_size": 0, "static_power": 10},
+                                                  {"battery_size": 1000, "static_power": 5},
+                                                  {"battery_size": 1000, "static_power": 10}])
+        configurations = [{"start_time": "06:00:00"}, {"start_time": "18:00:00"}]
+        self.assertEqual(ParameterSweep(create_scenario, configurations).configurations(), configurations)
+        with self.assertRaises(ValueError):
+            ParameterSweep(create_scenario, self.grid, max_workers=0)
+
+    def test_run(self):
+        """ Test that the configurations are run in parallel in order and give the same summaries as in process. """
+        results = ParameterSweep(create_scenario, self.grid, max_workers=2).run()
+        self.assertEqual([parameters for parameters, _ in results], ParameterSweep(create_scenario,
+                                                                                   self.grid).configurations())
+        self.assertEqual([summary["total_pauses"] for _, summary in results], [1, 1, 0, 0])
+        grid_energy = [summary["power_domains"]["Power Domain"]["energy"]["Grid"] for _, summary in results]
+        for energy, expected in zip(grid_energy, [5, 10, 5, 10]):
+            self.assertAlmostEqual(energy, expected)
+        self.assertEqual(results[3][1], create_scenario(battery_size=1000, static_power=10).run())
+
+    def test_cache(self):
+        """ Test that cached summaries are loaded instead of running the configuration again. """
+        grid = {"battery_size": [0, 1000], "start_time": ["12:00:00"]}
+        results = ParameterSweep(create_scenario, grid, max_workers=1, cache_dir=self.directory.name).run()
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+        with patch("src.extendedLeaf.sweep._run_configuration") as run_configuration:
+            cached_results = ParameterSweep(create_scenario, grid, cache_dir=self.directory.name).run()
+        run_configuration.assert_not_called()
+        self.assertEqual(cached_results, results)
+
+        # Parameters which are not JSON serializable are keyed by their description
+        sweep = ParameterSweep(create_scenario, {"power_source": [SolarPower, GridPower]})
+        keys = [sweep.cache_key(parameters) for parameters in sweep.configurations()]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], sweep.cache_key({"power_source": SolarPower}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+import simpy
+
+from src.extendedLeaf.events import Event, EventDomain
+from src.extendedLeaf.infrastructure import Node, Infrastructure
+from src.extendedLeaf.power import PowerModelNode, PowerDomain, GridPower, SolarPower
+from src.extendedLeaf.whatif import WhatIf
+
+
+class TestWhatIf(unittest.TestCase):
+    """ Given a running simulation with a node powered by the grid and a node powered by solar power. """
+
+    def setUp(self):
+        self.env = simpy.Environment()
+        self.infrastructure = Infrastructure()
+        self.grid_node = Node("GridNode", cu=10, power_model=PowerModelNode(max_power=50, static_power=5))
+        self.solar_node = Node("SolarNode", cu=10, power_model=PowerModelNode(max_power=50, static_power=5))
+        self.infrastructure.add_node(self.grid_node)
+        self.infrastructure.add_node(self.solar_node)
+        self.power_domain = PowerDomain(self.env, name="Power Domain", start_time_str="12:00:00")
+        self.power_domain.add_power_source(SolarPower(self.env, power_domain=self.power_domain,
+                                                      powered_infrastructure=[self.solar_node], static=True))
+        self.power_domain.add_power_source(GridPower(self.env, power_domain=self.power_domain, priority=1,
+                                                     powered_infrastructure=[self.grid_node], static=True))
+        self.env.process(self.power_domain.run(self.env))
+        self.env.run(until=30)
+
+    def test_evaluate(self):
+        """ Test that candidates are evaluated in forked copies and the simulation itself is left untouched. """
+        carbon_released = self.power_domain.return_total_carbon_emissions()
+        what_if = WhatIf(self.env, horizon=60, power_domains=[self.power_domain], max_workers=2)
+        carbon = what_if.evaluate([lambda: None, lambda: self.grid_node._reserve_cu(10),
+                                   lambda: self.solar_node._reserve_cu(10)])
+        self.assertEqual(len(carbon), 3)
+        self.assertGreater(carbon[0], 0)
+        self.assertGreater(carbon[1], carbon[2])
+        self.assertGreater(carbon[2], carbon[0])
+
+        self.assertEqual(self.env.now, 30)
+        self.assertEqual(self.grid_node.used_cu, 0)
+        self.assertEqual(self.power_domain.return_total_carbon_emissions(), carbon_released)
+
+        # The same candidate gives the same summary as simulating without a fork
+        self.grid_node._reserve_cu(10)
+        self.env.run(until=90)
+        self.assertAlmostEqual(self.power_domain.return_total_carbon_emissions() - carbon_released, carbon[1])
+
+    def test_summarize(self):
+        """ Test that custom summaries are returned and failing candidates are reported. """
+        what_if = WhatIf(self.env, horizon=10, summarize=lambda: (self.env.now, self.grid_node.used_cu),
+                         max_workers=1)
+        self.assertEqual(what_if.evaluate([lambda: self.grid_node._reserve_cu(4), lambda: None]), [(40, 4), (40, 0)])
+        self.assertEqual(what_if.evaluate([]), [])
+
+        with self.assertRaises(ValueError):
+            what_if.evaluate([lambda: None, lambda: self.grid_node._reserve_cu(11)])
+        with self.assertRaises(ValueError):
+            WhatIf(self.env, horizon=10)
+        with self.assertRaises(ValueError):
+            WhatIf(self.env, horizon=0, power_domains=[self.power_domain])
+
+    def test_within_process(self):
+        """ Test that decisions can be evaluated by an event while the simulation is running. """
+        decisions = []
+
+        def place():
+            what_if = WhatIf(self.env, horizon=60, power_domains=[self.power_domain])
+            nodes = [self.grid_node, self.solar_node]
+            carbon = what_if.evaluate([lambda node=node: node._reserve_cu(10) for node in nodes])
+            node = nodes[carbon.index(min(carbon))]
+            node._reserve_cu(10)
+            decisions.append((self.env.now, node.name))
+
+        event_domain = EventDomain(self.env, start_time_str="12:00:00")
+        event_domain.add_event(Event(event=place, args=[], time_str="12:40:00", repeat=False))
+        self.env.process(event_domain.run())
+        self.env.run(until=60)
+        self.assertEqual(decisions, [(40, "SolarNode")])
+
+
+if __name__ == '__main__':
+    unittest.main()